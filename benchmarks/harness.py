@@ -0,0 +1,72 @@
+"""In-process harness for benchmarking user-service.
+
+Drives create_app() over httpx's ASGI transport against a throwaway SQLite
+database and an in-memory Redis, so numbers are reproducible on a laptop.
+Import this module before anything from user-service.
+"""
+import os
+import statistics
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+
+BENCH_DIR = tempfile.mkdtemp(prefix="keplerix-bench-")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-with-32-bytes!")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{BENCH_DIR}/bench.db")
+os.environ.setdefault("DATABASE_URL_ASYNC", f"sqlite+aiosqlite:///{BENCH_DIR}/bench.db")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "user-service"))
+
+import fakeredis
+import httpx
+import core.redis
+
+# Swap the client before any module binds it with `from core.redis import redis_client`.
+core.redis.redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+
+from db.base import Base
+from db.session import engine
+from main import create_app
+
+async def create_schema():
+  async with engine.begin() as conn:
+    await conn.run_sync(Base.metadata.drop_all)
+    await conn.run_sync(Base.metadata.create_all)
+
+@asynccontextmanager
+async def running_app():
+  app = create_app()
+  async with app.router.lifespan_context(app):
+    yield app
+
+def make_client(app) -> httpx.AsyncClient:
+  # https so the Secure auth cookies are sent back.
+  return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="https://bench")
+
+async def login(client: httpx.AsyncClient, email: str, password: str):
+  response = await client.post("/auth/login", json={"email": email, "password": password})
+  response.raise_for_status()
+
+def summarize(samples: list[float], elapsed: float | None = None) -> dict:
+  ordered = sorted(samples)
+  def percentile(fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000
+  summary = {
+    "count": len(ordered),
+    "p50_ms": percentile(0.50),
+    "p95_ms": percentile(0.95),
+    "p99_ms": percentile(0.99),
+    "mean_ms": statistics.fmean(ordered) * 1000,
+  }
+  if elapsed:
+    summary["rps"] = len(ordered) / elapsed
+  return summary
+
+def format_summary(name: str, summary: dict) -> str:
+  rps = f"{summary['rps']:9.1f} req/s" if "rps" in summary else ""
+  return (
+    f"{name:<32} n={summary['count']:<6} p50={summary['p50_ms']:8.2f}ms "
+    f"p95={summary['p95_ms']:8.2f}ms p99={summary['p99_ms']:8.2f}ms {rps}"
+  )
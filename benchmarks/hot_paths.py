@@ -0,0 +1,185 @@
+"""Throughput and tail latency of the user-service hot paths, checked against stored baselines.
+
+  python benchmarks/hot_paths.py                     # run and compare with baselines.json
+  python benchmarks/hot_paths.py --save-baseline     # run and overwrite baselines.json
+  python benchmarks/hot_paths.py --scenario refresh --scenario user_info
+
+Seeds --users accounts plus --concurrency heavy users owning --projects projects each,
+then drives every scenario from --concurrency clients at once. A scenario regresses when
+its p95 grows, or its throughput drops, by more than --threshold relative to the baseline;
+the script then exits with status 1. Baselines are machine specific: record them on the
+machine that runs the comparison.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+import harness
+from sqlalchemy import insert
+from core.security import hash_password
+from db.models.project import Project
+from db.models.user import Users
+from db.session import async_session_maker
+
+PASSWORD = "benchmark-password"
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+SEED_BATCH_SIZE = 5000
+DELETE_BATCH_SIZE = 100
+
+def user_email(index: int) -> str:
+  return f"user{index}@example.com"
+
+def heavy_email(index: int) -> str:
+  return f"heavy{index}@example.com"
+
+async def seed(users: int, heavy_users: int, projects: int):
+  # One bcrypt hash shared by every account; hashing 100k passwords would dominate the run.
+  hashed_password = hash_password(PASSWORD)
+  async with async_session_maker() as session:
+    for start in range(0, users, SEED_BATCH_SIZE):
+      await session.execute(insert(Users), [
+        {"username": f"user{index}", "email": user_email(index), "hashed_password": hashed_password}
+        for index in range(start, min(users, start + SEED_BATCH_SIZE))
+      ])
+    result = await session.execute(
+      insert(Users).returning(Users.id),
+      [
+        {"username": f"heavy{index}", "email": heavy_email(index), "hashed_password": hashed_password, "projects_count": projects}
+        for index in range(heavy_users)
+      ],
+    )
+    created = datetime(2026, 1, 1)
+    for user_id in result.scalars().all():
+      for start in range(0, projects, SEED_BATCH_SIZE):
+        await session.execute(insert(Project), [
+          {"user_id": user_id, "link": f"project-{user_id}-{index}", "changed_at": created + timedelta(seconds=index), "created_at": created}
+          for index in range(start, min(projects, start + SEED_BATCH_SIZE))
+        ])
+    await session.commit()
+
+async def login(client, worker: int, users: int):
+  return await client.post("/auth/login", json={"email": user_email(random.randrange(users)), "password": PASSWORD})
+
+async def refresh(client, worker: int, users: int):
+  return await client.post("/auth/refresh")
+
+async def user_info(client, worker: int, users: int):
+  return await client.get("/user/info")
+
+async def projects_page(client, worker: int, users: int):
+  return await client.get("/project/projects")
+
+async def bulk_delete(client, worker: int, users: int):
+  created = await client.post("/project/add_projects", json={"count": DELETE_BATCH_SIZE})
+  created.raise_for_status()
+  links = [project["link"] for project in created.json()]
+  # Only the delete is timed; the insert above just keeps the heavy user's table the same size.
+  started = time.perf_counter()
+  response = await client.request("DELETE", "/project/delete_projects", json={"links": links})
+  return response, time.perf_counter() - started
+
+SCENARIOS = {
+  "login": login,
+  "refresh": refresh,
+  "user_info": user_info,
+  "projects_page": projects_page,
+  "bulk_delete": bulk_delete,
+}
+
+async def worker_loop(operation, client, worker: int, requests: int, users: int, samples: list[float]):
+  for _ in range(requests):
+    started = time.perf_counter()
+    outcome = await operation(client, worker, users)
+    response, elapsed = outcome if isinstance(outcome, tuple) else (outcome, time.perf_counter() - started)
+    response.raise_for_status()
+    samples.append(elapsed)
+
+async def run_scenario(name: str, clients: list, requests: int, users: int) -> dict:
+  operation = SCENARIOS[name]
+  per_worker = max(1, requests // len(clients))
+  # Warm-up pass so connection setup and first-hit caches do not land in the percentiles.
+  await asyncio.gather(*(worker_loop(operation, client, worker, 1, users, []) for worker, client in enumerate(clients)))
+
+  samples = []
+  started = time.perf_counter()
+  await asyncio.gather(*(
+    worker_loop(operation, client, worker, per_worker, users, samples) for worker, client in enumerate(clients)
+  ))
+  return harness.summarize(samples, time.perf_counter() - started)
+
+def compare(results: dict, baselines: dict, threshold: float) -> list[str]:
+  regressions = []
+  for name, result in results.items():
+    baseline = baselines.get(name)
+    if baseline is None:
+      continue
+    if result["p95_ms"] > baseline["p95_ms"] * (1 + threshold):
+      regressions.append(f"{name}: p95 {result['p95_ms']:.2f}ms vs baseline {baseline['p95_ms']:.2f}ms")
+    if result["rps"] < baseline["rps"] * (1 - threshold):
+      regressions.append(f"{name}: {result['rps']:.1f} req/s vs baseline {baseline['rps']:.1f} req/s")
+  return regressions
+
+async def main(args) -> int:
+  scenarios = args.scenario or list(SCENARIOS)
+  await harness.create_schema()
+  started = time.perf_counter()
+  await seed(args.users, args.concurrency, args.projects)
+  print(f"seeded {args.users} users and {args.concurrency}x{args.projects} projects in {time.perf_counter() - started:.1f}s")
+
+  results = {}
+  async with harness.running_app() as app:
+    clients = [harness.make_client(app) for _ in range(args.concurrency)]
+    # Logins get their own clients so they do not replace the heavy users' sessions.
+    login_clients = [harness.make_client(app) for _ in range(args.concurrency)]
+    try:
+      for worker, client in enumerate(clients):
+        await harness.login(client, heavy_email(worker), PASSWORD)
+      for name in scenarios:
+        if name == "login":
+          # bcrypt makes logins orders of magnitude slower than everything else.
+          results[name] = await run_scenario(name, login_clients, args.login_requests, args.users)
+        else:
+          results[name] = await run_scenario(name, clients, args.requests, args.users)
+        print(harness.format_summary(name, results[name]))
+    finally:
+      for client in clients + login_clients:
+        await client.aclose()
+
+  run_config = {"users": args.users, "projects": args.projects, "concurrency": args.concurrency}
+  if args.save_baseline:
+    with open(args.baselines, "w") as baselines_file:
+      json.dump({"config": run_config, "scenarios": results}, baselines_file, indent=2)
+      baselines_file.write("\n")
+    print(f"baselines written to {args.baselines}")
+    return 0
+
+  if not os.path.exists(args.baselines):
+    print(f"no baselines at {args.baselines}; run with --save-baseline first")
+    return 0
+  with open(args.baselines) as baselines_file:
+    stored = json.load(baselines_file)
+  if stored["config"] != run_config:
+    print(f"warning: baselines were recorded with {stored['config']}, this run used {run_config}")
+  regressions = compare(results, stored["scenarios"], args.threshold)
+  for regression in regressions:
+    print(f"REGRESSION {regression}")
+  if not regressions:
+    print(f"no regressions beyond {args.threshold:.0%}")
+  return 1 if regressions else 0
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="run only this scenario (repeatable)")
+  parser.add_argument("--users", type=int, default=100_000)
+  parser.add_argument("--projects", type=int, default=10_000, help="projects owned by each heavy user")
+  parser.add_argument("--concurrency", type=int, default=8)
+  parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+  parser.add_argument("--login-requests", type=int, default=200)
+  parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression")
+  parser.add_argument("--baselines", default=BASELINES_PATH)
+  parser.add_argument("--save-baseline", action="store_true")
+  sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,76 @@
+"""Latency of GET /user/info while a storm of logins runs concurrently.
+
+  python benchmarks/login_storm.py            # bcrypt in the hasher pool
+  python benchmarks/login_storm.py --inline   # bcrypt on the event loop, as before
+"""
+import argparse
+import asyncio
+import time
+import harness
+from sqlalchemy import insert
+from core.security import hash_password, password_hasher
+from db.models.user import Users
+from db.session import async_session_maker
+
+PASSWORD = "benchmark-password"
+
+async def seed(storm_users: int):
+  hashed_password = hash_password(PASSWORD)
+  rows = [{"username": "reader", "email": "reader@example.com", "hashed_password": hashed_password}]
+  rows += [
+    {"username": f"user{index}", "email": f"user{index}@example.com", "hashed_password": hashed_password}
+    for index in range(storm_users)
+  ]
+  async with async_session_maker() as session:
+    await session.execute(insert(Users), rows)
+    await session.commit()
+
+async def measure_info(client, duration: float) -> list[float]:
+  samples = []
+  deadline = time.perf_counter() + duration
+  while time.perf_counter() < deadline:
+    started = time.perf_counter()
+    response = await client.get("/user/info")
+    response.raise_for_status()
+    samples.append(time.perf_counter() - started)
+    await asyncio.sleep(0.005)
+  return samples
+
+async def login_loop(app, email: str, deadline: float, statuses: dict):
+  async with harness.make_client(app) as client:
+    while time.perf_counter() < deadline:
+      response = await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+      statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+async def main(args):
+  if args.inline:
+    async def run_inline(func, *func_args):
+      return func(*func_args)
+    password_hasher.run = run_inline
+
+  await harness.create_schema()
+  await seed(args.concurrency)
+  async with harness.running_app() as app, harness.make_client(app) as reader:
+    await harness.login(reader, "reader@example.com", PASSWORD)
+
+    idle = await measure_info(reader, args.duration)
+    statuses = {}
+    deadline = time.perf_counter() + args.duration
+    storm = [
+      asyncio.create_task(login_loop(app, f"user{index}@example.com", deadline, statuses))
+      for index in range(args.concurrency)
+    ]
+    loaded = await measure_info(reader, args.duration)
+    await asyncio.gather(*storm)
+
+  mode = "inline bcrypt" if args.inline else "hasher pool"
+  print(f"mode: {mode}, login concurrency: {args.concurrency}, login statuses: {statuses}")
+  print(harness.format_summary("/user/info idle", harness.summarize(idle)))
+  print(harness.format_summary("/user/info during login storm", harness.summarize(loaded)))
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--inline", action="store_true", help="hash on the event loop to reproduce the old behaviour")
+  parser.add_argument("--concurrency", type=int, default=16)
+  parser.add_argument("--duration", type=float, default=5.0)
+  asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,142 @@
+"""Messages per second one worker's live rooms can take, and how late they arrive.
+
+  python benchmarks/realtime_fanout.py
+  python benchmarks/realtime_fanout.py --rooms 100 --members 10 --rate 5
+  python benchmarks/realtime_fanout.py --tick 0    # flush on every loop turn instead of batching
+
+Opens --rooms project rooms with --members sockets each, every socket sending --rate small
+JSON messages per second, for --duration seconds. The sockets speak ASGI straight to
+create_app(), so the numbers cover the endpoint, the hub and the Redis publishes (into an
+in-memory Redis) but not a network stack or a browser. A delivery is one message reaching
+one member; latency is measured from the send to the frame that carries it.
+"""
+import argparse
+import asyncio
+import random
+import time
+import orjson
+import harness
+from sqlalchemy import insert
+from core.security import hash_password
+from db.models.project import Project
+from db.models.user import Users
+from db.session import async_session_maker
+from services.real_time import hub
+
+PASSWORD = "benchmark-password"
+
+async def seed(rooms: int) -> list[str]:
+  async with async_session_maker() as session:
+    result = await session.execute(
+      insert(Users).returning(Users.id),
+      [{"username": "editor", "email": "editor@example.com", "hashed_password": hash_password(PASSWORD), "projects_count": rooms}],
+    )
+    user_id = result.scalar_one()
+    links = [f"room-{index}" for index in range(rooms)]
+    await session.execute(insert(Project), [{"user_id": user_id, "link": link} for link in links])
+    await session.commit()
+  return links
+
+class LiveSocket:
+  """A WebSocket client talking ASGI to the app directly."""
+
+  def __init__(self, app, link: str, cookie: str):
+    self.incoming: asyncio.Queue[dict] = asyncio.Queue()
+    self.outgoing: asyncio.Queue[dict] = asyncio.Queue()
+    self.scope = {
+      "type": "websocket",
+      "asgi": {"version": "3.0"},
+      "scheme": "wss",
+      "http_version": "1.1",
+      "path": "/project/live",
+      "raw_path": b"/project/live",
+      "root_path": "",
+      "query_string": f"project_link={link}".encode(),
+      "headers": [(b"host", b"bench"), (b"cookie", cookie.encode())],
+      "client": ("127.0.0.1", 50000),
+      "server": ("bench", 443),
+      "subprotocols": [],
+    }
+    self.session = asyncio.create_task(app(self.scope, self.outgoing.get, self.incoming.put))
+    self.outgoing.put_nowait({"type": "websocket.connect"})
+
+  async def open(self) -> str:
+    accepted = await self.incoming.get()
+    if accepted["type"] != "websocket.accept":
+      raise RuntimeError(f"Handshake refused: {accepted}")
+    hello = await self.incoming.get()
+    return orjson.loads(hello["text"])["member"]
+
+  def send(self, data: dict):
+    self.outgoing.put_nowait({"type": "websocket.receive", "text": orjson.dumps(data).decode()})
+
+  async def close(self):
+    self.outgoing.put_nowait({"type": "websocket.disconnect", "code": 1000})
+    await self.session
+    # The server sends nothing back when the client hangs up; wake the reader ourselves.
+    self.incoming.put_nowait({"type": "websocket.close", "code": 1000})
+
+async def write(socket: LiveSocket, rate: float, deadline: float, sent: list[int]):
+  interval = 1 / rate
+  # Spread the writers over the interval; editors do not type in lockstep.
+  next_send = time.perf_counter() + random.uniform(0, interval)
+  while next_send < deadline:
+    socket.send({"op": "cursor", "x": sent[0], "sent_at": time.perf_counter()})
+    sent[0] += 1
+    next_send += interval
+    await asyncio.sleep(max(0, next_send - time.perf_counter()))
+
+async def read(socket: LiveSocket, latencies: list[float], counts: dict):
+  while True:
+    message = await socket.incoming.get()
+    if message["type"] != "websocket.send":
+      counts["closed"] += 1
+      return
+    received_at = time.perf_counter()
+    counts["frames"] += 1
+    for delivered in orjson.loads(message["text"])["messages"]:
+      latencies.append(received_at - delivered["data"]["sent_at"])
+
+async def main(args):
+  hub.tick = args.tick
+  await harness.create_schema()
+  links = await seed(args.rooms)
+  async with harness.running_app() as app, harness.make_client(app) as client:
+    await harness.login(client, "editor@example.com", PASSWORD)
+    cookie = f"keplerix_token={client.cookies['keplerix_token']}"
+
+    sockets = [LiveSocket(app, link, cookie) for link in links for _ in range(args.members)]
+    await asyncio.gather(*(socket.open() for socket in sockets))
+    latencies, counts, sent = [], {"frames": 0, "closed": 0}, [0]
+    readers = [asyncio.create_task(read(socket, latencies, counts)) for socket in sockets]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(write(socket, args.rate, started + args.duration, sent) for socket in sockets))
+    # Let the last tick go out before the sockets close.
+    await asyncio.sleep(max(args.tick, 0.01) * 4)
+    elapsed = time.perf_counter() - started
+    for socket in sockets:
+      await socket.close()
+    await asyncio.gather(*readers)
+    stats = hub.stats()
+
+  print(
+    f"rooms: {args.rooms}, members per room: {args.members}, rate: {args.rate}/s per member, "
+    f"tick: {args.tick * 1000:.0f}ms, duration: {elapsed:.1f}s"
+  )
+  print(
+    f"messages in: {stats['messages_received'] / elapsed:,.0f}/s (offered {len(sockets) * args.rate:,.0f}/s), "
+    f"deliveries: {len(latencies) / elapsed:,.0f}/s, frames: {counts['frames'] / elapsed:,.0f}/s, "
+    f"messages per frame: {len(latencies) / max(counts['frames'], 1):.1f}"
+  )
+  print(f"redis publishes: {stats['batches_published'] / elapsed:,.0f}/s, slow members dropped: {stats['slow_members_dropped']}")
+  print(harness.format_summary("delivery latency", harness.summarize(latencies)))
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--rooms", type=int, default=50)
+  parser.add_argument("--members", type=int, default=10)
+  parser.add_argument("--rate", type=float, default=10.0, help="messages per second sent by each member")
+  parser.add_argument("--tick", type=float, default=0.025, help="seconds a room batches messages for")
+  parser.add_argument("--duration", type=float, default=10.0)
+  asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,103 @@
+"""Cost of loading and serialising a page of projects, per 10k rows.
+
+  python benchmarks/serialization.py [--rows 10000] [--repeat 5]
+
+`before` is the original read path: full ORM entities, a dict per row with its own
+owner block, response_model validation and the stdlib JSON encoder. `after` is the
+current one: column projections, a shared owner block and ORJSONResponse.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+import harness
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy import insert
+from sqlalchemy.future import select
+from api.dependencies import format_project_response, project_owner
+from db.models.project import Project
+from db.models.user import Users
+from db.session import async_session_maker
+from domain.projects.entities import ProjectResponse
+from domain.projects.repositories import projects_page_query
+from domain.users.entities import Principal
+
+USER = Principal(id=1, email="reader@example.com", username="reader")
+RESPONSE_FIELD = create_model_field("response", list[ProjectResponse])
+
+async def seed(rows: int):
+  start = datetime(2026, 1, 1)
+  async with async_session_maker() as session:
+    await session.execute(insert(Users), [{"id": USER.id, "email": USER.email, "username": USER.username, "hashed_password": "x"}])
+    await session.execute(insert(Project), [
+      {"user_id": USER.id, "link": f"project-{index}", "changed_at": start + timedelta(seconds=index), "created_at": start}
+      for index in range(rows)
+    ])
+    await session.commit()
+
+async def before(session) -> bytes:
+  result = await session.execute(select(Project).where(Project.user_id == USER.id))
+  content = [
+    {
+      "link": project.link,
+      "owner": {"id": USER.id, "email": USER.email, "username": USER.username},
+      "changed_at": project.changed_at.isoformat(),
+      "created_at": project.created_at.isoformat(),
+    }
+    for project in result.scalars().all()
+  ]
+  return JSONResponse(await serialize_response(field=RESPONSE_FIELD, response_content=content)).body
+
+async def after(session) -> bytes:
+  result = await session.execute(projects_page_query(USER.id))
+  owner = project_owner(USER)
+  return ORJSONResponse([format_project_response(project, owner) for project in result.all()]).body
+
+async def measure(path, rows: int, repeat: int) -> dict:
+  timings = []
+  for _ in range(repeat):
+    async with async_session_maker() as session:
+      started = time.perf_counter()
+      body = await path(session)
+      timings.append(time.perf_counter() - started)
+
+  # Separate pass: tracemalloc slows allocation down too much to time alongside it.
+  async with async_session_maker() as session:
+    tracemalloc.start()
+    await path(session)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+  scale = 10_000 / rows
+  return {
+    "ms_per_10k": statistics.median(timings) * 1000 * scale,
+    "peak_mib_per_10k": peak / 2**20 * scale,
+    "body_bytes": len(body),
+  }
+
+async def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--rows", type=int, default=10_000)
+  parser.add_argument("--repeat", type=int, default=5)
+  args = parser.parse_args()
+
+  await harness.create_schema()
+  await seed(args.rows)
+  # Warm up imports, statement caches and the SQLite page cache.
+  async with async_session_maker() as session:
+    await before(session)
+    await after(session)
+
+  for name, path in (("before", before), ("after", after)):
+    result = await measure(path, args.rows, args.repeat)
+    print(
+      f"{name:<8} {result['ms_per_10k']:8.1f} ms/10k rows  "
+      f"peak {result['peak_mib_per_10k']:6.1f} MiB/10k rows  body {result['body_bytes']} bytes"
+    )
+
+if __name__ == "__main__":
+  asyncio.run(main())
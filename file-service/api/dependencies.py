@@ -0,0 +1,36 @@
+import hmac
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from core.identity import get_gateway_identity
+from core.config import settings
+from db.models.user import Users
+from db.session import get_async_session
+
+async def verify_identity(request: Request) -> str:
+  # file-service is only reachable through the gateway, which signs the caller's identity.
+  email = get_gateway_identity(request)
+  if not email:
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing or invalid gateway identity")
+  return email
+
+async def get_owner_id(email: str = Depends(verify_identity), session: AsyncSession = Depends(get_async_session)) -> int:
+  result = await session.execute(select(Users.id).where(Users.email == email))
+  owner_id = result.scalar()
+  if owner_id is None:
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+  return owner_id
+
+async def require_superuser(email: str = Depends(verify_identity), session: AsyncSession = Depends(get_async_session)) -> str:
+  result = await session.execute(select(Users.is_superuser).where(Users.email == email))
+  if not result.scalar():
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Superuser privileges required")
+  return email
+
+def require_ops_token(request: Request):
+  """Guards service-wide endpoints such as /metrics behind OPS_TOKEN."""
+  if not settings.OPS_TOKEN:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+  scheme, _, token = request.headers.get("authorization", "").partition(" ")
+  if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.OPS_TOKEN.encode()):
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid operations token", headers={"WWW-Authenticate": "Bearer"})
@@ -0,0 +1,248 @@
+from collections.abc import Awaitable, Callable
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.dependencies import get_owner_id, require_superuser
+from core.config import settings
+from core.downloads import SegmentsResponse, content_disposition, etag_matches, http_date, parse_range, strong_etag
+from core.pagination import decode_cursor, encode_cursor
+from core.renditions import RENDERABLE_CONTENT_TYPES, RENDITION_SPECS
+from core.storage import chunk_store, hot_cache
+from db.models.file import File
+from db.session import get_async_session
+from domain.files.entities import FileDeleted, FileResponse, StorageUsage, UploadAborted, UploadCreate, UploadPartResponse, UploadResponse
+from domain.files.repositories import (
+  delete_file, get_file, get_file_by_hash, get_files, get_project_usage, get_rendition, get_user_usage, list_parts,
+  list_project_files,
+)
+from domain.files.services import (
+  abort_upload, complete_upload, download_segments, get_active_upload, get_owned_project_id, renderable_size,
+  rendition_pipeline, start_upload, store_part, store_upload,
+)
+
+router = APIRouter()
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Blob URLs name the bytes themselves, so caches may keep them forever; file ids can be deleted.
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+CONTENT_HASH_PATTERN = "^[0-9a-f]{64}$"
+
+def reject_oversized(request: Request, limit: int):
+  content_length = request.headers.get("content-length")
+  if content_length and content_length.isdigit() and int(content_length) > limit:
+    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+
+async def upload_response(session: AsyncSession, upload) -> dict:
+  parts = await list_parts(session, upload.id)
+  return {
+    "upload_id": upload.id,
+    "name": upload.name,
+    "content_type": upload.content_type,
+    "expires_at": upload.expires_at,
+    "parts": [{"part_number": part.part_number, "size": part.size} for part in parts],
+  }
+
+async def serve_content(
+  request: Request, *, content_hash: str, size: int, content_type: str, name: str, modified,
+  cache_control: str, segments: Callable[[int, int], Awaitable[list[tuple[str, int, int]]]],
+):
+  etag = strong_etag(content_hash)
+  headers = {
+    "ETag": etag,
+    "Last-Modified": http_date(modified),
+    "Cache-Control": cache_control,
+  }
+  if_none_match = request.headers.get("if-none-match")
+  if if_none_match and etag_matches(if_none_match, etag, weak=True):
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+  headers.update({
+    "Accept-Ranges": "bytes",
+    "Content-Type": content_type,
+    "Content-Disposition": content_disposition(name),
+    # Uploaded content is served from the API origin; never let a browser run it.
+    "X-Content-Type-Options": "nosniff",
+    "Content-Security-Policy": "sandbox",
+  })
+  byte_range = None
+  range_header = request.headers.get("range")
+  if range_header and size:
+    # A stale If-Range means the client's partial copy is of other content: send it all.
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() in (etag, headers["Last-Modified"]):
+      byte_range = parse_range(range_header, size)
+
+  start, end = byte_range or (0, size - 1)
+  headers["Content-Length"] = str(end - start + 1)
+  status_code = status.HTTP_200_OK
+  if byte_range is not None:
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    status_code = status.HTTP_206_PARTIAL_CONTENT
+  return SegmentsResponse(await segments(start, end) if size else [], status_code, headers)
+
+async def serve_file(request: Request, session: AsyncSession, file: File, cache_control: str):
+  async def segments(start: int, end: int):
+    return await download_segments(session, file, start, end)
+
+  return await serve_content(
+    request, content_hash=file.content_hash, size=file.size, content_type=file.content_type,
+    name=file.name, modified=file.created_at, cache_control=cache_control, segments=segments,
+  )
+
+def usage_response(usage, quota_bytes: int) -> dict:
+  return {"bytes": usage.bytes if usage else 0, "files": usage.files if usage else 0, "quota_bytes": quota_bytes}
+
+@router.post('/upload', response_model=FileResponse, tags=['Files'])
+async def upload_file(
+  request: Request,
+  name: str = Query(min_length=1, max_length=1024),
+  project: str | None = None,
+  owner_id: int = Depends(get_owner_id),
+  session: AsyncSession = Depends(get_async_session),
+):
+  reject_oversized(request, settings.MAX_UPLOAD_BYTES)
+  content_type = request.headers.get("content-type", "application/octet-stream")
+  project_id = await get_owned_project_id(session, owner_id, project) if project else None
+  content_length = request.headers.get("content-length", "")
+  expected_size = int(content_length) if content_length.isdigit() else 0
+  return await store_upload(session, owner_id, name, content_type, request.stream(), project_id, expected_size)
+
+@router.get('/batch', response_model=list[FileResponse], tags=['Files'])
+async def get_files_batch(
+  ids: list[int] = Query(min_length=1, max_length=settings.FILES_MAX_BATCH_SIZE),
+  owner_id: int = Depends(get_owner_id),
+  session: AsyncSession = Depends(get_async_session),
+):
+  """The requested files in the order asked for; ids that are not the caller's are left out."""
+  files = {file.id: file for file in await get_files(session, owner_id, list(set(ids)))}
+  return [files[file_id] for file_id in dict.fromkeys(ids) if file_id in files]
+
+@router.get('/usage', response_model=StorageUsage, tags=['Files'])
+async def get_storage_usage(owner_id: int = Depends(get_owner_id), session: AsyncSession = Depends(get_async_session)):
+  return usage_response(await get_user_usage(session, owner_id), settings.USER_STORAGE_QUOTA_BYTES)
+
+@router.get('/projects/{project_link}/files', response_model=list[FileResponse], tags=['Files'])
+async def get_project_files(
+  response: Response,
+  project_link: str,
+  cursor: str | None = None,
+  limit: int | None = Query(None, ge=1, le=settings.FILES_MAX_PAGE_SIZE),
+  owner_id: int = Depends(get_owner_id),
+  session: AsyncSession = Depends(get_async_session),
+):
+  project_id = await get_owned_project_id(session, owner_id, project_link)
+  after = decode_cursor(cursor) if cursor else None
+  files, last_id = await list_project_files(session, project_id, after, limit or settings.FILES_PAGE_SIZE)
+  if last_id is not None:
+    response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last_id)
+  return files
+
+@router.get('/projects/{project_link}/usage', response_model=StorageUsage, tags=['Files'])
+async def get_project_storage_usage(project_link: str, owner_id: int = Depends(get_owner_id), session: AsyncSession = Depends(get_async_session)):
+  project_id = await get_owned_project_id(session, owner_id, project_link)
+  return usage_response(await get_project_usage(session, project_id), settings.PROJECT_STORAGE_QUOTA_BYTES)
+
+@router.post('/uploads', response_model=UploadResponse, tags=['Uploads'])
+async def create_upload_session(upload: UploadCreate, owner_id: int = Depends(get_owner_id), session: AsyncSession = Depends(get_async_session)):
+  project_id = await get_owned_project_id(session, owner_id, upload.project) if upload.project else None
+  new_upload = await start_upload(session, owner_id, upload.name, upload.content_type, project_id)
+  return await upload_response(session, new_upload)
+
+@router.get('/uploads/{upload_id}', response_model=UploadResponse, tags=['Uploads'])
+async def get_upload_session(upload_id: str, owner_id: int = Depends(get_owner_id), session: AsyncSession = Depends(get_async_session)):
+  upload = await get_active_upload(session, owner_id, upload_id)
+  return await upload_response(session, upload)
+
+@router.put('/uploads/{upload_id}/parts/{part_number}', response_model=UploadPartResponse, tags=['Uploads'])
+async def upload_part(
+  request: Request,
+  upload_id: str,
+  part_number: int = Path(ge=1, le=settings.UPLOAD_MAX_PARTS),
+  owner_id: int = Depends(get_owner_id),
+  session: AsyncSession = Depends(get_async_session),
+):
+  reject_oversized(request, settings.UPLOAD_PART_MAX_BYTES)
+  size = await store_part(session, owner_id, upload_id, part_number, request.stream())
+  return {"part_number": part_number, "size": size}
+
+@router.post('/uploads/{upload_id}/complete', response_model=FileResponse, tags=['Uploads'])
+async def complete_upload_session(upload_id: str, owner_id: int = Depends(get_owner_id), session: AsyncSession = Depends(get_async_session)):
+  return await complete_upload(session, owner_id, upload_id)
+
+@router.delete('/uploads/{upload_id}', response_model=UploadAborted, tags=['Uploads'])
+async def abort_upload_session(upload_id: str, owner_id: int = Depends(get_owner_id), session: AsyncSession = Depends(get_async_session)):
+  await abort_upload(session, owner_id, upload_id)
+  return {"message": "Upload aborted"}
+
+@router.api_route('/blob/{content_hash}', methods=['GET', 'HEAD'], tags=['Files'])
+async def download_blob(
+  request: Request,
+  content_hash: str = Path(pattern=CONTENT_HASH_PATTERN),
+  owner_id: int = Depends(get_owner_id),
+  session: AsyncSession = Depends(get_async_session),
+):
+  file = await get_file_by_hash(session, owner_id, content_hash)
+  if file is None:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+  return await serve_file(request, session, file, IMMUTABLE_CACHE_CONTROL)
+
+@router.api_route('/{file_id}/content', methods=['GET', 'HEAD'], tags=['Files'])
+async def download_file(request: Request, file_id: int, owner_id: int = Depends(get_owner_id), session: AsyncSession = Depends(get_async_session)):
+  file = await get_file(session, owner_id, file_id)
+  if file is None:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+  return await serve_file(request, session, file, REVALIDATE_CACHE_CONTROL)
+
+@router.get('/cache/stats', tags=['Files'])
+async def hot_cache_stats(email: str = Depends(require_superuser)):
+  return hot_cache.stats()
+
+@router.get('/renditions/stats', tags=['Renditions'])
+async def rendition_stats(email: str = Depends(require_superuser)):
+  return rendition_pipeline.stats()
+
+@router.api_route('/{file_id}/renditions/{spec_name}', methods=['GET', 'HEAD'], tags=['Renditions'])
+async def download_rendition(
+  request: Request, file_id: int, spec_name: str,
+  owner_id: int = Depends(get_owner_id), session: AsyncSession = Depends(get_async_session),
+):
+  spec = RENDITION_SPECS.get(spec_name)
+  file = await get_file(session, owner_id, file_id)
+  if spec is None or file is None or file.content_type not in RENDERABLE_CONTENT_TYPES:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rendition not found")
+  if not renderable_size(file.size):
+    raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="No preview can be made of this file")
+
+  rendition = await get_rendition(session, file.content_hash, spec.key)
+  if rendition is None:
+    if not rendition_pipeline.submit(file.content_hash, spec):
+      raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Rendition queue is full", headers={"Retry-After": "10"})
+    return JSONResponse({"status": "pending"}, status_code=status.HTTP_202_ACCEPTED, headers={"Retry-After": "2"})
+  if rendition.chunk_hash is None:
+    raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="No preview can be made of this file")
+
+  async def segments(start: int, end: int):
+    return [(chunk_store.path(rendition.chunk_hash), start, end - start + 1)]
+
+  return await serve_content(
+    request, content_hash=rendition.chunk_hash, size=rendition.size, content_type=rendition.content_type,
+    name=f"{spec.name}.{spec.format.lower()}", modified=rendition.created_at,
+    cache_control=REVALIDATE_CACHE_CONTROL, segments=segments,
+  )
+
+@router.get('/{file_id}', response_model=FileResponse, tags=['Files'])
+async def get_file_info(file_id: int, owner_id: int = Depends(get_owner_id), session: AsyncSession = Depends(get_async_session)):
+  file = await get_file(session, owner_id, file_id)
+  if file is None:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+  return file
+
+@router.delete('/{file_id}', response_model=FileDeleted, tags=['Files'])
+async def remove_file(file_id: int, owner_id: int = Depends(get_owner_id), session: AsyncSession = Depends(get_async_session)):
+  if not await delete_file(session, owner_id, file_id):
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+  await session.commit()
+
+  return {"message": "File deleted successfully"}
@@ -11,6 +11,41 @@ class Settings(BaseSettings):
   SECRET_KEY: str = os.getenv("SECRET_KEY")
   ALGORITHM: str = os.getenv("ALGORITHM")
   REDIS_URL: str = os.getenv("REDIS_URL")
+  # Bearer token Prometheus sends for /metrics; the endpoint answers 404 while it is unset.
+  OPS_TOKEN: str = os.getenv("OPS_TOKEN", "")
+
+  STORAGE_ROOT: str = "/var/lib/keplerix/storage"
+  STORAGE_CHUNK_SIZE: int = 4 * 1024 * 1024
+  MAX_UPLOAD_BYTES: int = 2 * 1024 * 1024 * 1024
+  # Chunks nobody references are kept this long, so an upload still in flight can claim them.
+  STORAGE_GC_GRACE_SECONDS: int = 3600
+  STORAGE_GC_INTERVAL_SECONDS: int = 600
+  STORAGE_GC_BATCH_SIZE: int = 1000
+
+  # Logical bytes per owner and per project, checked against running totals on every upload.
+  USER_STORAGE_QUOTA_BYTES: int = 50 * 1024 * 1024 * 1024
+  PROJECT_STORAGE_QUOTA_BYTES: int = 10 * 1024 * 1024 * 1024
+
+  FILES_PAGE_SIZE: int = 100
+  FILES_MAX_PAGE_SIZE: int = 1000
+  FILES_MAX_BATCH_SIZE: int = 100
+
+  UPLOAD_SESSION_TTL_SECONDS: int = 24 * 3600
+  UPLOAD_MAX_PARTS: int = 10000
+  UPLOAD_PART_MAX_BYTES: int = 512 * 1024 * 1024
+
+  RENDITION_WORKERS: int = 2
+  RENDITION_QUEUE_SIZE: int = 1000
+  RENDITION_MAX_SOURCE_BYTES: int = 64 * 1024 * 1024
+  RENDITION_MAX_PIXELS: int = 50_000_000
+  # Times a source may take down a worker before it is given up on like an unreadable image.
+  RENDITION_MAX_CRASHES: int = 2
+
+  # Per worker; the maps share the page cache, so workers do not multiply the memory used.
+  HOT_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+  HOT_CACHE_MAX_ENTRY_BYTES: int = 16 * 1024 * 1024
+  HOT_CACHE_MIN_HITS: int = 2
+  HOT_CACHE_SAMPLE_SIZE: int = 100_000
 
   class Config:
     env_file = ".env"
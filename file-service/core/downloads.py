@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from urllib.parse import quote
+from fastapi import HTTPException, status
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+from core.storage import hot_cache
+
+logger = logging.getLogger(__name__)
+
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+# Fallback read size: the only buffer a download holds when the server cannot sendfile.
+READ_BLOCK_SIZE = 256 * 1024
+
+def strong_etag(content_hash: str) -> str:
+  return f'"{content_hash}"'
+
+def http_date(moment: datetime) -> str:
+  # SQLite hands timestamps back naive; they were written in UTC.
+  if moment.tzinfo is None:
+    moment = moment.replace(tzinfo=timezone.utc)
+  return format_datetime(moment, usegmt=True)
+
+def etag_matches(header: str, etag: str, weak: bool) -> bool:
+  """If-None-Match uses the weak comparison, If-Match and If-Range the strong one."""
+  for candidate in (value.strip() for value in header.split(",")):
+    if candidate == "*":
+      return True
+    if weak and candidate.startswith("W/"):
+      candidate = candidate[2:]
+    if candidate == etag:
+      return True
+  return False
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+  """Returns the inclusive byte range a `Range` header asks for, or None to serve the whole file.
+
+  Only single ranges are honoured; for several ranges the RFC allows answering with the
+  full content, which is what we do. An unsatisfiable range raises 416.
+  """
+  unit, _, ranges = header.partition("=")
+  if unit.strip().lower() != "bytes" or "," in ranges:
+    return None
+  first, separator, last = ranges.strip().partition("-")
+  if not separator or not (first.isdigit() or last.isdigit()):
+    return None
+  if not first:
+    suffix = int(last)
+    start, end = max(0, size - suffix), size - 1
+    if suffix == 0:
+      start = size
+  else:
+    start = int(first)
+    end = min(int(last), size - 1) if last.isdigit() else size - 1
+    if last.isdigit() and int(last) < start:
+      return None
+  if start >= size:
+    raise HTTPException(
+      status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+      detail="Range not satisfiable",
+      headers={"Content-Range": f"bytes */{size}"},
+    )
+  return start, end
+
+def content_disposition(name: str) -> str:
+  return f"inline; filename*=UTF-8''{quote(name, safe='')}"
+
+class DownloadAborted(Exception):
+  """Raised to drop the connection when a download cannot be finished after its headers were sent."""
+
+class SegmentsResponse(Response):
+  """Streams a file stored as separate segments, each an (path, offset, count) slice of a blob.
+
+  Blobs in the hot cache are sent as slices of their memory maps. For the rest, when the
+  server advertises the ASGI zero-copy extension the segment is handed to it as an open
+  file, so the kernel moves the bytes with sendfile. Otherwise it is read in
+  READ_BLOCK_SIZE blocks off the event loop, keeping memory flat for any size.
+  """
+
+  def __init__(self, segments: list[tuple[str, int, int]], status_code: int, headers: dict[str, str]):
+    self.segments = segments
+    self.status_code = status_code
+    self.background = None
+    self.init_headers(headers)
+
+  async def __call__(self, scope: Scope, receive: Receive, send: Send):
+    await send({
+      "type": "http.response.start",
+      "status": self.status_code,
+      "headers": self.raw_headers,
+    })
+    if scope["method"] == "HEAD" or not self.segments:
+      await send({"type": "http.response.body", "body": b"", "more_body": False})
+      return
+
+    zerocopy = ZEROCOPY_EXTENSION in scope.get("extensions", {})
+    try:
+      await self.send_segments(send, zerocopy)
+    except OSError as error:
+      # Most likely the file was deleted and its blobs collected mid-download. The status
+      # line has gone out, so all that is left is to cut the response short.
+      logger.warning("Download aborted: %s", error)
+      raise DownloadAborted(str(error)) from None
+
+  async def send_segments(self, send: Send, zerocopy: bool):
+    last = len(self.segments) - 1
+    for index, (path, offset, count) in enumerate(self.segments):
+      region = await hot_cache.lookup(path)
+      if region is not None:
+        await send({"type": "http.response.body", "body": memoryview(region)[offset:offset + count], "more_body": index < last})
+        hot_cache.bytes_served += count
+        continue
+      if zerocopy:
+        blob = await asyncio.to_thread(open, path, "rb")
+        with blob:
+          await send({"type": ZEROCOPY_EXTENSION, "file": blob.fileno(), "offset": offset, "count": count, "more_body": index < last})
+        continue
+      descriptor = await asyncio.to_thread(os.open, path, os.O_RDONLY)
+      try:
+        end = offset + count
+        while offset < end:
+          block = await asyncio.to_thread(os.pread, descriptor, min(READ_BLOCK_SIZE, end - offset), offset)
+          if not block:
+            raise OSError(f"{path} is shorter than its manifest entry")
+          offset += len(block)
+          await send({"type": "http.response.body", "body": block, "more_body": index < last or offset < end})
+      finally:
+        os.close(descriptor)
@@ -0,0 +1,18 @@
+import base64
+from fastapi import HTTPException, status
+
+# Keyset cursors are opaque to clients: the id of the last file they have seen.
+# File ids are INTEGER columns; anything wider would fail in the driver rather than here.
+MAX_ROW_ID = 2**31 - 1
+
+def encode_cursor(row_id: int) -> str:
+  return base64.urlsafe_b64encode(str(row_id).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+  try:
+    row_id = int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    if not -MAX_ROW_ID - 1 <= row_id <= MAX_ROW_ID:
+      raise ValueError(f"Row id out of range: {row_id}")
+    return row_id
+  except (ValueError, TypeError):
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
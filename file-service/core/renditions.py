@@ -0,0 +1,53 @@
+import io
+from dataclasses import dataclass
+from PIL import Image, ImageOps
+
+# Runs in the rendition process pool, which imports only this module: keep it free of app imports.
+
+RENDERABLE_CONTENT_TYPES = frozenset({
+  "image/png", "image/jpeg", "image/webp", "image/gif", "image/bmp", "image/tiff",
+})
+
+@dataclass(frozen=True)
+class RenditionSpec:
+  name: str
+  max_size: int
+  format: str = "WEBP"
+  quality: int = 80
+
+  @property
+  def key(self) -> str:
+    # Part of the cache key, so changing a spec's parameters renders it afresh.
+    return f"{self.name}:{self.max_size}:{self.format}:{self.quality}"
+
+  @property
+  def content_type(self) -> str:
+    return f"image/{self.format.lower()}"
+
+RENDITION_SPECS = {
+  spec.name: spec for spec in (
+    RenditionSpec("thumb-256", 256),
+    RenditionSpec("preview-1024", 1024),
+  )
+}
+
+def render(paths: list[str], spec: RenditionSpec, max_pixels: int) -> tuple[bytes, int, int]:
+  """Decodes the image stored across `paths` and returns it downscaled to fit spec.max_size."""
+  # Pillow raises DecompressionBombError past twice this; a crafted header cannot exhaust memory.
+  Image.MAX_IMAGE_PIXELS = max_pixels
+  source = io.BytesIO()
+  for path in paths:
+    with open(path, "rb") as blob:
+      source.write(blob.read())
+  source.seek(0)
+
+  with Image.open(source) as image:
+    # Lets the JPEG decoder scale down by powers of two while decoding.
+    image.draft("RGB", (spec.max_size, spec.max_size))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+      image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+    image.thumbnail((spec.max_size, spec.max_size), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format=spec.format, quality=spec.quality)
+    return output.getvalue(), image.width, image.height
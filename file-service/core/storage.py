@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import mmap
+import os
+import tempfile
+from collections import Counter, OrderedDict
+from collections.abc import AsyncIterable, AsyncIterator
+from core.config import settings
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+class ChunkStore:
+  """Local filesystem backend for content-addressed chunks.
+
+  A chunk lives at <root>/<hash[0:2]>/<hash[2:4]>/<hash>, so no directory grows past
+  a few thousand entries. Blobs are immutable: a hash names exactly one byte string,
+  which makes writing an already stored chunk a no-op.
+  """
+
+  def __init__(self, root: str):
+    self.root = root
+
+  def path(self, chunk_hash: str) -> str:
+    return os.path.join(self.root, chunk_hash[:2], chunk_hash[2:4], chunk_hash)
+
+  def exists(self, chunk_hash: str) -> bool:
+    return os.path.exists(self.path(chunk_hash))
+
+  def write(self, chunk_hash: str, data: bytes):
+    path = self.path(chunk_hash)
+    if os.path.exists(path):
+      return
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Write under a temporary name and rename, so readers never see a partial chunk
+    # and two uploads of the same chunk cannot interleave their bytes.
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+      with os.fdopen(descriptor, "wb") as blob:
+        blob.write(data)
+        blob.flush()
+        os.fsync(blob.fileno())
+      os.replace(temporary, path)
+    except BaseException:
+      os.unlink(temporary)
+      raise
+
+  def read(self, chunk_hash: str) -> bytes:
+    with open(self.path(chunk_hash), "rb") as blob:
+      return blob.read()
+
+  def content_hash(self, chunk_hashes: list[str]) -> str:
+    """SHA-256 of the concatenated chunks, read back one block at a time."""
+    content_hash = hashlib.sha256()
+    for chunk_hash in chunk_hashes:
+      with open(self.path(chunk_hash), "rb") as blob:
+        while block := blob.read(READ_BLOCK_SIZE):
+          content_hash.update(block)
+    return content_hash.hexdigest()
+
+  def delete(self, chunk_hash: str):
+    try:
+      os.unlink(self.path(chunk_hash))
+    except FileNotFoundError:
+      pass
+
+chunk_store = ChunkStore(settings.STORAGE_ROOT)
+
+def map_blob(path: str) -> mmap.mmap:
+  """Maps a stored blob read-only; the pages come from the page cache on first touch, not now."""
+  with open(path, "rb") as blob:
+    return mmap.mmap(blob.fileno(), 0, access=mmap.ACCESS_READ)
+
+class HotCache:
+  """Memory maps of the most read blobs, kept within a total byte budget.
+
+  Admission is frequency based, after TinyLFU: every lookup counts towards its blob,
+  a blob is mapped once it has been asked for min_hits times, and it only gets in if it
+  is more popular than each of the least recently used entries it would push out. A large
+  blob read a few times therefore cannot flush many small hot ones. Counts are halved every
+  sample_size lookups, which both ages popularity and bounds the counter's size.
+  The sizes of rejected blobs are kept for the same window, so losing candidates are
+  judged again without being mapped again.
+
+  Responses send memoryview slices of the maps, so a hit copies nothing in this process.
+  An evicted map is closed once no response is still sending from it.
+  """
+
+  def __init__(self, max_bytes: int, max_entry_bytes: int, min_hits: int, sample_size: int):
+    self.max_bytes = max_bytes
+    self.max_entry_bytes = max_entry_bytes
+    self.min_hits = min_hits
+    self.sample_size = sample_size
+    self.entries: OrderedDict[str, mmap.mmap] = OrderedDict()
+    self.frequencies: Counter = Counter()
+    self.loading: set[str] = set()
+    self.rejected_sizes: dict[str, int] = {}
+    self.lookups = 0
+    self.size = 0
+
+    self.hits = 0
+    self.misses = 0
+    self.admissions = 0
+    self.rejections = 0
+    self.evictions = 0
+    self.bytes_served = 0
+
+  async def lookup(self, path: str) -> mmap.mmap | None:
+    """The blob's map, mapping it first when it has just become popular enough to admit."""
+    region = self.get(path)
+    if region is None and self.wants(path):
+      self.loading.add(path)
+      try:
+        region = await asyncio.to_thread(map_blob, path)
+      finally:
+        self.loading.discard(path)
+      if not self.put(path, region):
+        region = None
+    return region
+
+  def get(self, path: str) -> mmap.mmap | None:
+    self.record(path)
+    region = self.entries.get(path)
+    if region is None:
+      self.misses += 1
+      return None
+    self.entries.move_to_end(path)
+    self.hits += 1
+    return region
+
+  def record(self, path: str):
+    self.frequencies[path] += 1
+    self.lookups += 1
+    if self.lookups >= self.sample_size:
+      self.frequencies = Counter({key: count // 2 for key, count in self.frequencies.items() if count > 1})
+      self.rejected_sizes.clear()
+      self.lookups = 0
+
+  def wants(self, path: str) -> bool:
+    """Whether a missed blob is popular enough to be worth mapping and offering to put()."""
+    if self.max_bytes <= 0 or self.frequencies[path] < self.min_hits or path in self.entries or path in self.loading:
+      return False
+    size = self.rejected_sizes.get(path)
+    return size is None or self.victims(path, size) is not None
+
+  def victims(self, path: str, size: int) -> list[str] | None:
+    """Entries to evict to make room for the blob, or None when it should not get in."""
+    if size > self.max_entry_bytes or path in self.entries:
+      return None
+    frequency = self.frequencies[path]
+    victims = []
+    free = self.max_bytes - self.size
+    for key, region in self.entries.items():
+      if free >= size:
+        break
+      if self.frequencies[key] >= frequency:
+        return None
+      victims.append(key)
+      free += len(region)
+    return victims if free >= size else None
+
+  def put(self, path: str, region: mmap.mmap) -> bool:
+    """Admits a freshly mapped blob, evicting less popular entries; returns whether it was kept."""
+    size = len(region)
+    victims = self.victims(path, size)
+    if victims is None:
+      self.rejections += 1
+      self.rejected_sizes[path] = size
+      close_region(region)
+      return False
+    self.rejected_sizes.pop(path, None)
+    for key in victims:
+      self.discard(key)
+      self.evictions += 1
+    self.entries[path] = region
+    self.size += size
+    self.admissions += 1
+    return True
+
+  def discard(self, path: str):
+    region = self.entries.pop(path, None)
+    if region is not None:
+      self.size -= len(region)
+      close_region(region)
+
+  def stats(self) -> dict:
+    lookups = self.hits + self.misses
+    return {
+      "entries": len(self.entries),
+      "bytes": self.size,
+      "max_bytes": self.max_bytes,
+      "hits": self.hits,
+      "misses": self.misses,
+      "hit_rate": self.hits / lookups if lookups else 0.0,
+      "admissions": self.admissions,
+      "rejections": self.rejections,
+      "evictions": self.evictions,
+      "bytes_served": self.bytes_served,
+    }
+
+def close_region(region: mmap.mmap):
+  try:
+    region.close()
+  except BufferError:
+    # A response still holds a slice; the map is released with the last one.
+    pass
+
+hot_cache = HotCache(
+  settings.HOT_CACHE_MAX_BYTES,
+  settings.HOT_CACHE_MAX_ENTRY_BYTES,
+  settings.HOT_CACHE_MIN_HITS,
+  settings.HOT_CACHE_SAMPLE_SIZE,
+)
+
+def digest(chunk: bytes, content_hash: "hashlib._Hash") -> str:
+  """Hashes one chunk and feeds it to the running hash of the whole file; run off the event loop."""
+  content_hash.update(chunk)
+  return hashlib.sha256(chunk).hexdigest()
+
+async def iter_chunks(stream: AsyncIterable[bytes], chunk_size: int) -> AsyncIterator[bytes]:
+  """Regroups an arbitrary byte stream into chunk_size pieces (the last may be shorter).
+
+  At most one chunk plus one incoming piece is held in memory, whatever the stream length.
+  """
+  buffer = bytearray()
+  async for piece in stream:
+    buffer += piece
+    while len(buffer) >= chunk_size:
+      yield bytes(buffer[:chunk_size])
+      del buffer[:chunk_size]
+  if buffer:
+    yield bytes(buffer)
@@ -0,0 +1,111 @@
+from datetime import datetime, timezone
+from sqlalchemy import BigInteger, Column, ForeignKey, ForeignKeyConstraint, Index, Integer, String, TIMESTAMP
+from db.base import Base
+
+def utcnow():
+  return datetime.now(timezone.utc)
+
+class Chunk(Base):
+  """A stored blob, named by the SHA-256 of its bytes and shared by every file that contains it."""
+  __tablename__ = "chunks"
+
+  hash = Column(String(64), primary_key=True)
+  size = Column(Integer, nullable=False)
+  # Manifest entries pointing here; 0 means garbage once touched_at is older than the GC grace period.
+  ref_count = Column(Integer, nullable=False, default=0, server_default="0")
+  touched_at = Column(TIMESTAMP(timezone=True), nullable=False, default=utcnow)
+
+class File(Base):
+  __tablename__ = "files"
+
+  id = Column(Integer, primary_key=True, autoincrement=True)
+  owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+  name = Column(String(length=1024), nullable=False)
+  content_type = Column(String(length=255), nullable=False)
+  size = Column(BigInteger, nullable=False)
+  # SHA-256 of the whole content, independent of how it was chunked.
+  content_hash = Column(String(64), nullable=False, index=True)
+  # A deleted project leaves its files with the owner, unfiled.
+  project_id = Column(Integer, ForeignKey("projects.id", ondelete="SET NULL"), nullable=True)
+  created_at = Column(TIMESTAMP(timezone=True), nullable=False, default=utcnow)
+
+  # Project listings page newest first by id; keep in step with migration 7f2b9d4c1e36.
+  __table_args__ = (
+    Index("ix_files_project_id_id", project_id, id.desc()),
+  )
+
+class UserStorageUsage(Base):
+  """Running totals of a user's files, kept in step with every add and delete so quota checks read one row."""
+  __tablename__ = "user_storage_usage"
+
+  user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+  # Logical bytes: a file counts in full even when its chunks are shared with other files.
+  bytes = Column(BigInteger, nullable=False, default=0, server_default="0")
+  files = Column(Integer, nullable=False, default=0, server_default="0")
+
+class ProjectStorageUsage(Base):
+  __tablename__ = "project_storage_usage"
+
+  project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+  bytes = Column(BigInteger, nullable=False, default=0, server_default="0")
+  files = Column(Integer, nullable=False, default=0, server_default="0")
+
+class FileChunk(Base):
+  """One manifest entry: the file's bytes at [offset, offset + size) are chunk `chunk_hash`."""
+  __tablename__ = "file_chunks"
+
+  file_id = Column(Integer, ForeignKey("files.id", ondelete="CASCADE"), primary_key=True)
+  position = Column(Integer, primary_key=True)
+  offset = Column(BigInteger, nullable=False)
+  size = Column(Integer, nullable=False)
+  chunk_hash = Column(String(64), ForeignKey("chunks.hash"), nullable=False, index=True)
+
+class Rendition(Base):
+  """A derived artifact, shared by every file with the same content; chunk_hash is NULL when rendering failed."""
+  __tablename__ = "renditions"
+
+  content_hash = Column(String(64), primary_key=True)
+  spec = Column(String(64), primary_key=True)
+  chunk_hash = Column(String(64), ForeignKey("chunks.hash"), nullable=True)
+  content_type = Column(String(length=255), nullable=False)
+  width = Column(Integer, nullable=True)
+  height = Column(Integer, nullable=True)
+  size = Column(Integer, nullable=True)
+  created_at = Column(TIMESTAMP(timezone=True), nullable=False, default=utcnow)
+
+class UploadSession(Base):
+  """A multipart upload in progress; parts arrive independently until it is completed or expires."""
+  __tablename__ = "upload_sessions"
+
+  id = Column(String(32), primary_key=True)
+  owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+  name = Column(String(length=1024), nullable=False)
+  content_type = Column(String(length=255), nullable=False)
+  project_id = Column(Integer, ForeignKey("projects.id", ondelete="SET NULL"), nullable=True)
+  # Sum of the received parts' sizes, kept up to date as parts are stored or replaced.
+  received_bytes = Column(BigInteger, nullable=False, default=0, server_default="0")
+  created_at = Column(TIMESTAMP(timezone=True), nullable=False, default=utcnow)
+  expires_at = Column(TIMESTAMP(timezone=True), nullable=False, index=True)
+
+class UploadPart(Base):
+  __tablename__ = "upload_parts"
+
+  upload_id = Column(String(32), ForeignKey("upload_sessions.id", ondelete="CASCADE"), primary_key=True)
+  part_number = Column(Integer, primary_key=True)
+  size = Column(BigInteger, nullable=False)
+
+class UploadPartChunk(Base):
+  """Manifest of one part. Holds chunk references so a long upload's parts outlive the GC grace period."""
+  __tablename__ = "upload_part_chunks"
+
+  upload_id = Column(String(32), primary_key=True)
+  part_number = Column(Integer, primary_key=True)
+  position = Column(Integer, primary_key=True)
+  size = Column(Integer, nullable=False)
+  chunk_hash = Column(String(64), ForeignKey("chunks.hash"), nullable=False)
+
+  __table_args__ = (
+    ForeignKeyConstraint(
+      [upload_id, part_number], [UploadPart.upload_id, UploadPart.part_number], ondelete="CASCADE",
+    ),
+  )
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, ForeignKey, Integer, String
+from db.base import Base
+
+class Project(Base):
+  """Read-only view of the projects table owned by user-service; only what filing uploads needs."""
+  __tablename__ = "projects"
+
+  id = Column(Integer, primary_key=True)
+  user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+  link = Column(String, unique=True, nullable=False)
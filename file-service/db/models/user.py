@@ -0,0 +1,10 @@
+from sqlalchemy import Boolean, Column, Integer, String
+from db.base import Base
+
+class Users(Base):
+  """Read-only view of the users table owned by user-service; only what file ownership and admin checks need."""
+  __tablename__ = "users"
+
+  id = Column(Integer, primary_key=True)
+  email = Column(String(length=320), unique=True, index=True, nullable=False)
+  is_superuser = Column(Boolean, default=False)
@@ -0,0 +1,13 @@
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from core.config import settings
+from core.metrics import instrument_engine
+
+DATABASE_URL = settings.DATABASE_URL_ASYNC
+
+engine = create_async_engine(DATABASE_URL)
+async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+instrument_engine(engine, "primary")
+
+async def get_async_session():
+  async with async_session_maker() as session:
+    yield session
@@ -0,0 +1,38 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+
+class FileResponse(BaseModel):
+  id: int
+  name: str
+  content_type: str
+  size: int
+  content_hash: str
+  created_at: datetime
+
+class FileDeleted(BaseModel):
+  message: str
+
+class StorageUsage(BaseModel):
+  bytes: int
+  files: int
+  quota_bytes: int
+
+class UploadCreate(BaseModel):
+  name: str = Field(min_length=1, max_length=1024)
+  content_type: str = Field("application/octet-stream", max_length=255)
+  # Link of the project to file the upload under.
+  project: str | None = None
+
+class UploadPartResponse(BaseModel):
+  part_number: int
+  size: int
+
+class UploadResponse(BaseModel):
+  upload_id: str
+  name: str
+  content_type: str
+  expires_at: datetime
+  parts: list[UploadPartResponse]
+
+class UploadAborted(BaseModel):
+  message: str
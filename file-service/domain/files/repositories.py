@@ -0,0 +1,309 @@
+from collections import Counter
+from datetime import datetime, timezone
+from sqlalchemy import bindparam, delete, func, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from db.models.file import (
+  Chunk, File, FileChunk, ProjectStorageUsage, Rendition, UploadPart, UploadPartChunk, UploadSession, UserStorageUsage,
+)
+from db.models.project import Project
+
+def dialect_insert(session: AsyncSession):
+  # ON CONFLICT is dialect specific in SQLAlchemy; both backends we run on support it.
+  return postgresql.insert if session.bind.dialect.name == "postgresql" else sqlite.insert
+
+async def touch_chunk(session: AsyncSession, chunk_hash: str, size: int):
+  """Registers a chunk an upload is about to rely on and restarts its GC grace period.
+
+  Garbage collection deletes the chunk row before unlinking the blob and holds the row
+  lock until it commits, so once this upsert has committed the blob is either present
+  and safe for the grace period, or already gone and must be written again.
+  """
+  now = datetime.now(timezone.utc)
+  statement = dialect_insert(session)(Chunk).values(hash=chunk_hash, size=size, ref_count=0, touched_at=now)
+  await session.execute(statement.on_conflict_do_update(index_elements=[Chunk.hash], set_={"touched_at": now}))
+
+async def reference_chunks(session: AsyncSession, counts: Counter, delta: int):
+  if not counts:
+    return
+  # Core table rather than the mapped class: an ORM UPDATE with a parameter list is a bulk update by primary key.
+  chunks = Chunk.__table__
+  now = datetime.now(timezone.utc)
+  await session.execute(
+    update(chunks)
+    .where(chunks.c.hash == bindparam("chunk_hash"))
+    .values(ref_count=chunks.c.ref_count + bindparam("delta"), touched_at=now),
+    [{"chunk_hash": chunk_hash, "delta": count * delta} for chunk_hash, count in counts.items()],
+  )
+
+async def adjust_usage(session: AsyncSession, owner_id: int, project_id: int | None, size: int, files: int):
+  # Relative upserts, so concurrent uploads never lose each other's change. The usage rows
+  # are written after the file rows; repair_storage_usage relies on that order.
+  targets = [(UserStorageUsage, UserStorageUsage.user_id, owner_id)]
+  if project_id is not None:
+    targets.append((ProjectStorageUsage, ProjectStorageUsage.project_id, project_id))
+  for model, key, value in targets:
+    statement = dialect_insert(session)(model).values({key.key: value, "bytes": size, "files": files})
+    await session.execute(statement.on_conflict_do_update(
+      index_elements=[key], set_={"bytes": model.bytes + size, "files": model.files + files},
+    ))
+
+async def get_user_usage(session: AsyncSession, owner_id: int) -> Row | None:
+  result = await session.execute(
+    select(UserStorageUsage.bytes, UserStorageUsage.files).where(UserStorageUsage.user_id == owner_id)
+  )
+  return result.first()
+
+async def get_project_usage(session: AsyncSession, project_id: int) -> Row | None:
+  result = await session.execute(
+    select(ProjectStorageUsage.bytes, ProjectStorageUsage.files).where(ProjectStorageUsage.project_id == project_id)
+  )
+  return result.first()
+
+async def get_project_id(session: AsyncSession, owner_id: int, link: str) -> int | None:
+  result = await session.execute(select(Project.id).where(Project.link == link, Project.user_id == owner_id))
+  return result.scalar()
+
+async def add_file(
+  session: AsyncSession, owner_id: int, name: str, content_type: str,
+  size: int, content_hash: str, manifest: list[tuple[str, int, int]], project_id: int | None = None,
+) -> File:
+  """Stores the file row and its manifest of (chunk_hash, offset, size) entries, and takes the chunk references."""
+  file = File(
+    owner_id=owner_id, name=name, content_type=content_type, size=size,
+    content_hash=content_hash, project_id=project_id, created_at=datetime.now(timezone.utc),
+  )
+  session.add(file)
+  await session.flush()
+  if manifest:
+    await session.execute(insert(FileChunk), [
+      {"file_id": file.id, "position": position, "chunk_hash": chunk_hash, "offset": offset, "size": chunk_size}
+      for position, (chunk_hash, offset, chunk_size) in enumerate(manifest)
+    ])
+  await reference_chunks(session, Counter(chunk_hash for chunk_hash, _, _ in manifest), 1)
+  await adjust_usage(session, owner_id, project_id, size, 1)
+  return file
+
+async def get_files(session: AsyncSession, owner_id: int, file_ids: list[int]) -> list[File]:
+  """Batched lookup by primary key; ids the owner has no file for are left out."""
+  result = await session.execute(select(File).where(File.id.in_(file_ids), File.owner_id == owner_id))
+  return result.scalars().all()
+
+async def list_project_files(session: AsyncSession, project_id: int, after: int | None, limit: int) -> tuple[list[File], int | None]:
+  """Newest first; `after` is the id of the last file already returned."""
+  query = select(File).where(File.project_id == project_id).order_by(File.id.desc()).limit(limit + 1)
+  if after is not None:
+    query = query.where(File.id < after)
+  # One extra row tells us whether another page exists without a COUNT.
+  files = (await session.execute(query)).scalars().all()
+  if len(files) <= limit:
+    return files, None
+  files = files[:limit]
+  return files, files[-1].id
+
+async def get_file(session: AsyncSession, owner_id: int, file_id: int) -> File | None:
+  result = await session.execute(select(File).where(File.id == file_id, File.owner_id == owner_id))
+  return result.scalars().first()
+
+async def get_manifest(session: AsyncSession, file_id: int) -> list[FileChunk]:
+  result = await session.execute(select(FileChunk).where(FileChunk.file_id == file_id).order_by(FileChunk.position))
+  return result.scalars().all()
+
+async def get_file_by_hash(session: AsyncSession, owner_id: int, content_hash: str) -> File | None:
+  result = await session.execute(
+    select(File).where(File.owner_id == owner_id, File.content_hash == content_hash).limit(1)
+  )
+  return result.scalars().first()
+
+async def get_manifest_range(session: AsyncSession, file_id: int, start: int, end: int) -> list[FileChunk]:
+  """Manifest entries overlapping the inclusive byte range [start, end]."""
+  result = await session.execute(
+    select(FileChunk)
+    .where(FileChunk.file_id == file_id, FileChunk.offset <= end, FileChunk.offset + FileChunk.size > start)
+    .order_by(FileChunk.position)
+  )
+  return result.scalars().all()
+
+async def delete_file(session: AsyncSession, owner_id: int, file_id: int) -> bool:
+  """Deletes the file and its manifest and drops the chunk references; the blobs are left to GC."""
+  # Manifest first: with ON DELETE CASCADE the entries would otherwise vanish before we read them.
+  owned = select(File.id).where(File.id == file_id, File.owner_id == owner_id).scalar_subquery()
+  result = await session.execute(
+    delete(FileChunk).where(FileChunk.file_id == owned).returning(FileChunk.chunk_hash)
+  )
+  await reference_chunks(session, Counter(result.scalars().all()), -1)
+  result = await session.execute(
+    delete(File).where(File.id == file_id, File.owner_id == owner_id)
+    .returning(File.content_hash, File.size, File.project_id)
+  )
+  deleted = result.first()
+  if deleted is None:
+    return False
+  content_hash = deleted.content_hash
+  await adjust_usage(session, owner_id, deleted.project_id, -deleted.size, -1)
+  # Renditions are shared by content; they go with the last file holding it.
+  remaining = await session.execute(select(File.id).where(File.content_hash == content_hash).limit(1))
+  if remaining.scalar() is None:
+    await delete_renditions(session, content_hash)
+  return True
+
+async def get_content_manifest(session: AsyncSession, content_hash: str) -> list[FileChunk]:
+  """The manifest of any one file with this content; they all hold the same bytes."""
+  result = await session.execute(select(File.id).where(File.content_hash == content_hash).limit(1))
+  file_id = result.scalar()
+  return [] if file_id is None else await get_manifest(session, file_id)
+
+async def get_rendition(session: AsyncSession, content_hash: str, spec: str) -> Rendition | None:
+  result = await session.execute(select(Rendition).where(Rendition.content_hash == content_hash, Rendition.spec == spec))
+  return result.scalars().first()
+
+async def add_rendition(session: AsyncSession, content_hash: str, spec: str, content_type: str, chunk_hash: str | None = None, width: int | None = None, height: int | None = None, size: int | None = None) -> bool:
+  """Records a rendition unless another worker got there first; returns whether this one was kept."""
+  statement = dialect_insert(session)(Rendition).values(
+    content_hash=content_hash, spec=spec, chunk_hash=chunk_hash, content_type=content_type,
+    width=width, height=height, size=size, created_at=datetime.now(timezone.utc),
+  )
+  result = await session.execute(statement.on_conflict_do_nothing().returning(Rendition.spec))
+  inserted = result.scalar() is not None
+  if inserted and chunk_hash is not None:
+    await reference_chunks(session, Counter([chunk_hash]), 1)
+  return inserted
+
+async def delete_renditions(session: AsyncSession, content_hash: str):
+  result = await session.execute(
+    delete(Rendition).where(Rendition.content_hash == content_hash).returning(Rendition.chunk_hash)
+  )
+  await reference_chunks(session, Counter(chunk_hash for chunk_hash in result.scalars().all() if chunk_hash), -1)
+
+async def retouch_chunks(session: AsyncSession, chunk_hashes: set[str]) -> set[str]:
+  """Restarts the GC grace period of chunks an upload still holds no reference to; returns any already collected."""
+  if not chunk_hashes:
+    return set()
+  result = await session.execute(
+    update(Chunk).where(Chunk.hash.in_(chunk_hashes)).values(touched_at=datetime.now(timezone.utc))
+    .returning(Chunk.hash).execution_options(synchronize_session=False)
+  )
+  return chunk_hashes - set(result.scalars().all())
+
+async def delete_orphaned_chunks(session: AsyncSession, touched_before: datetime, limit: int) -> list[str]:
+  orphan = (Chunk.ref_count == 0, Chunk.touched_at < touched_before)
+  orphaned = select(Chunk.hash).where(*orphan).limit(limit).scalar_subquery()
+  # The conditions are repeated on the DELETE itself. Under READ COMMITTED, PostgreSQL
+  # re-checks only this WHERE against a row updated after the subquery picked it, and a
+  # chunk revived meanwhile by touch_chunk or reference_chunks has to survive.
+  result = await session.execute(
+    delete(Chunk).where(Chunk.hash.in_(orphaned), *orphan)
+    .returning(Chunk.hash).execution_options(synchronize_session=False)
+  )
+  return result.scalars().all()
+
+async def create_upload(session: AsyncSession, upload_id: str, owner_id: int, name: str, content_type: str, expires_at: datetime, project_id: int | None = None) -> UploadSession:
+  upload = UploadSession(
+    id=upload_id, owner_id=owner_id, name=name, content_type=content_type,
+    project_id=project_id, created_at=datetime.now(timezone.utc), expires_at=expires_at,
+  )
+  session.add(upload)
+  await session.flush()
+  return upload
+
+async def get_upload(session: AsyncSession, owner_id: int, upload_id: str, for_update: bool = False) -> UploadSession | None:
+  query = select(UploadSession).where(
+    UploadSession.id == upload_id,
+    UploadSession.owner_id == owner_id,
+    UploadSession.expires_at > datetime.now(timezone.utc),
+  )
+  if for_update:
+    query = query.with_for_update()
+  # Reload an upload already in the session; received_bytes moves as parts arrive.
+  result = await session.execute(query.execution_options(populate_existing=True))
+  return result.scalars().first()
+
+async def list_parts(session: AsyncSession, upload_id: str) -> list[UploadPart]:
+  result = await session.execute(select(UploadPart).where(UploadPart.upload_id == upload_id).order_by(UploadPart.part_number))
+  return result.scalars().all()
+
+async def get_part_size(session: AsyncSession, upload_id: str, part_number: int) -> int:
+  result = await session.execute(
+    select(UploadPart.size).where(UploadPart.upload_id == upload_id, UploadPart.part_number == part_number)
+  )
+  return result.scalar() or 0
+
+async def delete_parts(session: AsyncSession, upload_id: str, part_number: int | None = None):
+  """Deletes one part of an upload, or all of them, and drops their chunk references."""
+  part_chunks = [UploadPartChunk.upload_id == upload_id]
+  parts = [UploadPart.upload_id == upload_id]
+  if part_number is not None:
+    part_chunks.append(UploadPartChunk.part_number == part_number)
+    parts.append(UploadPart.part_number == part_number)
+  # Part manifests first, for the same reason as in delete_file.
+  result = await session.execute(delete(UploadPartChunk).where(*part_chunks).returning(UploadPartChunk.chunk_hash))
+  await reference_chunks(session, Counter(result.scalars().all()), -1)
+  await session.execute(delete(UploadPart).where(*parts))
+
+async def replace_part(session: AsyncSession, upload_id: str, part_number: int, size: int, manifest: list[tuple[str, int, int]]):
+  """Records a received part, replacing an earlier upload of the same part number."""
+  previous_size = await get_part_size(session, upload_id, part_number)
+  await delete_parts(session, upload_id, part_number)
+  await session.execute(
+    update(UploadSession).where(UploadSession.id == upload_id)
+    .values(received_bytes=UploadSession.received_bytes - previous_size + size)
+    .execution_options(synchronize_session=False)
+  )
+  await session.execute(insert(UploadPart).values(upload_id=upload_id, part_number=part_number, size=size))
+  if manifest:
+    await session.execute(insert(UploadPartChunk), [
+      {"upload_id": upload_id, "part_number": part_number, "position": position, "chunk_hash": chunk_hash, "size": chunk_size}
+      for position, (chunk_hash, _, chunk_size) in enumerate(manifest)
+    ])
+  await reference_chunks(session, Counter(chunk_hash for chunk_hash, _, _ in manifest), 1)
+
+async def get_upload_manifest(session: AsyncSession, upload_id: str) -> list[tuple[str, int, int]]:
+  """The parts' chunks in file order, as (chunk_hash, offset, size) manifest entries."""
+  result = await session.execute(
+    select(UploadPartChunk.chunk_hash, UploadPartChunk.size)
+    .where(UploadPartChunk.upload_id == upload_id)
+    .order_by(UploadPartChunk.part_number, UploadPartChunk.position)
+  )
+  manifest = []
+  offset = 0
+  for chunk_hash, chunk_size in result.all():
+    manifest.append((chunk_hash, offset, chunk_size))
+    offset += chunk_size
+  return manifest
+
+async def delete_upload(session: AsyncSession, upload_id: str):
+  await delete_parts(session, upload_id)
+  await session.execute(delete(UploadSession).where(UploadSession.id == upload_id))
+
+async def expired_upload_ids(session: AsyncSession, limit: int) -> list[str]:
+  result = await session.execute(
+    select(UploadSession.id)
+    .where(UploadSession.expires_at <= datetime.now(timezone.utc))
+    .limit(limit)
+    .with_for_update(skip_locked=True)
+  )
+  return result.scalars().all()
+
+async def sum_usage_by_user(session: AsyncSession, user_ids: list[int]) -> dict[int, tuple[int, int]]:
+  result = await session.execute(
+    select(File.owner_id, func.sum(File.size), func.count())
+    .where(File.owner_id.in_(user_ids))
+    .group_by(File.owner_id)
+  )
+  return {owner_id: (size, files) for owner_id, size, files in result.all()}
+
+async def sum_usage_by_project(session: AsyncSession, project_ids: list[int]) -> dict[int, tuple[int, int]]:
+  result = await session.execute(
+    select(File.project_id, func.sum(File.size), func.count())
+    .where(File.project_id.in_(project_ids))
+    .group_by(File.project_id)
+  )
+  return {project_id: (size, files) for project_id, size, files in result.all()}
+
+async def lock_usage(session: AsyncSession, model, key, ids: list[int]) -> dict[int, tuple[int, int]]:
+  """Creates any missing usage rows for `ids` and locks them all; returns the stored (bytes, files)."""
+  await session.execute(dialect_insert(session)(model).values([{key.key: row_id} for row_id in ids]).on_conflict_do_nothing())
+  result = await session.execute(select(key, model.bytes, model.files).where(key.in_(ids)).with_for_update())
+  return {row_id: (size, files) for row_id, size, files in result.all()}
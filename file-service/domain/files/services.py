@@ -0,0 +1,396 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import time
+from collections.abc import AsyncIterable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+from fastapi import HTTPException, status
+from PIL import Image
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from core.config import settings
+from core.renditions import RENDERABLE_CONTENT_TYPES, RENDITION_SPECS, RenditionSpec, render
+from core.storage import chunk_store, digest, hot_cache, iter_chunks
+from db.models.file import File, ProjectStorageUsage, UploadSession, UserStorageUsage
+from db.models.project import Project
+from db.models.user import Users
+from domain.files.repositories import (
+  add_file, add_rendition, create_upload, delete_orphaned_chunks, delete_upload, expired_upload_ids,
+  get_content_manifest, get_manifest_range, get_part_size, get_project_id, get_project_usage, get_rendition,
+  get_upload, get_upload_manifest, get_user_usage, list_parts, lock_usage, replace_part, retouch_chunks,
+  sum_usage_by_project, sum_usage_by_user, touch_chunk,
+)
+
+logger = logging.getLogger(__name__)
+
+async def store_chunk(session: AsyncSession, chunk: bytes, content_hash) -> str:
+  chunk_hash = await asyncio.to_thread(digest, chunk, content_hash)
+  # Claim the chunk before checking for its blob; see touch_chunk for the race this closes.
+  await touch_chunk(session, chunk_hash, len(chunk))
+  await session.commit()
+  await asyncio.to_thread(chunk_store.write, chunk_hash, chunk)
+  return chunk_hash
+
+async def store_stream(session: AsyncSession, stream: AsyncIterable[bytes], max_bytes: int) -> tuple[list[tuple[str, int, int]], int, str]:
+  """Streams bytes into the chunk store; returns the manifest, the total size and the SHA-256 of the content.
+
+  Chunks already stored by any file or user are not written again. A stream that fails
+  halfway leaves only unreferenced chunks behind, which GC removes after the grace period.
+  Nothing references the chunks until the caller records them, so a stream that runs for
+  longer than half the grace period touches the ones it has stored again.
+  """
+  content_hash = hashlib.sha256()
+  manifest = []
+  size = 0
+  touched = time.monotonic()
+  async for chunk in iter_chunks(stream, settings.STORAGE_CHUNK_SIZE):
+    if size + len(chunk) > max_bytes:
+      raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+    chunk_hash = await store_chunk(session, chunk, content_hash)
+    manifest.append((chunk_hash, size, len(chunk)))
+    size += len(chunk)
+    if time.monotonic() - touched > settings.STORAGE_GC_GRACE_SECONDS / 2:
+      await keep_chunks(session, manifest)
+      touched = time.monotonic()
+  if time.monotonic() - touched > settings.STORAGE_GC_GRACE_SECONDS / 2:
+    await keep_chunks(session, manifest)
+  return manifest, size, content_hash.hexdigest()
+
+async def keep_chunks(session: AsyncSession, manifest: list[tuple[str, int, int]]):
+  collected = await retouch_chunks(session, {chunk_hash for chunk_hash, _, _ in manifest})
+  await session.commit()
+  if collected:
+    # Only possible if the stream stalled for longer than the whole grace period.
+    raise HTTPException(status_code=status.HTTP_408_REQUEST_TIMEOUT, detail="Upload took too long, send it again")
+
+async def get_owned_project_id(session: AsyncSession, owner_id: int, link: str) -> int:
+  project_id = await get_project_id(session, owner_id, link)
+  if project_id is None:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+  return project_id
+
+async def check_quota(session: AsyncSession, owner_id: int, project_id: int | None, incoming: int = 0):
+  """Raises 413 if the owner's or the project's files plus `incoming` bytes go over the quota.
+
+  Reads the running totals, one row each, so the check costs the same however many files there are.
+  """
+  usage = await get_user_usage(session, owner_id)
+  if (usage.bytes if usage else 0) + incoming > settings.USER_STORAGE_QUOTA_BYTES:
+    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Storage quota exceeded")
+  if project_id is not None:
+    usage = await get_project_usage(session, project_id)
+    if (usage.bytes if usage else 0) + incoming > settings.PROJECT_STORAGE_QUOTA_BYTES:
+      raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Project storage quota exceeded")
+
+async def lock_quota(session: AsyncSession, owner_id: int, project_id: int | None):
+  """Locks the owner's and the project's usage rows, in add_file's order, until the transaction ends."""
+  await lock_usage(session, UserStorageUsage, UserStorageUsage.user_id, [owner_id])
+  if project_id is not None:
+    await lock_usage(session, ProjectStorageUsage, ProjectStorageUsage.project_id, [project_id])
+
+async def store_upload(
+  session: AsyncSession, owner_id: int, name: str, content_type: str, stream: AsyncIterable[bytes],
+  project_id: int | None = None, expected_size: int = 0,
+) -> File:
+  # Fail fast on a declared length; the totals are checked again once the size is known.
+  await check_quota(session, owner_id, project_id, expected_size)
+  await session.commit()
+  manifest, size, content_hash = await store_stream(session, stream, settings.MAX_UPLOAD_BYTES)
+  file = await add_file(session, owner_id, name, content_type, size, content_hash, manifest, project_id)
+  # add_file has already counted the file under the usage row locks; going over rolls it back.
+  await check_quota(session, owner_id, project_id)
+  await session.commit()
+  rendition_pipeline.submit_all(file)
+  return file
+
+async def download_segments(session: AsyncSession, file: File, start: int, end: int) -> list[tuple[str, int, int]]:
+  """Maps the inclusive byte range [start, end] of a file to (blob path, offset, count) slices."""
+  segments = []
+  for entry in await get_manifest_range(session, file.id, start, end):
+    first = max(start, entry.offset) - entry.offset
+    last = min(end, entry.offset + entry.size - 1) - entry.offset
+    segments.append((chunk_store.path(entry.chunk_hash), first, last - first + 1))
+  return segments
+
+async def start_upload(session: AsyncSession, owner_id: int, name: str, content_type: str, project_id: int | None = None) -> UploadSession:
+  await check_quota(session, owner_id, project_id)
+  expires_at = datetime.now(timezone.utc) + timedelta(seconds=settings.UPLOAD_SESSION_TTL_SECONDS)
+  upload = await create_upload(session, uuid4().hex, owner_id, name, content_type, expires_at, project_id)
+  await session.commit()
+  return upload
+
+async def get_active_upload(session: AsyncSession, owner_id: int, upload_id: str, for_update: bool = False) -> UploadSession:
+  upload = await get_upload(session, owner_id, upload_id, for_update)
+  if upload is None:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found or expired")
+  return upload
+
+async def store_part(session: AsyncSession, owner_id: int, upload_id: str, part_number: int, stream: AsyncIterable[bytes]) -> int:
+  """Streams one part into the chunk store; parts of one upload may arrive concurrently and in any order.
+
+  A part that would take the upload past MAX_UPLOAD_BYTES is cut off as soon as it does, and
+  one that would take the owner or the project over quota is refused once it is in, rather
+  than either being found out when the upload is completed.
+  """
+  upload = await get_active_upload(session, owner_id, upload_id)
+  # A part sent again replaces the earlier one, so its old size does not count.
+  received = upload.received_bytes - await get_part_size(session, upload_id, part_number)
+  await check_quota(session, owner_id, upload.project_id, received)
+  await session.commit()
+  manifest, size, _ = await store_stream(session, stream, min(settings.UPLOAD_PART_MAX_BYTES, settings.MAX_UPLOAD_BYTES - received))
+
+  # The upload may have been aborted or expired while the part was streaming.
+  upload = await get_active_upload(session, owner_id, upload_id, for_update=True)
+  # Other parts may have arrived meanwhile.
+  received = upload.received_bytes - await get_part_size(session, upload_id, part_number) + size
+  if received > settings.MAX_UPLOAD_BYTES:
+    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+  await lock_quota(session, owner_id, upload.project_id)
+  await check_quota(session, owner_id, upload.project_id, received)
+  try:
+    await replace_part(session, upload_id, part_number, size, manifest)
+    await session.commit()
+  except IntegrityError:
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Part is being uploaded concurrently")
+  return size
+
+async def complete_upload(session: AsyncSession, owner_id: int, upload_id: str) -> File:
+  """Turns the received parts into a file by concatenating their manifests; no chunk is copied."""
+  upload = await get_active_upload(session, owner_id, upload_id)
+  part_numbers = [part.part_number for part in await list_parts(session, upload_id)]
+  if not part_numbers or part_numbers != list(range(1, len(part_numbers) + 1)):
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Parts must be numbered 1..N without gaps")
+  manifest = await get_upload_manifest(session, upload_id)
+  size = sum(chunk_size for _, _, chunk_size in manifest)
+  if size > settings.MAX_UPLOAD_BYTES:
+    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+  await check_quota(session, owner_id, upload.project_id, size)
+  # Do not hold a transaction open while the content is hashed.
+  await session.commit()
+
+  # Parts were hashed separately and SHA-256 states cannot be combined, so read the chunks back once.
+  content_hash = await asyncio.to_thread(chunk_store.content_hash, [chunk_hash for chunk_hash, _, _ in manifest])
+
+  upload = await get_active_upload(session, owner_id, upload_id, for_update=True)
+  if await get_upload_manifest(session, upload_id) != manifest:
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Parts changed while the upload was completing")
+  file = await add_file(session, owner_id, upload.name, upload.content_type, size, content_hash, manifest, upload.project_id)
+  await check_quota(session, owner_id, upload.project_id)
+  await delete_upload(session, upload_id)
+  await session.commit()
+  rendition_pipeline.submit_all(file)
+  return file
+
+async def abort_upload(session: AsyncSession, owner_id: int, upload_id: str):
+  await get_active_upload(session, owner_id, upload_id, for_update=True)
+  await delete_upload(session, upload_id)
+  await session.commit()
+
+async def expire_uploads(session_maker: async_sessionmaker, batch_size: int = settings.STORAGE_GC_BATCH_SIZE) -> int:
+  """Deletes upload sessions past their TTL and releases their parts' chunks; returns how many expired."""
+  expired = 0
+  while True:
+    async with session_maker() as session:
+      upload_ids = await expired_upload_ids(session, batch_size)
+      for upload_id in upload_ids:
+        await delete_upload(session, upload_id)
+      await session.commit()
+    expired += len(upload_ids)
+    if len(upload_ids) < batch_size:
+      return expired
+
+async def collect_garbage(session_maker: async_sessionmaker, batch_size: int = settings.STORAGE_GC_BATCH_SIZE) -> int:
+  """Removes chunks no manifest has referenced for the grace period; returns how many went."""
+  collected = 0
+  touched_before = datetime.now(timezone.utc) - timedelta(seconds=settings.STORAGE_GC_GRACE_SECONDS)
+  while True:
+    async with session_maker() as session:
+      # Rows go first and stay locked until the blobs are unlinked, so an upload
+      # touching one of these chunks waits and then finds the blob missing.
+      orphaned = await delete_orphaned_chunks(session, touched_before, batch_size)
+      for chunk_hash in orphaned:
+        hot_cache.discard(chunk_store.path(chunk_hash))
+        await asyncio.to_thread(chunk_store.delete, chunk_hash)
+      await session.commit()
+    collected += len(orphaned)
+    if len(orphaned) < batch_size:
+      return collected
+
+async def repair_storage_usage(session_maker: async_sessionmaker, batch_size: int = 1000) -> int:
+  """Recomputes the per-user and per-project usage totals from the files table; returns how many rows were wrong."""
+  repaired = 0
+  targets = (
+    (UserStorageUsage, UserStorageUsage.user_id, Users.id, sum_usage_by_user),
+    (ProjectStorageUsage, ProjectStorageUsage.project_id, Project.id, sum_usage_by_project),
+  )
+  for model, key, source, sum_usage in targets:
+    last_id = 0
+    while True:
+      async with session_maker() as session:
+        result = await session.execute(select(source).where(source > last_id).order_by(source).limit(batch_size))
+        ids = result.scalars().all()
+        if not ids:
+          break
+        # Uploads and deletes write their file rows before the usage rows, so once these
+        # locks are held every change the sums below miss is still to be applied on top.
+        stored = await lock_usage(session, model, key, ids)
+        actual = await sum_usage(session, ids)
+        for row_id in ids:
+          size, files = actual.get(row_id, (0, 0))
+          if stored[row_id] != (size, files):
+            await session.execute(update(model).where(key == row_id).values(bytes=size, files=files))
+            repaired += 1
+        await session.commit()
+        last_id = ids[-1]
+  return repaired
+
+async def collect_garbage_periodically(session_maker: async_sessionmaker):
+  while True:
+    await asyncio.sleep(settings.STORAGE_GC_INTERVAL_SECONDS)
+    try:
+      await expire_uploads(session_maker)
+      await collect_garbage(session_maker)
+    except (OSError, SQLAlchemyError):
+      # Whatever was left behind is still orphaned; the next pass picks it up.
+      continue
+
+def renderable_size(size: int) -> bool:
+  # Bigger sources are refused before any worker reads them into memory.
+  return 0 < size <= settings.RENDITION_MAX_SOURCE_BYTES
+
+class RenditionPipeline:
+  """Renders previews of uploaded images in a process pool, off the event loop.
+
+  Jobs are (content_hash, spec) pairs. A bounded queue sheds load instead of growing
+  without limit, a job already queued or running here is not queued again, and results
+  are cached in the renditions table by content hash, so identical assets uploaded by
+  anyone are rendered once. A dropped job is retried when the rendition is requested.
+  """
+
+  def __init__(self, workers: int, queue_size: int):
+    self.workers = workers
+    self.queue_size = queue_size
+    self.pending: set[tuple[str, str]] = set()
+    self.queue: asyncio.Queue | None = None
+    self.executor: ProcessPoolExecutor | None = None
+    self.tasks: list[asyncio.Task] = []
+    self.session_maker: async_sessionmaker | None = None
+    # Worker deaths per job, so a source that keeps killing workers is eventually marked as failed.
+    self.crashes: dict[tuple[str, str], int] = {}
+    self.counters = {"queued": 0, "deduplicated": 0, "dropped": 0, "rendered": 0, "cached": 0, "failed": 0, "crashed": 0}
+
+  def start(self, session_maker: async_sessionmaker):
+    self.session_maker = session_maker
+    self.queue = asyncio.Queue(maxsize=self.queue_size)
+    self.executor = self.new_executor()
+    self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+
+  def new_executor(self) -> ProcessPoolExecutor:
+    # spawn: children import only core.renditions instead of inheriting the app's loop and sockets.
+    return ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+  async def close(self):
+    for task in self.tasks:
+      task.cancel()
+    await asyncio.gather(*self.tasks, return_exceptions=True)
+    self.tasks = []
+    if self.executor is not None:
+      self.executor.shutdown(wait=False, cancel_futures=True)
+      self.executor = None
+
+  def submit(self, content_hash: str, spec: RenditionSpec) -> bool:
+    """Queues a job; False only when the queue is full or the pipeline is not running."""
+    job = (content_hash, spec.name)
+    if job in self.pending:
+      self.counters["deduplicated"] += 1
+      return True
+    if self.queue is None:
+      return False
+    try:
+      self.queue.put_nowait(job)
+    except asyncio.QueueFull:
+      self.counters["dropped"] += 1
+      return False
+    self.pending.add(job)
+    self.counters["queued"] += 1
+    return True
+
+  def submit_all(self, file: File):
+    if file.content_type in RENDERABLE_CONTENT_TYPES and renderable_size(file.size):
+      for spec in RENDITION_SPECS.values():
+        self.submit(file.content_hash, spec)
+
+  async def work(self):
+    while True:
+      content_hash, spec_name = await self.queue.get()
+      try:
+        await self.render(content_hash, RENDITION_SPECS[spec_name])
+      except BrokenProcessPool:
+        logger.exception("Rendition worker died rendering %s of %s", spec_name, content_hash)
+      except Exception:
+        logger.exception("Rendering %s of %s failed", spec_name, content_hash)
+      finally:
+        self.pending.discard((content_hash, spec_name))
+        self.queue.task_done()
+
+  async def render(self, content_hash: str, spec: RenditionSpec):
+    async with self.session_maker() as session:
+      if await get_rendition(session, content_hash, spec.key) is not None:
+        self.counters["cached"] += 1
+        return
+      manifest = await get_content_manifest(session, content_hash)
+      await session.commit()
+    if not manifest:
+      return
+
+    paths = [chunk_store.path(entry.chunk_hash) for entry in manifest]
+    loop = asyncio.get_running_loop()
+    executor = self.executor
+    job = (content_hash, spec.name)
+    try:
+      data, width, height = await loop.run_in_executor(executor, render, paths, spec, settings.RENDITION_MAX_PIXELS)
+    except BrokenProcessPool:
+      # A worker died (most likely killed for memory) and took every job in the pool down
+      # with it. Only the first of those jobs to get here replaces the pool.
+      if self.executor is executor:
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = self.new_executor()
+      self.counters["crashed"] += 1
+      self.crashes[job] = self.crashes.get(job, 0) + 1
+      if self.crashes[job] < settings.RENDITION_MAX_CRASHES:
+        raise
+      logger.warning("Giving up on the %s rendition of %s after %d worker crashes", spec.name, content_hash, self.crashes.pop(job))
+      await self.mark_failed(content_hash, spec)
+      return
+    except (OSError, ValueError, Image.DecompressionBombError) as error:
+      # Not an image Pillow can read: remember that, so the same content is not retried.
+      logger.info("No %s rendition for %s: %s", spec.name, content_hash, error)
+      await self.mark_failed(content_hash, spec)
+      return
+    self.crashes.pop(job, None)
+
+    async with self.session_maker() as session:
+      chunk_hash = await store_chunk(session, data, hashlib.sha256())
+      await add_rendition(session, content_hash, spec.key, spec.content_type, chunk_hash, width, height, len(data))
+      # The last file with this content may have been deleted while we rendered.
+      if not await get_content_manifest(session, content_hash):
+        await session.rollback()
+        return
+      await session.commit()
+    self.counters["rendered"] += 1
+
+  async def mark_failed(self, content_hash: str, spec: RenditionSpec):
+    async with self.session_maker() as session:
+      await add_rendition(session, content_hash, spec.key, spec.content_type)
+      await session.commit()
+    self.counters["failed"] += 1
+
+  def stats(self) -> dict:
+    return {**self.counters, "queue_depth": self.queue.qsize() if self.queue else 0, "workers": self.workers}
+
+rendition_pipeline = RenditionPipeline(settings.RENDITION_WORKERS, settings.RENDITION_QUEUE_SIZE)
@@ -1,8 +1,24 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from api.dependencies import require_ops_token
+from api.v1.endpoints.files import router as files_router
+from core.metrics import MetricsMiddleware, metrics_response
+from db.session import async_session_maker, engine
+from domain.files.services import collect_garbage_periodically, rendition_pipeline
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+  garbage_collector = asyncio.create_task(collect_garbage_periodically(async_session_maker))
+  rendition_pipeline.start(async_session_maker)
+  yield
+  garbage_collector.cancel()
+  await rendition_pipeline.close()
+  await engine.dispose()
 
 def create_app() -> FastAPI:
-  app = FastAPI(title='Keplerix', docs_url='/api/docs', description='Web application for collaborative interface design')
+  app = FastAPI(title='Keplerix', docs_url='/api/docs', description='Web application for collaborative interface design', lifespan=lifespan)
   origins = [
     "http://localhost:3000",
   ]
@@ -13,4 +29,7 @@ def create_app() -> FastAPI:
     allow_methods=["*"],
     allow_headers=["*"],
   )
-  return app
\ No newline at end of file
+  app.add_middleware(MetricsMiddleware)
+  app.add_api_route("/metrics", metrics_response, include_in_schema=False, dependencies=[Depends(require_ops_token)])
+  app.include_router(files_router, prefix="/file")
+  return app
@@ -0,0 +1,42 @@
+"""Operational commands for file-service.
+
+  python manage.py collect-garbage [--batch-size N]
+  python manage.py repair-storage-usage [--batch-size N]
+"""
+import argparse
+import asyncio
+from db.session import async_session_maker, engine
+from domain.files.services import collect_garbage, expire_uploads, repair_storage_usage
+
+async def run_collect_garbage(args: argparse.Namespace):
+  try:
+    expired = await expire_uploads(async_session_maker, args.batch_size)
+    collected = await collect_garbage(async_session_maker, args.batch_size)
+  finally:
+    await engine.dispose()
+  print(f"Expired {expired} upload(s), removed {collected} orphaned chunk(s)")
+
+async def run_repair_storage_usage(args: argparse.Namespace):
+  try:
+    repaired = await repair_storage_usage(async_session_maker, args.batch_size)
+  finally:
+    await engine.dispose()
+  print(f"Repaired {repaired} storage usage row(s)")
+
+def main():
+  parser = argparse.ArgumentParser(prog="manage.py")
+  commands = parser.add_subparsers(dest="command", required=True)
+
+  collect = commands.add_parser("collect-garbage", help="Expire stale uploads, then delete chunks nothing has referenced for the grace period")
+  collect.add_argument("--batch-size", type=int, default=1000)
+  collect.set_defaults(handler=run_collect_garbage)
+
+  repair = commands.add_parser("repair-storage-usage", help="Recompute the per-user and per-project storage usage from the files table")
+  repair.add_argument("--batch-size", type=int, default=1000)
+  repair.set_defaults(handler=run_repair_storage_usage)
+
+  args = parser.parse_args()
+  asyncio.run(args.handler(args))
+
+if __name__ == "__main__":
+  main()
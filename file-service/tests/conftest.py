@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import httpx
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+# file-service's packages share their names with user-service's; run these tests as their own session:
+#   python -m pytest file-service/tests
+os.environ.setdefault("SECRET_KEY", "file-service-test-secret-32-bytes!")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("DATABASE_URL_ASYNC", "sqlite+aiosqlite:///:memory:")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from core.config import settings
+from core.identity import IDENTITY_EXPIRES_HEADER, IDENTITY_HEADER, IDENTITY_SIGNATURE_HEADER, sign_identity
+from core.storage import chunk_store
+from db.base import Base
+from db.models.project import Project
+from db.models.user import Users
+from db.session import get_async_session
+from main import create_app
+
+@pytest.fixture
+async def session_maker():
+  engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+  async with engine.begin() as conn:
+    await conn.run_sync(Base.metadata.create_all)
+    await conn.execute(insert(Users), [
+      {"id": 1, "email": "user1@example.com", "is_superuser": True},
+      {"id": 2, "email": "user2@example.com", "is_superuser": False},
+    ])
+    await conn.execute(insert(Project), [{"id": 10, "user_id": 1, "link": "alpha"}, {"id": 20, "user_id": 2, "link": "beta"}])
+  yield async_sessionmaker(engine, expire_on_commit=False)
+  await engine.dispose()
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+  monkeypatch.setattr(chunk_store, "root", str(tmp_path))
+  # Small chunks, so a few bytes of test data span several of them.
+  monkeypatch.setattr(settings, "STORAGE_CHUNK_SIZE", 4)
+  return chunk_store
+
+@pytest.fixture
+async def client(session_maker):
+  async def get_test_session():
+    async with session_maker() as session:
+      yield session
+
+  # Without the lifespan, so neither GC nor the rendition pipeline runs unless a test starts it.
+  app = create_app()
+  app.dependency_overrides[get_async_session] = get_test_session
+  async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://file-service") as client:
+    yield client
+
+def identity(email: str) -> dict[str, str]:
+  """The headers the gateway adds for a signed-in user."""
+  expires_at = int(time.time()) + 60
+  return {IDENTITY_HEADER: email, IDENTITY_EXPIRES_HEADER: str(expires_at), IDENTITY_SIGNATURE_HEADER: sign_identity(email, expires_at)}
+
+async def stream(*pieces: bytes):
+  for piece in pieces:
+    yield piece
@@ -0,0 +1,89 @@
+import os
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete, select, update
+from conftest import stream
+from core.config import settings
+from db.models.file import Chunk
+from domain.files.repositories import delete_file, delete_orphaned_chunks
+from domain.files.services import collect_garbage, store_stream, store_upload
+
+async def chunk_rows(session_maker) -> dict[str, int]:
+  async with session_maker() as session:
+    return dict((await session.execute(select(Chunk.hash, Chunk.ref_count))).all())
+
+def test_writing_a_stored_chunk_again_is_a_no_op(storage):
+  storage.write("ab" * 32, b"first")
+  storage.write("ab" * 32, b"second")
+
+  assert storage.path("ab" * 32) == os.path.join(storage.root, "ab", "ab", "ab" * 32)
+  assert storage.read("ab" * 32) == b"first"
+  assert not [name for name in os.listdir(os.path.dirname(storage.path("ab" * 32))) if name.startswith(".tmp-")]
+
+async def test_identical_content_is_stored_once_and_referenced_per_file(session_maker, storage):
+  async with session_maker() as session:
+    first = await store_upload(session, 1, "a.txt", "text/plain", stream(b"aaaabb", b"bbcc"))
+    second = await store_upload(session, 2, "b.txt", "text/plain", stream(b"aaaabbbbcc"))
+
+  assert first.content_hash == second.content_hash
+  assert first.size == second.size == 10
+  # aaaa, bbbb and cc, each referenced by both files.
+  assert sorted((await chunk_rows(session_maker)).values()) == [2, 2, 2]
+
+async def test_gc_collects_only_unreferenced_chunks_past_the_grace_period(session_maker, storage, monkeypatch):
+  monkeypatch.setattr(settings, "STORAGE_GC_GRACE_SECONDS", 0)
+  async with session_maker() as session:
+    kept = await store_upload(session, 1, "kept.txt", "text/plain", stream(b"keepkeep"))
+    dropped = await store_upload(session, 1, "dropped.txt", "text/plain", stream(b"keepgone"))
+    assert await delete_file(session, 1, dropped.id)
+    await session.commit()
+
+  rows = await chunk_rows(session_maker)
+  gone = [chunk_hash for chunk_hash, ref_count in rows.items() if ref_count == 0]
+  assert len(gone) == 1
+
+  assert await collect_garbage(session_maker) == 1
+  assert set(await chunk_rows(session_maker)) == set(rows) - set(gone)
+  assert not storage.exists(gone[0])
+  assert kept.size == 8
+
+async def test_gc_leaves_recently_touched_chunks(session_maker, storage):
+  async with session_maker() as session:
+    await store_stream(session, stream(b"fresh"), 100)
+    assert await delete_orphaned_chunks(session, datetime.now(timezone.utc) - timedelta(hours=1), 100) == []
+    # The DELETE repeats the orphan conditions, so a chunk referenced since the scan is spared.
+    await session.execute(update(Chunk).values(ref_count=1))
+    assert await delete_orphaned_chunks(session, datetime.now(timezone.utc) + timedelta(hours=1), 100) == []
+
+async def test_long_stream_retouches_its_chunks(session_maker, storage, monkeypatch):
+  monkeypatch.setattr(settings, "STORAGE_GC_GRACE_SECONDS", 0)
+  long_ago = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+  async def slow_stream():
+    yield b"aaaa"
+    # As if the upload had stalled: the first chunk now looks old enough to collect.
+    async with session_maker() as session:
+      await session.execute(update(Chunk).values(touched_at=long_ago))
+      await session.commit()
+    yield b"bbbb"
+
+  async with session_maker() as session:
+    await store_stream(session, slow_stream(), 100)
+    touched = (await session.execute(select(Chunk.touched_at))).scalars().all()
+  assert all(moment.replace(tzinfo=timezone.utc) > long_ago for moment in touched)
+
+async def test_stream_fails_if_its_chunks_were_collected_meanwhile(session_maker, storage, monkeypatch):
+  monkeypatch.setattr(settings, "STORAGE_GC_GRACE_SECONDS", 0)
+
+  async def collected_stream():
+    yield b"aaaa"
+    async with session_maker() as session:
+      await session.execute(delete(Chunk))
+      await session.commit()
+    yield b"bbbb"
+
+  async with session_maker() as session:
+    with pytest.raises(HTTPException) as raised:
+      await store_stream(session, collected_stream(), 100)
+  assert raised.value.status_code == 408
@@ -0,0 +1,96 @@
+import logging
+import os
+import pytest
+from fastapi import HTTPException
+from core.downloads import ZEROCOPY_EXTENSION, DownloadAborted, SegmentsResponse, etag_matches, parse_range
+from core.storage import hot_cache
+
+@pytest.mark.parametrize("header, expected", [
+  ("bytes=0-4", (0, 4)),
+  ("bytes=5-", (5, 9)),
+  ("bytes=8-100", (8, 9)),
+  ("bytes=-3", (7, 9)),
+  ("bytes=-100", (0, 9)),
+  ("BYTES = 2-3", (2, 3)),
+])
+def test_single_ranges(header, expected):
+  assert parse_range(header, 10) == expected
+
+@pytest.mark.parametrize("header", [
+  "bytes=0-1,4-5",
+  "bytes=-2, 0-1",
+  "items=0-4",
+  "bytes=4-2",
+  "bytes=-",
+  "bytes=a-b",
+  "bytes=3",
+])
+def test_multiple_or_malformed_ranges_serve_the_whole_file(header):
+  assert parse_range(header, 10) is None
+
+@pytest.mark.parametrize("header, size", [
+  ("bytes=10-", 10),
+  ("bytes=10-20", 10),
+  ("bytes=-0", 10),
+  ("bytes=0-", 0),
+  ("bytes=-5", 0),
+])
+def test_unsatisfiable_ranges(header, size):
+  with pytest.raises(HTTPException) as raised:
+    parse_range(header, size)
+  assert raised.value.status_code == 416
+  assert raised.value.headers == {"Content-Range": f"bytes */{size}"}
+
+@pytest.mark.parametrize("header, weak, expected", [
+  ('"abc"', False, True),
+  ('"other", "abc"', False, True),
+  ("*", False, True),
+  ('W/"abc"', True, True),
+  ('W/"abc"', False, False),
+  ('"other"', True, False),
+  ('abc', True, False),
+])
+def test_etag_matches(header, weak, expected):
+  assert etag_matches(header, '"abc"', weak) is expected
+
+async def download(segments, zerocopy: bool) -> list[dict]:
+  messages = []
+
+  async def send(message):
+    if message["type"] == ZEROCOPY_EXTENSION:
+      message = {**message, "body": os.pread(message["file"], message["count"], message["offset"])}
+    messages.append(message)
+
+  scope = {"type": "http", "method": "GET", "extensions": {ZEROCOPY_EXTENSION: {}} if zerocopy else {}}
+  await SegmentsResponse(segments, 200, {})(scope, None, send)
+  return messages
+
+@pytest.fixture
+def blob(tmp_path, monkeypatch):
+  monkeypatch.setattr(hot_cache, "max_bytes", 0)
+  path = tmp_path / "blob"
+  path.write_bytes(b"0123456789")
+  return str(path)
+
+@pytest.mark.parametrize("zerocopy", [True, False])
+async def test_segments_are_sent_in_order(blob, zerocopy):
+  messages = await download([(blob, 2, 3), (blob, 0, 2)], zerocopy)
+
+  assert b"".join(message["body"] for message in messages[1:]) == b"23401"
+  assert [message["more_body"] for message in messages[1:]] == [True, False]
+
+@pytest.mark.parametrize("zerocopy", [True, False])
+async def test_a_blob_collected_mid_download_aborts_the_response(blob, tmp_path, zerocopy, caplog):
+  missing = str(tmp_path / "collected")
+  segments = [(blob, 0, 4), (missing, 0, 4)]
+
+  with caplog.at_level(logging.WARNING, logger="core.downloads"), pytest.raises(DownloadAborted):
+    await SegmentsResponse(segments, 200, {})(
+      {"type": "http", "method": "GET", "extensions": {ZEROCOPY_EXTENSION: {}} if zerocopy else {}}, None, noop_send,
+    )
+
+  assert [record.getMessage().startswith("Download aborted") for record in caplog.records] == [True]
+  assert all(record.exc_info is None for record in caplog.records)
+
+async def noop_send(message):
+  pass
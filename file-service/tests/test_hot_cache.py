@@ -0,0 +1,73 @@
+import pytest
+from conftest import identity
+from core.storage import HotCache
+
+@pytest.fixture
+def blobs(tmp_path):
+  def blob(name: str, size: int) -> str:
+    path = tmp_path / name
+    path.write_bytes(name[:1].encode() * size)
+    return str(path)
+  return blob
+
+async def read(cache: HotCache, path: str, times: int = 1):
+  for _ in range(times):
+    region = await cache.lookup(path)
+  return region
+
+async def test_blobs_are_mapped_once_they_are_asked_for_min_hits_times(blobs):
+  cache = HotCache(max_bytes=100, max_entry_bytes=100, min_hits=2, sample_size=1000)
+  path = blobs("a", 10)
+
+  assert await cache.lookup(path) is None
+  assert bytes(await cache.lookup(path)) == b"a" * 10
+  assert await cache.lookup(path) is cache.entries[path]
+  assert (cache.hits, cache.misses, cache.admissions) == (1, 2, 1)
+
+async def test_blobs_over_the_entry_limit_are_rejected_without_mapping_again(blobs, monkeypatch):
+  cache = HotCache(max_bytes=100, max_entry_bytes=8, min_hits=1, sample_size=1000)
+  path = blobs("big", 10)
+
+  assert await cache.lookup(path) is None
+  monkeypatch.setattr("core.storage.map_blob", lambda path: pytest.fail("mapped a rejected blob again"))
+  assert await read(cache, path, 3) is None
+  assert cache.rejections == 1 and cache.size == 0
+
+async def test_popular_blobs_evict_less_popular_ones_within_the_budget(blobs):
+  cache = HotCache(max_bytes=20, max_entry_bytes=20, min_hits=1, sample_size=1000)
+  cold, warm, hot = blobs("cold", 10), blobs("warm", 10), blobs("hot", 10)
+  cold_region = await read(cache, cold)
+  await read(cache, warm, 3)
+
+  await read(cache, hot, 2)
+
+  assert list(cache.entries) == [warm, hot]
+  assert cache.size == 20 and cache.evictions == 1
+  assert cold_region.closed
+
+async def test_a_blob_cannot_push_out_more_popular_entries(blobs):
+  cache = HotCache(max_bytes=20, max_entry_bytes=20, min_hits=1, sample_size=1000)
+  small, other, large = blobs("small", 10), blobs("other", 10), blobs("large", 20)
+  await read(cache, small, 3)
+  await read(cache, other, 3)
+
+  assert await read(cache, large, 2) is None
+  assert list(cache.entries) == [small, other]
+  # The second lookup is turned away on the remembered size, without mapping the blob again.
+  assert cache.rejections == 1 and cache.evictions == 0
+
+async def test_counts_age_every_sample(blobs):
+  cache = HotCache(max_bytes=20, max_entry_bytes=20, min_hits=3, sample_size=4)
+  path = blobs("a", 10)
+
+  await read(cache, path, 3)
+  await read(cache, blobs("b", 10))
+
+  assert cache.frequencies[path] == 1
+  assert cache.lookups == 0 and cache.rejected_sizes == {}
+
+async def test_cache_stats_are_for_superusers(client):
+  assert (await client.get("/file/cache/stats", headers=identity("user2@example.com"))).status_code == 403
+  response = await client.get("/file/cache/stats", headers=identity("user1@example.com"))
+  assert response.status_code == 200
+  assert set(response.json()) >= {"entries", "bytes", "hit_rate"}
@@ -0,0 +1,10 @@
+from core.config import settings
+
+async def test_metrics_need_the_ops_token(client, monkeypatch):
+  monkeypatch.setattr(settings, "OPS_TOKEN", "")
+  assert (await client.get("/metrics")).status_code == 404
+  monkeypatch.setattr(settings, "OPS_TOKEN", "ops-secret")
+  assert (await client.get("/metrics", headers={"Authorization": "Bearer wrong"})).status_code == 401
+  response = await client.get("/metrics", headers={"Authorization": "Bearer ops-secret"})
+  assert response.status_code == 200
+  assert "db_pool_checked_out_connections" in response.text
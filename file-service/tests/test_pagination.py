@@ -0,0 +1,14 @@
+import base64
+import pytest
+from fastapi import HTTPException
+from core.pagination import decode_cursor, encode_cursor
+
+def test_cursor_round_trip():
+  assert decode_cursor(encode_cursor(2**31 - 1)) == 2**31 - 1
+
+@pytest.mark.parametrize("raw", [b"9" * 30, str(2**31).encode(), b"not a number", b""])
+def test_invalid_cursor_is_rejected(raw):
+  with pytest.raises(HTTPException) as exc_info:
+    decode_cursor(base64.urlsafe_b64encode(raw).decode())
+
+  assert (exc_info.value.status_code, exc_info.value.detail) == (400, "Invalid cursor")
@@ -0,0 +1,61 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from conftest import stream
+from core.config import settings
+from db.models.file import ProjectStorageUsage, UserStorageUsage
+from domain.files.repositories import delete_file
+from domain.files.services import complete_upload, repair_storage_usage, start_upload, store_part, store_upload
+
+async def usage(session_maker) -> tuple[dict, dict]:
+  async with session_maker() as session:
+    users = (await session.execute(select(UserStorageUsage.user_id, UserStorageUsage.bytes, UserStorageUsage.files))).all()
+    projects = (await session.execute(select(ProjectStorageUsage.project_id, ProjectStorageUsage.bytes, ProjectStorageUsage.files))).all()
+  return {row[0]: tuple(row[1:]) for row in users}, {row[0]: tuple(row[1:]) for row in projects}
+
+async def test_usage_follows_uploads_and_deletes(session_maker, storage):
+  async with session_maker() as session:
+    await store_upload(session, 1, "a.txt", "text/plain", stream(b"aaaaaa"), project_id=10)
+    dropped = await store_upload(session, 1, "b.txt", "text/plain", stream(b"bbbb"))
+    await store_upload(session, 2, "c.txt", "text/plain", stream(b"cc"), project_id=20)
+    assert await delete_file(session, 1, dropped.id)
+    await session.commit()
+
+  assert await usage(session_maker) == ({1: (6, 1), 2: (2, 1)}, {10: (6, 1), 20: (2, 1)})
+
+async def test_parts_are_refused_once_the_owner_would_be_over_quota(session_maker, storage, monkeypatch):
+  monkeypatch.setattr(settings, "USER_STORAGE_QUOTA_BYTES", 12)
+  async with session_maker() as session:
+    await store_upload(session, 1, "a.txt", "text/plain", stream(b"aaaa"))
+    upload_id = (await start_upload(session, 1, "parts.bin", "application/octet-stream")).id
+    await store_part(session, 1, upload_id, 1, stream(b"bbbbbb"))
+
+    with pytest.raises(HTTPException) as raised:
+      await store_part(session, 1, upload_id, 2, stream(b"ccc"))
+    assert (raised.value.status_code, raised.value.detail) == (413, "Storage quota exceeded")
+    await session.rollback()
+
+    await store_part(session, 1, upload_id, 2, stream(b"cc"))
+    assert (await complete_upload(session, 1, upload_id)).size == 8
+
+async def test_parts_count_against_the_project_quota(session_maker, storage, monkeypatch):
+  monkeypatch.setattr(settings, "PROJECT_STORAGE_QUOTA_BYTES", 6)
+  async with session_maker() as session:
+    await store_upload(session, 1, "a.txt", "text/plain", stream(b"aaaa"), project_id=10)
+    upload = await start_upload(session, 1, "parts.bin", "application/octet-stream", project_id=10)
+    with pytest.raises(HTTPException) as raised:
+      await store_part(session, 1, upload.id, 1, stream(b"bbbb"))
+  assert (raised.value.status_code, raised.value.detail) == (413, "Project storage quota exceeded")
+
+async def test_repair_recomputes_drifted_totals(session_maker, storage):
+  async with session_maker() as session:
+    await store_upload(session, 1, "a.txt", "text/plain", stream(b"aaaaaa"), project_id=10)
+    await store_upload(session, 2, "b.txt", "text/plain", stream(b"bb"))
+    await session.execute(update(UserStorageUsage).where(UserStorageUsage.user_id == 1).values(bytes=999, files=7))
+    await session.execute(update(ProjectStorageUsage).values(bytes=0, files=0))
+    await session.commit()
+
+  assert await repair_storage_usage(session_maker, batch_size=1) == 2
+  # Project 20 has no files; the row repair creates for it starts at zero, which is already right.
+  assert await usage(session_maker) == ({1: (6, 1), 2: (2, 1)}, {10: (6, 1), 20: (0, 0)})
+  assert await repair_storage_usage(session_maker) == 0
@@ -0,0 +1,92 @@
+import asyncio
+from concurrent.futures import Executor, Future
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from conftest import identity, stream
+from core.config import settings
+from core.renditions import RENDITION_SPECS
+from domain.files.repositories import get_rendition
+from domain.files.services import RenditionPipeline, rendition_pipeline, store_upload
+
+THUMB = RENDITION_SPECS["thumb-256"]
+
+class DyingPool(Executor):
+  """Stands in for a process pool whose worker is killed once `jobs` jobs are running in it."""
+
+  def __init__(self, jobs: int = 1):
+    self.jobs = jobs
+    self.futures: list[Future] = []
+
+  def submit(self, fn, *args, **kwargs):
+    self.futures.append(Future())
+    if len(self.futures) >= self.jobs:
+      for future in self.futures:
+        if not future.done():
+          future.set_exception(BrokenProcessPool("A child process terminated abruptly"))
+    return self.futures[-1]
+
+  def shutdown(self, wait=True, *, cancel_futures=False):
+    pass
+
+@pytest.fixture
+def pipeline(session_maker, monkeypatch):
+  pipeline = RenditionPipeline(workers=2, queue_size=10)
+  pipeline.session_maker = session_maker
+  pools = []
+
+  def new_executor():
+    pools.append(DyingPool())
+    return pools[-1]
+
+  monkeypatch.setattr(pipeline, "new_executor", new_executor)
+  pipeline.executor = pipeline.new_executor()
+  pipeline.pools = pools
+  return pipeline
+
+async def upload_image(session_maker, data: bytes = b"not really a png") -> tuple[int, str]:
+  async with session_maker() as session:
+    file = await store_upload(session, 1, "image.png", "image/png", stream(data))
+  return file.id, file.content_hash
+
+async def test_oversized_sources_get_no_rendition(client, session_maker, storage, monkeypatch):
+  monkeypatch.setattr(settings, "RENDITION_MAX_SOURCE_BYTES", 8)
+  file_id, _ = await upload_image(session_maker, b"0123456789")
+  queued = rendition_pipeline.counters["queued"]
+
+  response = await client.get(f"/file/{file_id}/renditions/thumb-256", headers=identity("user1@example.com"))
+
+  assert response.status_code == 422
+  assert rendition_pipeline.counters["queued"] == queued
+
+async def test_a_source_that_keeps_killing_workers_is_marked_failed(pipeline, session_maker, storage):
+  _, content_hash = await upload_image(session_maker)
+
+  with pytest.raises(BrokenProcessPool):
+    await pipeline.render(content_hash, THUMB)
+  async with session_maker() as session:
+    assert await get_rendition(session, content_hash, THUMB.key) is None
+
+  await pipeline.render(content_hash, THUMB)
+  async with session_maker() as session:
+    rendition = await get_rendition(session, content_hash, THUMB.key)
+  assert rendition is not None and rendition.chunk_hash is None
+  assert pipeline.counters["crashed"] == settings.RENDITION_MAX_CRASHES
+  assert pipeline.crashes == {}
+
+async def test_jobs_failing_with_the_same_pool_replace_it_once(pipeline, session_maker, storage):
+  _, first = await upload_image(session_maker, b"first image")
+  _, second = await upload_image(session_maker, b"second image")
+  pipeline.executor.jobs = 2
+
+  results = await asyncio.gather(pipeline.render(first, THUMB), pipeline.render(second, THUMB), return_exceptions=True)
+
+  assert all(isinstance(result, BrokenProcessPool) for result in results)
+  assert len(pipeline.pools) == 2
+  assert pipeline.executor is pipeline.pools[1]
+
+async def test_rendition_stats_are_for_superusers(client):
+  assert (await client.get("/file/renditions/stats")).status_code == 401
+  assert (await client.get("/file/renditions/stats", headers=identity("user2@example.com"))).status_code == 403
+  response = await client.get("/file/renditions/stats", headers=identity("user1@example.com"))
+  assert response.status_code == 200
+  assert "crashed" in response.json()
@@ -0,0 +1,53 @@
+import pytest
+from fastapi import HTTPException
+from conftest import stream
+from core.config import settings
+from core.storage import chunk_store
+from domain.files.repositories import get_manifest
+from domain.files.services import complete_upload, get_active_upload, start_upload, store_part
+
+async def upload_parts(session_maker, parts: dict[int, bytes]) -> str:
+  async with session_maker() as session:
+    upload = await start_upload(session, 1, "parts.bin", "application/octet-stream")
+    for part_number, data in parts.items():
+      await store_part(session, 1, upload.id, part_number, stream(data))
+  return upload.id
+
+async def test_parts_are_joined_in_part_number_order(session_maker, storage):
+  upload_id = await upload_parts(session_maker, {3: b"cccc", 1: b"aaaaaa", 2: b"bb"})
+  async with session_maker() as session:
+    file = await complete_upload(session, 1, upload_id)
+    manifest = await get_manifest(session, file.id)
+
+  assert file.size == 12
+  assert b"".join(chunk_store.read(entry.chunk_hash) for entry in manifest) == b"aaaaaabbcccc"
+  assert [entry.offset for entry in manifest] == [0, 4, 6, 8]
+
+async def test_completing_with_a_missing_part_is_a_conflict(session_maker, storage):
+  upload_id = await upload_parts(session_maker, {1: b"aaaa", 3: b"cccc"})
+  async with session_maker() as session:
+    with pytest.raises(HTTPException) as raised:
+      await complete_upload(session, 1, upload_id)
+  assert raised.value.status_code == 409
+
+async def test_a_resent_part_replaces_the_earlier_one(session_maker, storage):
+  upload_id = await upload_parts(session_maker, {1: b"aaaa", 2: b"bbbbbbbb"})
+  async with session_maker() as session:
+    await store_part(session, 1, upload_id, 2, stream(b"BB"))
+    assert (await get_active_upload(session, 1, upload_id, for_update=True)).received_bytes == 6
+    file = await complete_upload(session, 1, upload_id)
+  assert file.size == 6
+
+async def test_parts_are_refused_once_the_upload_would_be_too_large(session_maker, storage, monkeypatch):
+  monkeypatch.setattr(settings, "MAX_UPLOAD_BYTES", 10)
+  upload_id = await upload_parts(session_maker, {1: b"aaaaaaaa"})
+  async with session_maker() as session:
+    with pytest.raises(HTTPException) as raised:
+      await store_part(session, 1, upload_id, 2, stream(b"bbbb"))
+    assert raised.value.status_code == 413
+    await session.rollback()
+
+    # Sending part 1 again frees its old size.
+    await store_part(session, 1, upload_id, 1, stream(b"aaaaaa"))
+    await store_part(session, 1, upload_id, 2, stream(b"bbbb"))
+    assert (await complete_upload(session, 1, upload_id)).size == 10
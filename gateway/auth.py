@@ -0,0 +1,109 @@
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+import jwt
+import redis
+from fastapi import HTTPException, Request, status
+from config import settings
+from metrics import instrument_redis
+
+IDENTITY_HEADER = "x-keplerix-user"
+IDENTITY_EXPIRES_HEADER = "x-keplerix-user-expires"
+IDENTITY_SIGNATURE_HEADER = "x-keplerix-user-signature"
+IDENTITY_HEADERS = frozenset({IDENTITY_HEADER, IDENTITY_EXPIRES_HEADER, IDENTITY_SIGNATURE_HEADER})
+
+# Routes reachable without a session, per upstream.
+PUBLIC_PATH_PREFIXES = {
+    "users": ("auth/",),
+    "files": (),
+}
+
+redis_client = instrument_redis(redis.asyncio.from_url(settings.REDIS_URL, decode_responses=True))
+
+@dataclass(frozen=True)
+class Identity:
+    email: str
+    expires_at: int
+
+class TokenCache:
+    """Short-lived memory of tokens already checked against Redis, so revocation
+    is picked up within `ttl` seconds without a Redis round trip per request."""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries: OrderedDict[str, tuple[Identity, float]] = OrderedDict()
+
+    def get(self, token: str) -> Identity | None:
+        entry = self.entries.get(token)
+        if entry is None:
+            return None
+        identity, valid_until = entry
+        if valid_until <= time.monotonic():
+            del self.entries[token]
+            return None
+        self.entries.move_to_end(token)
+        return identity
+
+    def put(self, token: str, identity: Identity):
+        lifetime = min(self.ttl, identity.expires_at - time.time())
+        if lifetime <= 0:
+            return
+        self.entries[token] = (identity, time.monotonic() + lifetime)
+        self.entries.move_to_end(token)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+token_cache = TokenCache(settings.AUTH_TOKEN_CACHE_TTL, settings.AUTH_TOKEN_CACHE_SIZE)
+
+def is_public(upstream: str, path: str) -> bool:
+    return path.startswith(PUBLIC_PATH_PREFIXES.get(upstream, ()))
+
+async def authenticate(upstream: str, path: str, request: Request) -> Identity | None:
+    if is_public(upstream, path):
+        return None
+
+    token = request.cookies.get("keplerix_token")
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token missing in cookies")
+
+    identity = token_cache.get(token)
+    if identity is not None:
+        return identity
+
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM], options={"require": ["exp", "sub"]})
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token")
+
+    email = payload["sub"]
+    if await redis_client.get(email) != token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token")
+
+    identity = Identity(email=email, expires_at=int(payload["exp"]))
+    token_cache.put(token, identity)
+    return identity
+
+def require_ops_token(request: Request):
+    """Guards gateway-wide stats, which describe every user's traffic, behind OPS_TOKEN."""
+    if not settings.OPS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.OPS_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid operations token", headers={"WWW-Authenticate": "Bearer"},
+        )
+
+def sign_identity(email: str, expires_at: int) -> str:
+    message = f"{email}\n{expires_at}".encode()
+    key = hashlib.sha256(b"keplerix-identity:" + settings.SECRET_KEY.encode()).digest()
+    return hmac.new(key, message, hashlib.sha256).hexdigest()
+
+def identity_headers(identity: Identity) -> list[tuple[str, str]]:
+    return [
+        (IDENTITY_HEADER, identity.email),
+        (IDENTITY_EXPIRES_HEADER, str(identity.expires_at)),
+        (IDENTITY_SIGNATURE_HEADER, sign_identity(identity.email, identity.expires_at)),
+    ]
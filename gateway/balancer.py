@@ -0,0 +1,137 @@
+import random
+import time
+import httpx
+from config import settings
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """Passive health check: opens after consecutive failures and lets a single
+    probe through once `open_seconds` have passed."""
+
+    def __init__(self, failure_threshold: int, open_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def allows_request(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+        return self.state == HALF_OPEN and not self.probing
+
+    def on_attempt(self):
+        if self.state == HALF_OPEN:
+            self.probing = True
+
+    def abandon_attempt(self):
+        # The attempt ended for reasons that say nothing about the replica; let another probe through.
+        self.probing = False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.probing = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.probing = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+class RetryBudget:
+    """Every request earns `ratio` of a retry; retries spend whole tokens, so retries
+    stay a bounded fraction of traffic even when every replica is failing."""
+
+    def __init__(self, ratio: float, max_tokens: float):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+class Replica:
+    def __init__(self, url: str, client: httpx.AsyncClient, max_concurrency: int):
+        self.url = url
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.outstanding = 0
+        self.breaker = CircuitBreaker(settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_OPEN_SECONDS)
+
+    def available(self) -> bool:
+        return self.outstanding < self.max_concurrency and self.breaker.allows_request()
+
+    def acquire(self):
+        self.outstanding += 1
+        self.breaker.on_attempt()
+
+    def release(self):
+        self.outstanding -= 1
+
+    def abandon(self):
+        self.release()
+        self.breaker.abandon_attempt()
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.consecutive_failures,
+        }
+
+class Upstream:
+    def __init__(self, name: str, replicas: list[Replica]):
+        self.name = name
+        self.replicas = replicas
+        self.retry_budget = RetryBudget(settings.RETRY_BUDGET_RATIO, settings.RETRY_BUDGET_MAX_TOKENS)
+
+    def choose(self, exclude: set[Replica]) -> Replica | None:
+        candidates = [replica for replica in self.replicas if replica not in exclude and replica.available()]
+        if not candidates:
+            return None
+        least = min(replica.outstanding for replica in candidates)
+        return random.choice([replica for replica in candidates if replica.outstanding == least])
+
+    def stats(self) -> dict:
+        return {
+            "replicas": [replica.stats() for replica in self.replicas],
+            "retry_tokens": self.retry_budget.tokens,
+        }
+
+class ReleasingStream(httpx.AsyncByteStream):
+    """Keeps a replica's outstanding slot until the proxied body has been fully relayed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, replica: Replica):
+        self.stream = stream
+        self.replica = replica
+        self.released = False
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            if not self.released:
+                self.released = True
+                self.replica.release()
+
+def parse_urls(urls: str) -> list[str]:
+    return [url.strip() for url in urls.split(",") if url.strip()]
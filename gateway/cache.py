@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+import httpx
+import redis
+from fastapi import Request, Response
+from auth import Identity, redis_client
+from config import settings
+from upstream import forwarded_response_headers, stream_response, upstreams
+
+# Idempotent reads that clients poll; only these are cached, per upstream.
+CACHEABLE_PATH_PREFIXES = {
+    "users": ("user/info", "project/projects", "project/project"),
+    "files": (),
+}
+
+INVALIDATION_CHANNEL = "gateway:cache-invalidate"
+MAX_TRACKED_GENERATIONS = 100_000
+
+@dataclass
+class CachedResponse:
+    status_code: int
+    headers: list[tuple[bytes, bytes]]
+    body: bytes
+    etag: str
+    expires_at: float
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(key) + len(value) for key, value in self.headers)
+
+class ResponseCache:
+    def __init__(self, max_bytes: int, max_entry_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl = ttl
+        self.entries: OrderedDict[tuple[str, str], CachedResponse] = OrderedDict()
+        self.keys_by_identity: dict[str, set[tuple[str, str]]] = {}
+        self.generations: dict[str, int] = {}
+        self.epoch = 0
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.upstream_bytes_saved = 0
+        self.client_bytes_saved = 0
+
+    def get(self, key: tuple[str, str]) -> CachedResponse | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self.remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: tuple[str, str], entry: CachedResponse, generation: tuple[int, int]):
+        email = key[0]
+        if entry.size > self.max_entry_bytes or self.generation(email) != generation:
+            return
+        self.remove(key)
+        self.entries[key] = entry
+        self.keys_by_identity.setdefault(email, set()).add(key)
+        self.size += entry.size
+        while self.size > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self.remove(oldest)
+            self.evictions += 1
+
+    def remove(self, key: tuple[str, str]):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry.size
+        keys = self.keys_by_identity.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_identity[key[0]]
+
+    def generation(self, email: str) -> tuple[int, int]:
+        return self.epoch, self.generations.get(email, 0)
+
+    def invalidate(self, email: str):
+        # Bumping the generation also discards responses that are still in flight.
+        if len(self.generations) >= MAX_TRACKED_GENERATIONS:
+            self.generations.clear()
+            self.epoch += 1
+        self.generations[email] = self.generations.get(email, 0) + 1
+        for key in list(self.keys_by_identity.get(email, ())):
+            self.remove(key)
+        self.invalidations += 1
+
+    def clear(self):
+        # A new epoch also discards responses that are still in flight.
+        self.entries.clear()
+        self.keys_by_identity.clear()
+        self.generations.clear()
+        self.size = 0
+        self.epoch += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "upstream_bytes_saved": self.upstream_bytes_saved,
+            "client_bytes_saved": self.client_bytes_saved,
+        }
+
+response_cache = ResponseCache(
+    settings.RESPONSE_CACHE_MAX_BYTES,
+    settings.RESPONSE_CACHE_MAX_ENTRY_BYTES,
+    settings.RESPONSE_CACHE_TTL,
+)
+
+def is_cacheable(upstream: str, path: str, request: Request, identity: Identity | None) -> bool:
+    return (
+        identity is not None
+        and request.method == "GET"
+        and path.startswith(CACHEABLE_PATH_PREFIXES.get(upstream, ()))
+    )
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def not_modified_response(entry: CachedResponse) -> Response:
+    response = Response(status_code=304)
+    response.raw_headers = [
+        (key, value) for key, value in entry.headers
+        if key in (b"etag", b"cache-control", b"vary")
+    ]
+    return response
+
+def cached_response(entry: CachedResponse) -> Response:
+    response = Response(content=entry.body, status_code=entry.status_code)
+    response.raw_headers = entry.headers
+    return response
+
+async def serve_cached(upstream: str, path: str, request: Request, identity: Identity) -> Response:
+    key = (identity.email, f"{upstream}/{path}?{request.url.query}")
+    entry = response_cache.get(key)
+    if entry is not None:
+        response_cache.hits += 1
+        response_cache.upstream_bytes_saved += len(entry.body)
+        if etag_matches(request, entry.etag):
+            response_cache.not_modified += 1
+            response_cache.client_bytes_saved += len(entry.body)
+            return not_modified_response(entry)
+        return cached_response(entry)
+
+    response_cache.misses += 1
+    generation = response_cache.generation(identity.email)
+    upstream_response = await upstreams.send(upstream, path, request, identity)
+    if not is_storable(upstream_response):
+        return stream_response(upstream_response)
+
+    try:
+        body = b"".join([chunk async for chunk in upstream_response.aiter_raw()])
+    finally:
+        await upstream_response.aclose()
+
+    entry = build_entry(upstream_response, body)
+    response_cache.put(key, entry, generation)
+    if etag_matches(request, entry.etag):
+        response_cache.not_modified += 1
+        response_cache.client_bytes_saved += len(body)
+        return not_modified_response(entry)
+    return cached_response(entry)
+
+def is_storable(upstream_response: httpx.Response) -> bool:
+    content_length = upstream_response.headers.get("content-length")
+    cache_control = upstream_response.headers.get("cache-control", "")
+    return (
+        upstream_response.status_code == 200
+        and "set-cookie" not in upstream_response.headers
+        and "no-store" not in cache_control
+        and content_length is not None
+        and int(content_length) <= settings.RESPONSE_CACHE_MAX_ENTRY_BYTES
+    )
+
+def build_entry(upstream_response: httpx.Response, body: bytes) -> CachedResponse:
+    etag = upstream_response.headers.get("etag") or f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    headers = [
+        (key, value) for key, value in forwarded_response_headers(upstream_response)
+        if key not in (b"etag", b"cache-control")
+    ]
+    headers.append((b"etag", etag.encode("latin-1")))
+    headers.append((b"cache-control", b"private, no-cache"))
+    return CachedResponse(
+        status_code=upstream_response.status_code,
+        headers=headers,
+        body=body,
+        etag=etag,
+        expires_at=time.monotonic() + response_cache.ttl,
+    )
+
+async def invalidate_identity(email: str):
+    response_cache.invalidate(email)
+    try:
+        await redis_client.publish(INVALIDATION_CHANNEL, email)
+    except redis.RedisError:
+        # Other workers still drop the entry once its TTL runs out.
+        pass
+
+async def listen_for_invalidations():
+    while True:
+        try:
+            async with redis_client.pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "subscribe":
+                        # Anything published while we were not subscribed is lost, so start from scratch.
+                        response_cache.clear()
+                    elif message["type"] == "message":
+                        response_cache.invalidate(message["data"])
+        except redis.RedisError:
+            await asyncio.sleep(1)
@@ -0,0 +1,43 @@
+from pydantic_settings import BaseSettings
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+class Settings(BaseSettings):
+    # Comma-separated replica lists; the single-host variables are still honoured.
+    USER_SERVICE_URLS: str = os.getenv("USER_SERVICE_URLS", os.getenv("USER_SERVICE_URL", "http://user-service:8000"))
+    FILE_SERVICE_URLS: str = os.getenv("FILE_SERVICE_URLS", os.getenv("FILE_SERVICE_URL", "http://file-service:8001"))
+    SECRET_KEY: str = os.getenv("SECRET_KEY")
+    ALGORITHM: str = os.getenv("ALGORITHM")
+    REDIS_URL: str = os.getenv("REDIS_URL")
+    # Bearer token for /metrics and the gateway's own stats endpoints; they answer 404 while it is unset.
+    OPS_TOKEN: str = os.getenv("OPS_TOKEN", "")
+
+    UPSTREAM_MAX_CONNECTIONS: int = 100
+    UPSTREAM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    UPSTREAM_KEEPALIVE_EXPIRY: float = 30.0
+    UPSTREAM_HTTP2: bool = False
+    UPSTREAM_CONNECT_TIMEOUT: float = 5.0
+    UPSTREAM_READ_TIMEOUT: float = 30.0
+    UPSTREAM_WRITE_TIMEOUT: float = 30.0
+    UPSTREAM_POOL_TIMEOUT: float = 5.0
+    UPSTREAM_MAX_CONCURRENCY: int = 100
+
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_OPEN_SECONDS: float = 10.0
+    RETRY_MAX_ATTEMPTS: int = 2
+    RETRY_BUDGET_RATIO: float = 0.2
+    RETRY_BUDGET_MAX_TOKENS: float = 10.0
+
+    AUTH_TOKEN_CACHE_TTL: float = 5.0
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESPONSE_CACHE_MAX_ENTRY_BYTES: int = 1024 * 1024
+    RESPONSE_CACHE_TTL: float = 60.0
+
+    class Config:
+        env_file = ".env"
+
+settings = Settings()
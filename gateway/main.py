@@ -1,43 +1,55 @@
-from fastapi import FastAPI, Request
-import httpx
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request
+from auth import Identity, authenticate, redis_client, require_ops_token
+from cache import invalidate_identity, is_cacheable, listen_for_invalidations, response_cache, serve_cached
+from metrics import MetricsMiddleware, metrics_response
+from upstream import upstreams
 
-app = FastAPI()
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
 
-USER_SERVICE_URL = "http://user-service:8000"
-FILE_SERVICE_URL = "http://file-service:8001"
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    upstreams.start()
+    invalidation_listener = asyncio.create_task(listen_for_invalidations())
+    yield
+    invalidation_listener.cancel()
+    await upstreams.close()
+    await redis_client.aclose()
 
-@app.get("/users/{path:path}")
-async def proxy_user_service(path: str, request: Request):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{USER_SERVICE_URL}/{path}", headers=request.headers)
-        return response.json()
-
-@app.post("/users/{path:path}")
-async def proxy_user_service_post(path: str, request: Request):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{USER_SERVICE_URL}/{path}", json=await request.json(), headers=request.headers)
-        return response.json()
-    
-@app.patch("/users/{path:path}")
-async def proxy_user_service(path: str, request: Request):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{USER_SERVICE_URL}/{path}", headers=request.headers)
-        return response.json()
-    
-@app.delete("/users/{path:path}")
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+app.add_api_route("/metrics", metrics_response, include_in_schema=False, dependencies=[Depends(require_ops_token)])
+
+PROXY_METHODS = ["GET", "HEAD", "OPTIONS", "POST", "PUT", "PATCH", "DELETE"]
+
+async def proxy(upstream: str, path: str, request: Request, identity: Identity | None):
+    if is_cacheable(upstream, path, request, identity):
+        return await serve_cached(upstream, path, request, identity)
+    if identity is None or request.method in SAFE_METHODS:
+        return await upstreams.forward(upstream, path, request, identity)
+
+    # Drop cached reads both before the write and once it has been applied upstream,
+    # so a read racing the write cannot repopulate the cache with stale data.
+    await invalidate_identity(identity.email)
+    response = await upstreams.forward(upstream, path, request, identity)
+    await invalidate_identity(identity.email)
+    return response
+
+@app.get("/gateway/cache/stats", dependencies=[Depends(require_ops_token)])
+async def cache_stats():
+    return response_cache.stats()
+
+@app.get("/gateway/upstreams", dependencies=[Depends(require_ops_token)])
+async def upstream_stats():
+    return upstreams.stats()
+
+@app.api_route("/users/{path:path}", methods=PROXY_METHODS)
 async def proxy_user_service(path: str, request: Request):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{USER_SERVICE_URL}/{path}", headers=request.headers)
-        return response.json()
+    identity = await authenticate("users", path, request)
+    return await proxy("users", path, request, identity)
 
-@app.get("/files/{path:path}")
+@app.api_route("/files/{path:path}", methods=PROXY_METHODS)
 async def proxy_file_service(path: str, request: Request):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{FILE_SERVICE_URL}/{path}", headers=request.headers)
-        return response.json()
-
-@app.post("/files/{path:path}")
-async def proxy_file_service_post(path: str, request: Request):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{FILE_SERVICE_URL}/{path}", json=await request.json(), headers=request.headers)
-        return response.json()
\ No newline at end of file
+    identity = await authenticate("files", path, request)
+    return await proxy("files", path, request, identity)
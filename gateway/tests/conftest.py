@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The gateway imports its modules as top-level names; run these tests as their own session:
+#   python -m pytest gateway/tests
+os.environ.setdefault("SECRET_KEY", "gateway-test-secret-key-32-bytes!")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,102 @@
+import httpx
+import pytest
+import balancer
+from balancer import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, Replica, RetryBudget, Upstream
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(balancer.time, "monotonic", lambda: now[0])
+    return now
+
+def make_replica(url: str, max_concurrency: int = 10) -> Replica:
+    return Replica(url, httpx.AsyncClient(base_url=url), max_concurrency)
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, open_seconds=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allows_request()
+
+def test_breaker_lets_one_probe_through_once_open_seconds_pass(clock):
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=10)
+    breaker.record_failure()
+    clock[0] += 9.9
+    assert not breaker.allows_request()
+
+    clock[0] += 0.1
+    assert breaker.allows_request()
+    assert breaker.state == HALF_OPEN
+    breaker.on_attempt()
+    assert not breaker.allows_request()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.allows_request()
+
+def test_failed_probe_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=5, open_seconds=10)
+    for _ in range(5):
+        breaker.record_failure()
+    clock[0] += 10
+    assert breaker.allows_request()
+    breaker.on_attempt()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allows_request()
+    clock[0] += 10
+    assert breaker.allows_request()
+
+def test_abandoned_probe_lets_the_next_one_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, open_seconds=10)
+    breaker.record_failure()
+    clock[0] += 10
+    assert breaker.allows_request()
+    breaker.on_attempt()
+
+    breaker.abandon_attempt()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allows_request()
+
+def test_retry_budget_earns_a_fraction_per_request_and_is_capped():
+    budget = RetryBudget(ratio=0.25, max_tokens=2)
+    assert budget.withdraw()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+    for _ in range(3):
+        budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+    for _ in range(100):
+        budget.deposit()
+    assert budget.tokens == 2
+
+def test_choose_prefers_the_least_loaded_replica():
+    first, second, third = make_replica("http://a"), make_replica("http://b"), make_replica("http://c")
+    upstream = Upstream("users", [first, second, third])
+    first.outstanding, second.outstanding, third.outstanding = 3, 1, 2
+
+    assert upstream.choose(exclude=set()) is second
+    assert upstream.choose(exclude={second}) is third
+
+def test_choose_skips_saturated_and_open_replicas(clock):
+    full, broken, healthy = make_replica("http://a", max_concurrency=1), make_replica("http://b"), make_replica("http://c")
+    upstream = Upstream("users", [full, broken, healthy])
+    full.acquire()
+    for _ in range(broken.breaker.failure_threshold):
+        broken.breaker.record_failure()
+    healthy.outstanding = 5
+
+    assert upstream.choose(exclude=set()) is healthy
+    assert upstream.choose(exclude={healthy}) is None
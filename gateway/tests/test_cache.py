@@ -0,0 +1,116 @@
+import asyncio
+import fakeredis
+import httpx
+import pytest
+import cache
+from cache import CachedResponse, ResponseCache
+from config import settings
+
+def entry(body: bytes = b"{}", expires_in: float = 60.0) -> CachedResponse:
+    return CachedResponse(200, [], body, '"etag"', cache.time.monotonic() + expires_in)
+
+def test_invalidation_drops_the_identitys_entries_only():
+    responses = ResponseCache(max_bytes=1000, max_entry_bytes=100, ttl=60)
+    responses.put(("a@example.com", "/user/info"), entry(), responses.generation("a@example.com"))
+    responses.put(("b@example.com", "/user/info"), entry(), responses.generation("b@example.com"))
+
+    responses.invalidate("a@example.com")
+
+    assert responses.get(("a@example.com", "/user/info")) is None
+    assert responses.get(("b@example.com", "/user/info")) is not None
+    assert responses.size == len(b"{}")
+
+def test_responses_fetched_before_an_invalidation_are_not_stored():
+    responses = ResponseCache(max_bytes=1000, max_entry_bytes=100, ttl=60)
+    generation = responses.generation("a@example.com")
+
+    # A write went through while the read was in flight.
+    responses.invalidate("a@example.com")
+    responses.put(("a@example.com", "/user/info"), entry(), generation)
+
+    assert responses.get(("a@example.com", "/user/info")) is None
+    responses.put(("a@example.com", "/user/info"), entry(), responses.generation("a@example.com"))
+    assert responses.get(("a@example.com", "/user/info")) is not None
+
+def test_forgetting_generations_moves_to_a_new_epoch(monkeypatch):
+    monkeypatch.setattr(cache, "MAX_TRACKED_GENERATIONS", 2)
+    responses = ResponseCache(max_bytes=1000, max_entry_bytes=100, ttl=60)
+    in_flight = responses.generation("c@example.com")
+    responses.invalidate("a@example.com")
+    responses.invalidate("b@example.com")
+
+    # The table is full: it is cleared, and the epoch keeps the generations read before stale.
+    responses.invalidate("a@example.com")
+    responses.put(("c@example.com", "/user/info"), entry(), in_flight)
+
+    assert responses.generations == {"a@example.com": 1}
+    assert responses.generation("c@example.com") == (1, 0) != in_flight
+    assert responses.get(("c@example.com", "/user/info")) is None
+
+def test_entries_are_evicted_oldest_first_within_the_budget():
+    responses = ResponseCache(max_bytes=10, max_entry_bytes=8, ttl=60)
+    generation = responses.generation("a@example.com")
+    responses.put(("a@example.com", "first"), entry(b"1111"), generation)
+    responses.put(("a@example.com", "second"), entry(b"2222"), generation)
+    responses.get(("a@example.com", "first"))
+
+    responses.put(("a@example.com", "third"), entry(b"3333"), generation)
+    responses.put(("a@example.com", "too-big"), entry(b"x" * 9), generation)
+
+    assert list(responses.entries) == [("a@example.com", "first"), ("a@example.com", "third")]
+    assert responses.size == 8 and responses.evictions == 1
+
+def test_expired_entries_are_dropped_on_read():
+    responses = ResponseCache(max_bytes=100, max_entry_bytes=100, ttl=60)
+    responses.put(("a@example.com", "/user/info"), entry(expires_in=-1), responses.generation("a@example.com"))
+
+    assert responses.get(("a@example.com", "/user/info")) is None
+    assert responses.size == 0 and responses.keys_by_identity == {}
+
+async def wait_for(condition):
+    for _ in range(200):
+        if condition():
+            return True
+        await asyncio.sleep(0.01)
+    return False
+
+async def test_subscribing_again_starts_from_an_empty_cache(monkeypatch):
+    redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    responses = ResponseCache(max_bytes=1000, max_entry_bytes=100, ttl=60)
+    monkeypatch.setattr(cache, "redis_client", redis_client)
+    monkeypatch.setattr(cache, "response_cache", responses)
+    in_flight = responses.generation("a@example.com")
+    responses.put(("b@example.com", "/user/info"), entry(), responses.generation("b@example.com"))
+
+    # Invalidations published while this worker was not subscribed never reach it.
+    listener = asyncio.create_task(cache.listen_for_invalidations())
+    try:
+        assert await wait_for(lambda: not responses.entries)
+        responses.put(("a@example.com", "/user/info"), entry(), in_flight)
+        assert responses.entries == {} and responses.size == 0
+
+        responses.put(("c@example.com", "/user/info"), entry(), responses.generation("c@example.com"))
+        await redis_client.publish(cache.INVALIDATION_CHANNEL, "c@example.com")
+        assert await wait_for(lambda: not responses.entries)
+    finally:
+        # fakeredis may swallow a cancellation while it waits for a message.
+        while not listener.done():
+            listener.cancel()
+            await asyncio.sleep(0.01)
+
+@pytest.fixture
+async def client():
+    from main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://gateway") as client:
+        yield client
+
+@pytest.mark.parametrize("path", ["/gateway/cache/stats", "/gateway/upstreams", "/metrics"])
+async def test_stats_need_the_ops_token(client, monkeypatch, path):
+    monkeypatch.setattr(settings, "OPS_TOKEN", "")
+    assert (await client.get(path, headers={"Authorization": "Bearer anything"})).status_code == 404
+
+    monkeypatch.setattr(settings, "OPS_TOKEN", "ops-secret")
+    assert (await client.get(path)).status_code == 401
+    assert (await client.get(path, headers={"Authorization": "Bearer wrong"})).status_code == 401
+    assert (await client.get(path, headers={"Authorization": "Bearer ops-secret"})).status_code == 200
@@ -0,0 +1,105 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+from balancer import HALF_OPEN, Replica, Upstream
+from upstream import CLIENT_CLOSED_REQUEST, UpstreamPool
+
+def make_request(method: str = "GET", body_messages: list[dict] | None = None) -> Request:
+    headers = [(b"host", b"gateway")]
+    if body_messages is not None:
+        headers.append((b"content-length", b"1048576"))
+    messages = list(body_messages or [])
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    scope = {
+        "type": "http", "method": method, "path": "/users/upload", "query_string": b"", "headers": headers,
+        "scheme": "https", "server": ("gateway", 443), "client": ("203.0.113.7", 50000),
+    }
+    return Request(scope, receive)
+
+def make_pool(*handlers) -> tuple[UpstreamPool, list[Replica]]:
+    replicas = [
+        Replica(f"http://replica-{index}", httpx.AsyncClient(base_url=f"http://replica-{index}", transport=httpx.MockTransport(handler)), 10)
+        for index, handler in enumerate(handlers)
+    ]
+    pool = UpstreamPool()
+    pool.upstreams["users"] = Upstream("users", replicas)
+    return pool, replicas
+
+class StreamedBody(httpx.AsyncByteStream):
+    # Responses built from bytes are read up front and never close their stream; real ones stream.
+    async def __aiter__(self):
+        yield b"done"
+
+def ok(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, stream=StreamedBody())
+
+def refuse(request: httpx.Request) -> httpx.Response:
+    raise httpx.ConnectError("connection refused", request=request)
+
+def open_then_expire(replica: Replica):
+    for _ in range(replica.breaker.failure_threshold):
+        replica.breaker.record_failure()
+    replica.breaker.opened_at -= replica.breaker.open_seconds
+
+async def test_slot_is_held_until_the_response_body_is_closed():
+    pool, (replica,) = make_pool(ok)
+    response = await pool.send("users", "info", make_request())
+    assert replica.outstanding == 1
+
+    assert await response.aread() == b"done"
+    await response.aclose()
+    assert replica.outstanding == 0
+
+async def test_client_disconnect_mid_upload_releases_the_slot_and_the_probe():
+    pool, (replica,) = make_pool(ok)
+    open_then_expire(replica)
+    chunk = {"type": "http.request", "body": b"x" * 1024, "more_body": True}
+
+    with pytest.raises(HTTPException) as raised:
+        await pool.send("users", "upload", make_request("POST", [chunk, chunk]))
+
+    assert raised.value.status_code == CLIENT_CLOSED_REQUEST
+    assert replica.outstanding == 0
+    assert replica.breaker.state == HALF_OPEN
+    assert replica.breaker.allows_request()
+
+async def test_cancelled_request_releases_the_slot():
+    started = asyncio.Event()
+
+    async def hang(request: httpx.Request) -> httpx.Response:
+        started.set()
+        await asyncio.Event().wait()
+
+    pool, (replica,) = make_pool(hang)
+    task = asyncio.create_task(pool.send("users", "info", make_request()))
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert replica.outstanding == 0
+
+async def test_transport_error_is_retried_on_another_replica():
+    pool, replicas = make_pool(refuse, ok)
+    # Pin the first choice to the failing replica.
+    replicas[1].outstanding = 1
+
+    response = await pool.send("users", "info", make_request())
+    await response.aclose()
+
+    assert [replica.outstanding for replica in replicas] == [0, 1]
+    assert replicas[0].breaker.consecutive_failures == 1
+    assert replicas[1].breaker.consecutive_failures == 0
+
+async def test_unavailable_after_every_attempt_maps_to_bad_gateway():
+    pool, replicas = make_pool(refuse, refuse)
+
+    with pytest.raises(HTTPException) as raised:
+        await pool.send("users", "info", make_request())
+
+    assert raised.value.status_code == 502
+    assert [replica.outstanding for replica in replicas] == [0, 0]
@@ -0,0 +1,186 @@
+import httpx
+from fastapi import HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.requests import ClientDisconnect
+from auth import IDENTITY_HEADERS, Identity, identity_headers
+from balancer import Replica, ReleasingStream, Upstream, parse_urls
+from config import settings
+
+# Headers that describe a single hop and must not be forwarded by a proxy (RFC 9110, 7.6.1).
+HOP_BY_HOP_HEADERS = frozenset({
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "proxy-connection",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+})
+
+# Set by the gateway's own server on every response; forwarding them would duplicate the headers.
+SERVER_HEADERS = frozenset({"date", "server"})
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+# Statuses that mean the replica could not serve the request, as opposed to an application error.
+UNAVAILABLE_STATUSES = frozenset({502, 503, 504})
+
+# nginx's status for a client that went away before the response; nobody receives it, but it is logged.
+CLIENT_CLOSED_REQUEST = 499
+
+class UpstreamPool:
+    def __init__(self):
+        self.urls = {
+            "users": parse_urls(settings.USER_SERVICE_URLS),
+            "files": parse_urls(settings.FILE_SERVICE_URLS),
+        }
+        self.upstreams: dict[str, Upstream] = {}
+
+    def start(self):
+        limits = httpx.Limits(
+            max_connections=settings.UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.UPSTREAM_KEEPALIVE_EXPIRY,
+        )
+        timeout = httpx.Timeout(
+            connect=settings.UPSTREAM_CONNECT_TIMEOUT,
+            read=settings.UPSTREAM_READ_TIMEOUT,
+            write=settings.UPSTREAM_WRITE_TIMEOUT,
+            pool=settings.UPSTREAM_POOL_TIMEOUT,
+        )
+        for name, urls in self.urls.items():
+            replicas = [
+                Replica(
+                    url,
+                    httpx.AsyncClient(
+                        base_url=url,
+                        limits=limits,
+                        timeout=timeout,
+                        http2=settings.UPSTREAM_HTTP2,
+                        follow_redirects=False,
+                    ),
+                    settings.UPSTREAM_MAX_CONCURRENCY,
+                )
+                for url in urls
+            ]
+            self.upstreams[name] = Upstream(name, replicas)
+
+    async def close(self):
+        for upstream in self.upstreams.values():
+            for replica in upstream.replicas:
+                await replica.client.aclose()
+        self.upstreams.clear()
+
+    async def send(self, name: str, path: str, request: Request, identity: Identity | None = None) -> httpx.Response:
+        upstream = self.upstreams[name]
+        headers = forwarded_request_headers(request)
+        if identity is not None:
+            headers.extend(identity_headers(identity))
+        # A streamed body can only be sent once, so only bodiless idempotent requests are retried.
+        body = has_body(request)
+        retryable = request.method in IDEMPOTENT_METHODS and not body
+        upstream.retry_budget.deposit()
+
+        def can_retry(attempt: int, tried: set[Replica]) -> bool:
+            return (
+                retryable
+                and attempt < settings.RETRY_MAX_ATTEMPTS
+                and upstream.choose(exclude=tried) is not None
+                and upstream.retry_budget.withdraw()
+            )
+
+        tried: set[Replica] = set()
+        error: httpx.TransportError | None = None
+        for attempt in range(settings.RETRY_MAX_ATTEMPTS + 1):
+            replica = upstream.choose(exclude=tried)
+            if replica is None:
+                break
+            tried.add(replica)
+
+            upstream_request = replica.client.build_request(
+                request.method,
+                f"/{path}",
+                params=request.query_params.multi_items(),
+                headers=headers,
+                content=request.stream() if body else None,
+            )
+            replica.acquire()
+            try:
+                upstream_response = await replica.client.send(upstream_request, stream=True)
+            except httpx.TransportError as exc:
+                replica.release()
+                replica.breaker.record_failure()
+                error = exc
+                if can_retry(attempt, tried):
+                    continue
+                break
+            except ClientDisconnect:
+                # The client hung up while its body was being relayed; the replica did nothing wrong.
+                replica.abandon()
+                raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request") from None
+            except BaseException:
+                replica.abandon()
+                raise
+
+            if upstream_response.status_code in UNAVAILABLE_STATUSES:
+                replica.breaker.record_failure()
+                if can_retry(attempt, tried):
+                    try:
+                        await upstream_response.aclose()
+                    finally:
+                        replica.release()
+                    continue
+            else:
+                replica.breaker.record_success()
+            upstream_response.stream = ReleasingStream(upstream_response.stream, replica)
+            return upstream_response
+
+        if error is None:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="No upstream replica available")
+        if isinstance(error, httpx.TimeoutException):
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Upstream timed out")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Upstream unavailable")
+
+    async def forward(self, name: str, path: str, request: Request, identity: Identity | None = None) -> Response:
+        upstream_response = await self.send(name, path, request, identity)
+        return stream_response(upstream_response)
+
+    def stats(self) -> dict:
+        return {name: upstream.stats() for name, upstream in self.upstreams.items()}
+
+def stream_response(upstream_response: httpx.Response) -> Response:
+    response = StreamingResponse(
+        upstream_response.aiter_raw(),
+        status_code=upstream_response.status_code,
+        background=BackgroundTask(upstream_response.aclose),
+    )
+    response.raw_headers = forwarded_response_headers(upstream_response)
+    return response
+
+def has_body(request: Request) -> bool:
+    return "transfer-encoding" in request.headers or request.headers.get("content-length", "0") != "0"
+
+def forwarded_request_headers(request: Request) -> list[tuple[str, str]]:
+    headers = [
+        (key, value) for key, value in request.headers.items()
+        if key not in HOP_BY_HOP_HEADERS and key not in IDENTITY_HEADERS and key != "host"
+    ]
+    if request.client:
+        forwarded_for = request.headers.get("x-forwarded-for")
+        client_host = request.client.host
+        headers = [(key, value) for key, value in headers if key != "x-forwarded-for"]
+        headers.append(("x-forwarded-for", f"{forwarded_for}, {client_host}" if forwarded_for else client_host))
+    headers.append(("x-forwarded-proto", request.url.scheme))
+    return headers
+
+def forwarded_response_headers(upstream_response: httpx.Response) -> list[tuple[bytes, bytes]]:
+    return [
+        (key.encode("latin-1"), value.encode("latin-1"))
+        for key, value in upstream_response.headers.multi_items()
+        if key not in HOP_BY_HOP_HEADERS and key not in SERVER_HEADERS
+    ]
+
+upstreams = UpstreamPool()
@@ -0,0 +1,46 @@
+"""add users.projects_count
+
+Revision ID: 3f9c1a7e52b4
+Revises: d6b283344baa
+Create Date: 2026-10-18 10:05:12.481302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c1a7e52b4'
+down_revision = 'd6b283344baa'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+users = sa.table('users', sa.column('id', sa.Integer), sa.column('projects_count', sa.Integer))
+projects = sa.table('projects', sa.column('user_id', sa.Integer))
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('projects_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Count every user's projects in one GROUP BY pass: projects.user_id is only indexed by
+    # 8b2d4e6f1a3c, so filtering projects per id range would scan the whole table per batch.
+    # The counts are then written a batch per transaction so no statement locks every user.
+    # Projects written by the old code while this runs are fixed by `manage.py repair-projects-count`.
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        counts = connection.execute(
+            sa.select(projects.c.user_id, sa.func.count().label('total')).group_by(projects.c.user_id)
+        ).all()
+        update_count = (
+            users.update()
+            .where(users.c.id == sa.bindparam('user_id_'))
+            .values(projects_count=sa.bindparam('total'))
+        )
+        for start in range(0, len(counts), BACKFILL_BATCH_SIZE):
+            batch = counts[start:start + BACKFILL_BATCH_SIZE]
+            connection.execute(update_count, [{'user_id_': user_id, 'total': total} for user_id, total in batch])
+
+def downgrade() -> None:
+    op.drop_column('users', 'projects_count')
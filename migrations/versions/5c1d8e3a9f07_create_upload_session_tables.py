@@ -0,0 +1,56 @@
+"""create upload session tables
+
+Revision ID: 5c1d8e3a9f07
+Revises: e4a7c2d9b615
+Create Date: 2026-10-18 16:47:09.552816
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1d8e3a9f07'
+down_revision = 'e4a7c2d9b615'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('upload_sessions',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=1024), nullable=False),
+    sa.Column('content_type', sa.String(length=255), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.Column('expires_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_upload_sessions_owner_id'), 'upload_sessions', ['owner_id'], unique=False)
+    op.create_index(op.f('ix_upload_sessions_expires_at'), 'upload_sessions', ['expires_at'], unique=False)
+    op.create_table('upload_parts',
+    sa.Column('upload_id', sa.String(length=32), nullable=False),
+    sa.Column('part_number', sa.Integer(), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.ForeignKeyConstraint(['upload_id'], ['upload_sessions.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('upload_id', 'part_number')
+    )
+    op.create_table('upload_part_chunks',
+    sa.Column('upload_id', sa.String(length=32), nullable=False),
+    sa.Column('part_number', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('chunk_hash', sa.String(length=64), nullable=False),
+    sa.ForeignKeyConstraint(['chunk_hash'], ['chunks.hash'], ),
+    sa.ForeignKeyConstraint(['upload_id', 'part_number'], ['upload_parts.upload_id', 'upload_parts.part_number'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('upload_id', 'part_number', 'position')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('upload_part_chunks')
+    op.drop_table('upload_parts')
+    op.drop_index(op.f('ix_upload_sessions_expires_at'), table_name='upload_sessions')
+    op.drop_index(op.f('ix_upload_sessions_owner_id'), table_name='upload_sessions')
+    op.drop_table('upload_sessions')
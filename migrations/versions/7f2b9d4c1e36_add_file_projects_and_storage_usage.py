@@ -0,0 +1,69 @@
+"""add file projects and storage usage
+
+Revision ID: 7f2b9d4c1e36
+Revises: a9e3f61c2d84
+Create Date: 2026-10-18 19:42:07.318254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7f2b9d4c1e36'
+down_revision = 'a9e3f61c2d84'
+branch_labels = None
+depends_on = None
+
+files = sa.table('files', sa.column('owner_id', sa.Integer), sa.column('size', sa.BigInteger))
+user_storage_usage = sa.table(
+    'user_storage_usage',
+    sa.column('user_id', sa.Integer), sa.column('bytes', sa.BigInteger), sa.column('files', sa.Integer),
+)
+
+
+def upgrade() -> None:
+    # Batch mode so the foreign keys can be added on SQLite too; PostgreSQL gets plain ALTERs.
+    with op.batch_alter_table('files') as batch_op:
+        batch_op.add_column(sa.Column('project_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_files_project_id_projects', 'projects', ['project_id'], ['id'], ondelete='SET NULL')
+    with op.batch_alter_table('upload_sessions') as batch_op:
+        batch_op.add_column(sa.Column('project_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_upload_sessions_project_id_projects', 'projects', ['project_id'], ['id'], ondelete='SET NULL')
+    op.create_index('ix_files_project_id_id', 'files', ['project_id', sa.text('id DESC')], unique=False)
+
+    op.create_table('user_storage_usage',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('bytes', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('files', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table('project_storage_usage',
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('bytes', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('files', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('project_id')
+    )
+
+    # No file has a project yet, so only the per-user totals need a backfill. Uploads that
+    # land while this runs are fixed by `manage.py repair-storage-usage`.
+    op.execute(
+        user_storage_usage.insert().from_select(
+            ['user_id', 'bytes', 'files'],
+            sa.select(files.c.owner_id, sa.func.sum(files.c.size), sa.func.count()).group_by(files.c.owner_id),
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('project_storage_usage')
+    op.drop_table('user_storage_usage')
+    with op.batch_alter_table('upload_sessions') as batch_op:
+        batch_op.drop_constraint('fk_upload_sessions_project_id_projects', type_='foreignkey')
+        batch_op.drop_column('project_id')
+    op.drop_index('ix_files_project_id_id', table_name='files')
+    with op.batch_alter_table('files') as batch_op:
+        batch_op.drop_constraint('fk_files_project_id_projects', type_='foreignkey')
+        batch_op.drop_column('project_id')
@@ -0,0 +1,37 @@
+"""add project indexes
+
+Revision ID: 8b2d4e6f1a3c
+Revises: 3f9c1a7e52b4
+Create Date: 2026-10-18 11:42:37.905114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2d4e6f1a3c'
+down_revision = '3f9c1a7e52b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps projects writable while the indexes build on PostgreSQL;
+    # it cannot run inside a transaction, hence the autocommit block.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_projects_user_id_link', 'projects', ['user_id', 'link'],
+            unique=False, postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_projects_user_id_changed_at_id', 'projects',
+            ['user_id', sa.text('changed_at DESC'), sa.text('id DESC')],
+            unique=False, postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_projects_user_id_changed_at_id', table_name='projects', postgresql_concurrently=True)
+        op.drop_index('ix_projects_user_id_link', table_name='projects', postgresql_concurrently=True)
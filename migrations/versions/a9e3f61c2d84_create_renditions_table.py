@@ -0,0 +1,35 @@
+"""create renditions table
+
+Revision ID: a9e3f61c2d84
+Revises: 5c1d8e3a9f07
+Create Date: 2026-10-18 18:03:51.207664
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9e3f61c2d84'
+down_revision = '5c1d8e3a9f07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('renditions',
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('spec', sa.String(length=64), nullable=False),
+    sa.Column('chunk_hash', sa.String(length=64), nullable=True),
+    sa.Column('content_type', sa.String(length=255), nullable=False),
+    sa.Column('width', sa.Integer(), nullable=True),
+    sa.Column('height', sa.Integer(), nullable=True),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['chunk_hash'], ['chunks.hash'], ),
+    sa.PrimaryKeyConstraint('content_hash', 'spec')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('renditions')
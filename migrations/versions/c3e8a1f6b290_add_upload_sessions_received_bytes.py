@@ -0,0 +1,35 @@
+"""add upload sessions received bytes
+
+Revision ID: c3e8a1f6b290
+Revises: 7f2b9d4c1e36
+Create Date: 2026-10-18 21:14:36.702915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e8a1f6b290'
+down_revision = '7f2b9d4c1e36'
+branch_labels = None
+depends_on = None
+
+upload_sessions = sa.table('upload_sessions', sa.column('id', sa.String), sa.column('received_bytes', sa.BigInteger))
+upload_parts = sa.table('upload_parts', sa.column('upload_id', sa.String), sa.column('size', sa.BigInteger))
+
+
+def upgrade() -> None:
+    op.add_column('upload_sessions', sa.Column('received_bytes', sa.BigInteger(), server_default='0', nullable=False))
+    # Uploads in progress expire within a day, so there are few of them.
+    received = (
+        sa.select(sa.func.coalesce(sa.func.sum(upload_parts.c.size), 0))
+        .where(upload_parts.c.upload_id == upload_sessions.c.id)
+        .scalar_subquery()
+    )
+    op.execute(upload_sessions.update().values(received_bytes=received))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('upload_sessions') as batch_op:
+        batch_op.drop_column('received_bytes')
@@ -0,0 +1,59 @@
+"""create file storage tables
+
+Revision ID: e4a7c2d9b615
+Revises: 8b2d4e6f1a3c
+Create Date: 2026-10-18 15:20:44.318027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a7c2d9b615'
+down_revision = '8b2d4e6f1a3c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('chunks',
+    sa.Column('hash', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('touched_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('hash')
+    )
+    op.create_table('files',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=1024), nullable=False),
+    sa.Column('content_type', sa.String(length=255), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_files_owner_id'), 'files', ['owner_id'], unique=False)
+    op.create_index(op.f('ix_files_content_hash'), 'files', ['content_hash'], unique=False)
+    op.create_table('file_chunks',
+    sa.Column('file_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('offset', sa.BigInteger(), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('chunk_hash', sa.String(length=64), nullable=False),
+    sa.ForeignKeyConstraint(['chunk_hash'], ['chunks.hash'], ),
+    sa.ForeignKeyConstraint(['file_id'], ['files.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('file_id', 'position')
+    )
+    op.create_index(op.f('ix_file_chunks_chunk_hash'), 'file_chunks', ['chunk_hash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_file_chunks_chunk_hash'), table_name='file_chunks')
+    op.drop_table('file_chunks')
+    op.drop_index(op.f('ix_files_content_hash'), table_name='files')
+    op.drop_index(op.f('ix_files_owner_id'), table_name='files')
+    op.drop_table('files')
+    op.drop_table('chunks')
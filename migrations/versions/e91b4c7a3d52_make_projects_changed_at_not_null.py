@@ -0,0 +1,36 @@
+"""make projects.changed_at not null
+
+Revision ID: e91b4c7a3d52
+Revises: c3e8a1f6b290
+Create Date: 2026-10-18 22:31:48.115620
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e91b4c7a3d52'
+down_revision = 'c3e8a1f6b290'
+branch_labels = None
+depends_on = None
+
+projects = sa.table('projects', sa.column('changed_at', sa.TIMESTAMP(timezone=True)), sa.column('created_at', sa.TIMESTAMP(timezone=True)))
+
+
+def upgrade() -> None:
+    # changed_at is the keyset pagination key; a NULL would both drop the row from every
+    # page after the first and end a page without a cursor. Rows that never recorded a
+    # change take their creation time.
+    op.execute(
+        projects.update()
+        .where(projects.c.changed_at.is_(None))
+        .values(changed_at=sa.func.coalesce(projects.c.created_at, sa.func.current_timestamp()))
+    )
+    with op.batch_alter_table('projects') as batch_op:
+        batch_op.alter_column('changed_at', existing_type=sa.TIMESTAMP(timezone=True), nullable=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('projects') as batch_op:
+        batch_op.alter_column('changed_at', existing_type=sa.TIMESTAMP(timezone=True), nullable=True)
@@ -0,0 +1,74 @@
+import fakeredis
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from api.v1.endpoints import auth
+from core import session_store
+from core.auth import generate_reset_password_token
+from core.security import PasswordHasherBusy
+from db.base import Base
+from db.models.user import Users
+from domain.users.entities import ResetPasswordRequest
+
+EMAIL = "reset@example.com"
+
+@pytest.fixture
+async def fake_redis(monkeypatch):
+  client = fakeredis.FakeAsyncRedis(decode_responses=True)
+  monkeypatch.setattr(session_store, "redis_client", client)
+  return client
+
+@pytest.fixture
+async def session_maker():
+  engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+  async with engine.begin() as conn:
+    await conn.run_sync(Base.metadata.create_all)
+    await conn.execute(insert(Users), [{"email": EMAIL, "username": "u", "hashed_password": "old"}])
+  yield async_sessionmaker(engine, expire_on_commit=False)
+  await engine.dispose()
+
+async def stored_hash(session_maker):
+  async with session_maker() as session:
+    return (await session.execute(select(Users.hashed_password).where(Users.email == EMAIL))).scalar_one()
+
+async def test_busy_hasher_leaves_the_token_and_sessions_for_the_retry(fake_redis, session_maker, monkeypatch):
+  token = await generate_reset_password_token(EMAIL)
+  await fake_redis.set(EMAIL, "access-token")
+  request = ResetPasswordRequest(email=EMAIL, token=token, new_password="new-password-123")
+
+  async def busy(password):
+    raise PasswordHasherBusy()
+
+  monkeypatch.setattr(auth.password_hasher, "hash", busy)
+  with pytest.raises(PasswordHasherBusy):
+    async with session_maker() as session:
+      await auth.reset_password(request, session)
+  assert await fake_redis.exists(session_store.reset_password_key(EMAIL))
+  assert await fake_redis.get(EMAIL) == "access-token"
+  assert await stored_hash(session_maker) == "old"
+
+  async def hashed(password):
+    return f"hashed:{password}"
+
+  monkeypatch.setattr(auth.password_hasher, "hash", hashed)
+  async with session_maker() as session:
+    await auth.reset_password(request, session)
+  assert await stored_hash(session_maker) == "hashed:new-password-123"
+  assert not await fake_redis.exists(session_store.reset_password_key(EMAIL))
+  assert await fake_redis.get(EMAIL) is None
+
+  with pytest.raises(HTTPException) as raised:
+    async with session_maker() as session:
+      await auth.reset_password(request, session)
+  assert raised.value.status_code == 400
+
+async def test_unknown_user_does_not_burn_the_token(fake_redis, session_maker):
+  token = await generate_reset_password_token("ghost@example.com")
+  request = ResetPasswordRequest(email="ghost@example.com", token=token, new_password="new-password-123")
+
+  with pytest.raises(HTTPException) as raised:
+    async with session_maker() as session:
+      await auth.reset_password(request, session)
+  assert raised.value.status_code == 404
+  assert await fake_redis.exists(session_store.reset_password_key("ghost@example.com"))
@@ -1,3 +1,4 @@
+import json
 import pytest
 import jwt
 from core.auth import create_access_token, create_refresh_token, generate_reset_password_token, verify_access_token
@@ -72,4 +73,4 @@ async def test_generate_reset_password_token(mock_redis_client, test_settings):
   email = "test@example.com"
   reset_token = await generate_reset_password_token(email=email)
   redis_key = f"reset_password:{email}"
-  mock_redis_client.set.assert_any_call(redis_key, reset_token, ex=3600)
\ No newline at end of file
+  mock_redis_client.set.assert_any_call(redis_key, json.dumps({"token": reset_token}), ex=timedelta(hours=1))
\ No newline at end of file
@@ -0,0 +1,28 @@
+import time
+import pytest
+from starlette.requests import Request
+from core.identity import IDENTITY_EXPIRES_HEADER, IDENTITY_HEADER, IDENTITY_SIGNATURE_HEADER, get_gateway_identity, sign_identity
+
+def make_request(headers):
+  return Request({"type": "http", "headers": [(key.encode(), value.encode()) for key, value in headers.items()]})
+
+def identity_headers(email, expires_at, signature=None):
+  return {
+    IDENTITY_HEADER: email,
+    IDENTITY_EXPIRES_HEADER: str(expires_at),
+    IDENTITY_SIGNATURE_HEADER: signature or sign_identity(email, expires_at),
+  }
+
+def test_gateway_identity_accepted():
+  expires_at = int(time.time()) + 60
+  request = make_request(identity_headers("test@example.com", expires_at))
+  assert get_gateway_identity(request) == "test@example.com"
+
+@pytest.mark.parametrize("headers", [
+  {},
+  identity_headers("test@example.com", int(time.time()) - 1),
+  identity_headers("test@example.com", int(time.time()) + 60, signature="0" * 64),
+  {**identity_headers("test@example.com", int(time.time()) + 60), IDENTITY_HEADER: "other@example.com"},
+])
+def test_gateway_identity_rejected(headers):
+  assert get_gateway_identity(make_request(headers)) is None
@@ -0,0 +1,79 @@
+import fakeredis
+import httpx
+from fastapi import FastAPI
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from core.metrics import MetricsMiddleware, instrument_engine, instrument_redis, metrics_response
+
+def sample(name, **labels):
+  return REGISTRY.get_sample_value(name, labels) or 0
+
+async def test_middleware_labels_requests_by_route_template():
+  app = FastAPI()
+  app.add_middleware(MetricsMiddleware)
+  app.add_api_route("/metrics", metrics_response)
+
+  @app.get("/items/{item_id}")
+  async def get_item(item_id: int):
+    return {"id": item_id}
+
+  labels = {"method": "GET", "route": "/items/{item_id}", "status": "200"}
+  before = sample("http_request_duration_seconds_count", **labels)
+  async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+    await client.get("/items/1")
+    await client.get("/items/2")
+    response = await client.get("/metrics")
+
+  assert sample("http_request_duration_seconds_count", **labels) == before + 2
+  assert 'route="/items/{item_id}"' in response.text
+
+async def test_engine_statements_and_checkouts_are_timed():
+  engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+  instrument_engine(engine, "test")
+
+  async with engine.connect() as conn:
+    await conn.execute(text("SELECT 1"))
+  await engine.dispose()
+
+  assert sample("db_statement_duration_seconds_count", engine="test", operation="SELECT") == 1
+  assert sample("db_pool_checkout_wait_seconds_count", engine="test") >= 1
+
+async def test_redis_commands_and_pipelines_are_timed():
+  client = instrument_redis(fakeredis.FakeAsyncRedis(decode_responses=True))
+  before_get = sample("redis_command_duration_seconds_count", command="GET")
+  before_pipeline = sample("redis_command_duration_seconds_count", command="PIPELINE")
+
+  await client.get("missing")
+  async with client.pipeline(transaction=True) as pipe:
+    pipe.set("key", "value")
+    pipe.get("key")
+    assert await pipe.execute() == [True, "value"]
+
+  assert sample("redis_command_duration_seconds_count", command="GET") == before_get + 1
+  assert sample("redis_command_duration_seconds_count", command="PIPELINE") == before_pipeline + 1
+
+async def test_checked_out_connections_follow_pool_events():
+  engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+  instrument_engine(engine, "gauge")
+
+  async with engine.connect() as conn:
+    await conn.execute(text("SELECT 1"))
+    assert sample("db_pool_checked_out_connections", engine="gauge") == 1
+  await engine.dispose()
+
+  assert sample("db_pool_checked_out_connections", engine="gauge") == 0
+
+async def test_metrics_need_the_ops_token(monkeypatch):
+  from core.config import settings
+  from main import create_app
+
+  transport = httpx.ASGITransport(app=create_app())
+  async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+    monkeypatch.setattr(settings, "OPS_TOKEN", "")
+    assert (await client.get("/metrics")).status_code == 404
+    monkeypatch.setattr(settings, "OPS_TOKEN", "ops-secret")
+    assert (await client.get("/metrics", headers={"Authorization": "Bearer wrong"})).status_code == 401
+    response = await client.get("/metrics", headers={"Authorization": "Bearer ops-secret"})
+  assert response.status_code == 200
+  assert "http_request_duration_seconds" in response.text
@@ -0,0 +1,50 @@
+import base64
+import json
+from datetime import datetime, timezone
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+from core.pagination import decode_cursor, encode_cursor
+from db.base import Base
+from db.models.project import Project
+from db.models.user import Users
+
+def raw_cursor(text: str) -> str:
+  return base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")
+
+def test_cursor_round_trip():
+  changed_at = datetime(2026, 1, 2, 3, 4, 5, 678, tzinfo=timezone.utc)
+
+  assert decode_cursor(encode_cursor(changed_at, 42)) == (changed_at, 42)
+
+@pytest.mark.parametrize("cursor", ["garbage", "bm90IGpzb24", "WzFd", "WyJub3QgYSBkYXRlIiwxXQ"])
+def test_invalid_cursor_is_rejected(cursor):
+  with pytest.raises(HTTPException) as exc_info:
+    decode_cursor(cursor)
+
+  assert exc_info.value.status_code == 400
+
+@pytest.mark.parametrize("row_id", ["1e400", "-1e400", str(10**30), str(2**31), "1.5", "true", '"1"', "null"])
+def test_cursor_row_id_must_fit_the_id_column(row_id):
+  with pytest.raises(HTTPException) as exc_info:
+    decode_cursor(raw_cursor(f'["2026-01-01T00:00:00",{row_id}]'))
+
+  assert exc_info.value.status_code == 400
+
+def test_largest_row_id_is_accepted():
+  cursor = raw_cursor(json.dumps(["2026-01-01T00:00:00", 2**31 - 1]))
+
+  assert decode_cursor(cursor)[1] == 2**31 - 1
+
+async def test_projects_changed_at_is_required():
+  # Every row must carry a keyset key, or encode_cursor could not end a page on it.
+  engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+  async with engine.begin() as conn:
+    await conn.run_sync(Base.metadata.create_all)
+    await conn.execute(insert(Users).values(id=1, email="test@example.com", username="tester", hashed_password="x"))
+  with pytest.raises(IntegrityError):
+    async with engine.begin() as conn:
+      await conn.execute(insert(Project).values(user_id=1, link="no-change-time", changed_at=None))
+  await engine.dispose()
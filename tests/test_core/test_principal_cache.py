@@ -0,0 +1,85 @@
+import fakeredis
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from api import dependencies
+from core.principal_cache import PrincipalCache, principal_key, principal_keys
+from db.base import Base
+from db.models.user import Users
+from domain.users.entities import Principal
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+  client = fakeredis.FakeAsyncRedis(decode_responses=True)
+  monkeypatch.setattr(dependencies, "redis_client", client)
+  return client
+
+@pytest.fixture
+def cache(monkeypatch):
+  cache = PrincipalCache(max_size=2, ttl=60)
+  monkeypatch.setattr(dependencies, "principal_cache", cache)
+  return cache
+
+@pytest.fixture
+async def session():
+  engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+  async with engine.begin() as conn:
+    await conn.run_sync(Base.metadata.create_all)
+    await conn.execute(insert(Users).values(id=7, email="test@example.com", username="tester", hashed_password="x"))
+  async with async_sessionmaker(engine)() as session:
+    yield session
+  await engine.dispose()
+
+async def test_get_principal_fills_both_tiers(fake_redis, cache, session):
+  principal = await dependencies.get_principal("test@example.com", session)
+
+  assert principal == Principal(id=7, email="test@example.com", username="tester")
+  assert await fake_redis.hgetall(principal_key("test@example.com")) == {"id": "7", "email": "test@example.com", "username": "tester"}
+  assert cache.get("test@example.com") == principal
+
+async def test_get_principal_prefers_redis_over_database(fake_redis, cache, session):
+  await fake_redis.hset(principal_key("test@example.com"), mapping={"id": 7, "email": "test@example.com", "username": "cached"})
+
+  principal = await dependencies.get_principal("test@example.com", session)
+
+  assert principal.username == "cached"
+
+async def test_get_principal_unknown_user(fake_redis, cache, session):
+  with pytest.raises(HTTPException) as exc_info:
+    await dependencies.get_principal("missing@example.com", session)
+
+  assert exc_info.value.status_code == 404
+  assert not await fake_redis.exists(principal_key("missing@example.com"))
+
+async def test_get_principal_does_not_fill_redis_after_concurrent_invalidation(fake_redis, cache, session, monkeypatch):
+  load = dependencies.get_principal_by_email
+
+  async def load_then_update(session, email):
+    principal = await load(session, email)
+    # The user is renamed and the caches invalidated while this request holds the old row.
+    await fake_redis.delete(*principal_keys(email))
+    return principal
+
+  monkeypatch.setattr(dependencies, "get_principal_by_email", load_then_update)
+  principal = await dependencies.get_principal("test@example.com", session)
+
+  assert principal.username == "tester"
+  assert not await fake_redis.exists(*principal_keys("test@example.com"))
+
+def test_put_skipped_after_concurrent_invalidation():
+  cache = PrincipalCache(max_size=2, ttl=60)
+  generation = cache.generation
+  cache.invalidate("test@example.com")
+
+  cache.put(Principal(id=7, email="test@example.com", username="stale"), generation)
+
+  assert cache.get("test@example.com") is None
+
+def test_cache_evicts_least_recently_used():
+  cache = PrincipalCache(max_size=2, ttl=60)
+  for index in range(3):
+    cache.put(Principal(id=index, email=f"user{index}@example.com", username="u"), cache.generation)
+
+  assert cache.get("user0@example.com") is None
+  assert cache.get("user2@example.com") is not None
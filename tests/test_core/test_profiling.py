@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+import time
+import httpx
+import pytest
+from fastapi import FastAPI
+from pydantic import ValidationError
+from core import profiling
+from core.profiling import Profiler, ProfilerConfig, ProfilerMiddleware, current_profile, profiler, record_span
+
+@pytest.fixture
+def enabled_profiler(tmp_path, monkeypatch):
+  monkeypatch.setattr(profiler, "output_dir", str(tmp_path))
+  monkeypatch.setattr(profiler, "enabled", True)
+  monkeypatch.setattr(profiler, "sample_rate", 0.0)
+  monkeypatch.setattr(profiler, "slow_request_seconds", 0.3)
+  monkeypatch.setattr(profiler, "interval", 0.001)
+  yield profiler
+  profiler.enabled = False
+  profiler.sampler.join()
+
+async def written_reports(directory, count):
+  for _ in range(200):
+    reports = sorted(directory.glob("*.json"))
+    if len(reports) >= count:
+      return reports
+    await asyncio.sleep(0.01)
+  return sorted(directory.glob("*.json"))
+
+def make_app():
+  app = FastAPI()
+  app.add_middleware(ProfilerMiddleware)
+
+  @app.get("/items/{item_id}")
+  async def get_item(item_id: int, slow: bool = False):
+    record_span("db", 0.25)
+    if slow:
+      deadline = time.perf_counter() + 0.4
+      while time.perf_counter() < deadline:
+        pass
+    return {"id": item_id}
+
+  return app
+
+async def test_slow_requests_are_written_with_breakdown(enabled_profiler, tmp_path):
+  async with httpx.AsyncClient(transport=httpx.ASGITransport(app=make_app()), base_url="http://test") as client:
+    fast = await client.get("/items/1")
+    slow = await client.get("/items/2?slow=true", headers={"x-request-id": "abc-123"})
+
+  assert fast.headers["x-request-id"]
+  assert slow.headers["x-request-id"] == "abc-123"
+  reports = await written_reports(tmp_path, 1)
+  assert len(reports) == 1
+
+  report = json.loads(reports[0].read_text())
+  assert report["request_id"] == "abc-123"
+  assert report["route"] == "/items/{item_id}"
+  assert report["reason"] == "slow"
+  assert report["db_seconds"] == pytest.approx(0.25)
+  assert report["samples"] > 0
+  folded = reports[0].with_suffix(".folded").read_text()
+  assert "get_item" in folded
+
+async def test_unsafe_request_ids_are_replaced(enabled_profiler, tmp_path):
+  enabled_profiler.sample_rate = 1.0
+  async with httpx.AsyncClient(transport=httpx.ASGITransport(app=make_app()), base_url="http://test") as client:
+    response = await client.get("/items/1", headers={"x-request-id": "../../etc/passwd"})
+
+  assert response.headers["x-request-id"] != "../../etc/passwd"
+  reports = await written_reports(tmp_path, 1)
+  assert [report.parent for report in reports] == [tmp_path]
+  assert json.loads(reports[0].read_text())["reason"] == "sampled"
+
+async def test_disabled_profiler_passes_requests_through(tmp_path, monkeypatch):
+  monkeypatch.setattr(profiler, "output_dir", str(tmp_path))
+  monkeypatch.setattr(profiler, "enabled", False)
+  async with httpx.AsyncClient(transport=httpx.ASGITransport(app=make_app()), base_url="http://test") as client:
+    response = await client.get("/items/1?slow=true")
+
+  assert "x-request-id" not in response.headers
+  assert list(tmp_path.iterdir()) == []
+
+def test_record_span_outside_a_profile_is_ignored():
+  assert current_profile.get() is None
+  record_span("redis", 1.0)
+
+def test_rotation_keeps_the_newest_reports(tmp_path):
+  local = Profiler()
+  local.output_dir = str(tmp_path)
+  local.max_files = 2
+  for index in range(4):
+    (tmp_path / f"2026010{index}-r.json").write_text("{}")
+    (tmp_path / f"2026010{index}-r.folded").write_text("")
+
+  local.rotate()
+
+  assert sorted(entry.name for entry in tmp_path.iterdir()) == [
+    "20260102-r.folded", "20260102-r.json", "20260103-r.folded", "20260103-r.json",
+  ]
+
+async def test_samples_are_not_added_once_the_request_finished(tmp_path, monkeypatch):
+  local = Profiler()
+  local.enabled, local.interval, local.sample_rate, local.output_dir = True, 0.001, 1.0, str(tmp_path)
+  finished = []
+
+  def collapse_while_finishing(frame):
+    # The request ends on the loop thread while the sampler is still walking its stack.
+    if not finished:
+      local.active.clear()
+      finished.append(True)
+    return "busy"
+
+  monkeypatch.setattr(profiling, "collapse", collapse_while_finishing)
+  profile = local.start_request("GET", "/busy", "busy")
+  deadline = time.perf_counter() + 0.05
+  while not finished and time.perf_counter() < deadline:
+    pass
+  local.enabled = False
+  local.sampler.join()
+
+  assert finished and profile.stacks == {}
+
+async def test_failed_profile_writes_are_logged(tmp_path, caplog):
+  local = Profiler()
+  local.enabled, local.sample_rate = True, 1.0
+  # A file where the output directory should be.
+  local.output_dir = str(tmp_path / "taken")
+  (tmp_path / "taken").write_text("")
+
+  with caplog.at_level(logging.ERROR, logger="core.profiling"):
+    local.finish_request(local.start_request("GET", "/items/1", "broken"), "/items/{item_id}", 200)
+    local.enabled = False
+    for _ in range(100):
+      if caplog.records:
+        break
+      await asyncio.sleep(0.01)
+
+  local.sampler.join()
+  assert [record.getMessage() for record in caplog.records] == ["Writing a request profile failed"]
+  assert local.state()["written"] == 0
+
+async def test_profiles_sharing_a_request_id_are_all_kept(enabled_profiler, tmp_path):
+  enabled_profiler.sample_rate = 1.0
+  written = enabled_profiler.state()["written"]
+  async with httpx.AsyncClient(transport=httpx.ASGITransport(app=make_app()), base_url="http://test") as client:
+    for _ in range(3):
+      await client.get("/items/1", headers={"x-request-id": "same-id"})
+
+  reports = await written_reports(tmp_path, 3)
+  assert len(reports) == 3
+  assert all(json.loads(report.read_text())["request_id"] == "same-id" for report in reports)
+  for _ in range(100):
+    if enabled_profiler.state()["written"] == written + 3:
+      break
+    await asyncio.sleep(0.01)
+  assert enabled_profiler.state()["written"] == written + 3
+
+def test_configure_applies_only_given_fields():
+  local = Profiler()
+  local.configure(ProfilerConfig(enabled=True, sample_rate=0.5))
+  assert local.state()["enabled"] is True
+  assert local.state()["sample_rate"] == 0.5
+
+  local.configure(ProfilerConfig(enabled=False))
+  assert local.state()["sample_rate"] == 0.5
+  assert local.state()["enabled"] is False
+
+  with pytest.raises(ValidationError):
+    ProfilerConfig(sample_rate=2)
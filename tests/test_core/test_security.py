@@ -1,5 +1,8 @@
+import asyncio
 import pytest
-from core.security import hash_password, verify_password
+from passlib.context import CryptContext
+from core.config import settings
+from core.security import PasswordHasher, PasswordHasherBusy, hash_password, verify_and_update_password, verify_password
 
 @pytest.mark.parametrize("password", [
   "simplepassword",
@@ -21,4 +24,26 @@ def test_hash_password(password):
 def test_verify_password(password):
   hashed_password = hash_password(password)
   assert verify_password(password, hashed_password), "Пароль должен быть верифицирован"
-  assert not verify_password("wrongpassword", hashed_password), "Верификация должна провалиться для неверного пароля"
\ No newline at end of file
+  assert not verify_password("wrongpassword", hashed_password), "Верификация должна провалиться для неверного пароля"
+
+@pytest.mark.asyncio
+async def test_password_hasher_runs_off_loop():
+  hasher = PasswordHasher(max_workers=2, max_queue=0)
+  hashed_password = await hasher.hash("simplepassword")
+  assert await hasher.verify_and_update("simplepassword", hashed_password) == (True, None)
+  assert (await hasher.verify_and_update("wrongpassword", hashed_password))[0] is False
+
+@pytest.mark.asyncio
+async def test_password_hasher_rejects_when_saturated():
+  hasher = PasswordHasher(max_workers=1, max_queue=0)
+  first = asyncio.create_task(hasher.hash("simplepassword"))
+  await asyncio.sleep(0)
+  with pytest.raises(PasswordHasherBusy):
+    await hasher.hash("simplepassword")
+  await first
+
+def test_verify_and_update_rehashes_on_cost_change():
+  old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("simplepassword")
+  is_valid, new_hash = verify_and_update_password("simplepassword", old_hash)
+  assert is_valid
+  assert new_hash is not None and new_hash.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
@@ -0,0 +1,59 @@
+from datetime import timedelta
+import fakeredis
+import pytest
+from core import session_store
+from core.invalidation import AUTH_INVALIDATION_CHANNEL
+
+@pytest.fixture
+async def fake_redis(monkeypatch):
+  client = fakeredis.FakeAsyncRedis(decode_responses=True)
+  monkeypatch.setattr(session_store, "redis_client", client)
+  return client
+
+async def test_start_session_sets_both_tokens_and_publishes(fake_redis):
+  async with fake_redis.pubsub() as pubsub:
+    await pubsub.subscribe(AUTH_INVALIDATION_CHANNEL)
+    await session_store.start_session("test@example.com", "access", "refresh", timedelta(minutes=1), timedelta(days=1))
+
+    assert await fake_redis.get("test@example.com") == "access"
+    assert await fake_redis.get("refresh_token:test@example.com") == "refresh"
+    assert 0 < await fake_redis.ttl("test@example.com") <= 60
+    await pubsub.get_message(timeout=1)
+    message = await pubsub.get_message(timeout=1)
+    assert message["data"] == "test@example.com"
+
+async def test_end_session_only_deletes_matching_tokens(fake_redis):
+  await fake_redis.set("test@example.com", "access")
+  await fake_redis.set("refresh_token:test@example.com", "newer-refresh")
+
+  revoked = await session_store.end_session("test@example.com", "access", "stale-refresh")
+
+  assert revoked == 1
+  assert await fake_redis.get("test@example.com") is None
+  assert await fake_redis.get("refresh_token:test@example.com") == "newer-refresh"
+
+async def test_rotate_access_token_requires_live_refresh_token(fake_redis):
+  await fake_redis.set("refresh_token:test@example.com", "refresh")
+
+  assert not await session_store.rotate_access_token("test@example.com", "other", "access", timedelta(minutes=1))
+  assert await fake_redis.get("test@example.com") is None
+  assert await session_store.rotate_access_token("test@example.com", "refresh", "access", timedelta(minutes=1))
+  assert await fake_redis.get("test@example.com") == "access"
+
+async def test_consume_one_time_token_is_single_use_and_revokes_sessions(fake_redis):
+  key = session_store.reset_password_key("test@example.com")
+  await session_store.store_one_time_token(key, "reset", timedelta(hours=1))
+  await fake_redis.set("test@example.com", "access")
+
+  assert not await session_store.consume_one_time_token(key, "wrong", "test@example.com", revoke_sessions=True)
+  assert await session_store.consume_one_time_token(key, "reset", "test@example.com", revoke_sessions=True)
+  assert not await session_store.consume_one_time_token(key, "reset", "test@example.com", revoke_sessions=True)
+  assert await fake_redis.get("test@example.com") is None
+
+async def test_end_all_sessions_drops_cached_principal(fake_redis):
+  await fake_redis.set("test@example.com", "access")
+  await fake_redis.hset("principal:test@example.com", mapping={"id": 1, "email": "test@example.com", "username": "u"})
+
+  await session_store.end_all_sessions("test@example.com")
+
+  assert not await fake_redis.exists("test@example.com", "principal:test@example.com")
@@ -0,0 +1,69 @@
+import time
+import fakeredis
+import jwt
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+from api import dependencies
+from core.config import settings
+from core.token_cache import VerifiedTokenCache
+
+@pytest.fixture
+def test_settings():
+  settings.SECRET_KEY = "test_secret"
+  settings.ALGORITHM = "HS256"
+  return settings
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+  client = fakeredis.FakeAsyncRedis(decode_responses=True)
+  monkeypatch.setattr(dependencies, "redis_client", client)
+  return client
+
+@pytest.fixture
+def cache(monkeypatch):
+  cache = VerifiedTokenCache(max_size=2, ttl=60)
+  monkeypatch.setattr(dependencies, "token_cache", cache)
+  return cache
+
+def make_request(token):
+  return Request({"type": "http", "headers": [(b"cookie", f"keplerix_token={token}".encode())]})
+
+def make_token(email, lifetime=600):
+  return jwt.encode({"sub": email, "exp": int(time.time()) + lifetime}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+async def test_verify_token_uses_cache_after_first_lookup(test_settings, fake_redis, cache):
+  token = make_token("test@example.com")
+  await fake_redis.set("test@example.com", token)
+
+  assert await dependencies.verify_token(make_request(token)) == "test@example.com"
+  await fake_redis.delete("test@example.com")
+  assert await dependencies.verify_token(make_request(token)) == "test@example.com"
+  assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+async def test_invalidated_token_goes_back_to_redis(test_settings, fake_redis, cache):
+  token = make_token("test@example.com")
+  await fake_redis.set("test@example.com", token)
+  await dependencies.verify_token(make_request(token))
+
+  await fake_redis.delete("test@example.com")
+  cache.invalidate("test@example.com")
+  with pytest.raises(HTTPException) as exc_info:
+    await dependencies.verify_token(make_request(token))
+  assert exc_info.value.status_code == 401
+
+def test_entry_lifetime_capped_by_token_expiry(cache):
+  cache.put("token", "test@example.com", time.time() - 1, cache.generation)
+  assert cache.get("token") is None
+
+def test_put_after_invalidation_is_dropped(cache):
+  generation = cache.generation
+  cache.invalidate("test@example.com")
+  cache.put("token", "test@example.com", time.time() + 60, generation)
+  assert cache.get("token") is None
+
+def test_cache_is_bounded(cache):
+  for index in range(3):
+    cache.put(f"token-{index}", f"user-{index}@example.com", time.time() + 60, cache.generation)
+  assert cache.get("token-0") is None
+  assert cache.get("token-2") == "user-2@example.com"
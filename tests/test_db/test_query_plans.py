@@ -0,0 +1,77 @@
+"""Runs every repository query against SQLite and fails if its plan scans a whole table."""
+from datetime import datetime
+import pytest
+from sqlalchemy import event, insert, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from db.base import Base
+from db.models.project import Project
+from db.models.user import Users
+from domain.projects import repositories as projects
+from domain.users import repositories as users
+
+@pytest.fixture
+async def engine():
+  engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+  async with engine.begin() as conn:
+    await conn.run_sync(Base.metadata.create_all)
+    await conn.execute(insert(Users), [
+      {"id": user_id, "email": f"user{user_id}@example.com", "username": "u", "hashed_password": "x"}
+      for user_id in range(1, 51)
+    ])
+    await conn.execute(insert(Project), [
+      {"user_id": 1 + index % 50, "link": f"link-{index}", "changed_at": datetime(2026, 1, 1), "created_at": datetime(2026, 1, 1)}
+      for index in range(500)
+    ])
+    await conn.execute(text("ANALYZE"))
+  yield engine
+  await engine.dispose()
+
+async def capture(engine, run) -> list[tuple[str, tuple]]:
+  statements = []
+  def record(conn, cursor, statement, parameters, context, executemany):
+    statements.append((statement, parameters))
+  event.listen(engine.sync_engine, "before_cursor_execute", record)
+  try:
+    async with async_sessionmaker(engine)() as session:
+      await run(session)
+      await session.rollback()
+  finally:
+    event.remove(engine.sync_engine, "before_cursor_execute", record)
+  return statements
+
+async def query_plan(engine, statement: str, parameters: tuple) -> list[str]:
+  async with engine.connect() as conn:
+    result = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    return [row.detail for row in result]
+
+def is_table_scan(step: str) -> bool:
+  # "SCAN projects" reads every row; "SCAN ... USING INDEX" and "SCAN 2 CONSTANT ROWS" do not.
+  words = step.split()
+  return words[0] == "SCAN" and words[1] in Base.metadata.tables and "USING" not in words
+
+async def after_first_page(session):
+  _, after = await projects.list_projects_page(session, 1, None, 2)
+  await projects.list_projects_page(session, 1, after, 2)
+
+HOT_QUERIES = {
+  "get_principal_by_email": lambda session: users.get_principal_by_email(session, "user1@example.com"),
+  "adjust_projects_count": lambda session: users.adjust_projects_count(session, 1, 1),
+  "get_project_row": lambda session: projects.get_project_row(session, 1, "link-0"),
+  "list_projects_page": lambda session: projects.list_projects_page(session, 1, None, 20),
+  "list_projects_page_after_cursor": after_first_page,
+  "count_projects_by_user": lambda session: projects.count_projects_by_user(session, [1, 2, 3]),
+  "add_projects": lambda session: projects.add_projects(session, 1, ["new-0", "new-1"]),
+  "delete_all_projects": lambda session: projects.delete_projects_where(session, 1),
+  "delete_project": lambda session: projects.delete_projects_where(session, 1, Project.link == "link-0"),
+  "delete_projects": lambda session: projects.delete_projects_where(session, 1, Project.link.in_(["link-0", "link-50"])),
+}
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+async def test_hot_query_uses_an_index(engine, name):
+  statements = await capture(engine, HOT_QUERIES[name])
+  assert statements
+
+  for statement, parameters in statements:
+    plan = await query_plan(engine, statement, parameters)
+    full_scans = [step for step in plan if is_table_scan(step)]
+    assert not full_scans, f"{name} scans a whole table:\n{statement}\n" + "\n".join(plan)
@@ -0,0 +1,65 @@
+import time
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from core.read_your_writes import READ_YOUR_WRITES_COOKIE, ReadYourWritesMiddleware
+from db import session as db_session
+from db.base import Base
+from db.models.user import Users
+
+@pytest.fixture
+async def databases(tmp_path, monkeypatch):
+  # Two files stand in for a primary and a replica that has not caught up yet.
+  primary = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/primary.db")
+  replica = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+  for engine in (primary, replica):
+    async with engine.begin() as conn:
+      await conn.run_sync(Base.metadata.create_all)
+  monkeypatch.setattr(db_session, "async_session_maker", async_sessionmaker(primary, sync_session_class=db_session.PrimarySession))
+  monkeypatch.setattr(db_session, "replica_session_maker", async_sessionmaker(replica))
+  yield
+  await primary.dispose()
+  await replica.dispose()
+
+@pytest.fixture
+def client(databases):
+  app = FastAPI()
+  app.add_middleware(ReadYourWritesMiddleware)
+
+  @app.post("/users")
+  async def create_user(session=Depends(db_session.get_async_session)):
+    await session.execute(insert(Users).values(email="test@example.com", username="u", hashed_password="x"))
+    await session.commit()
+
+  @app.post("/noop")
+  async def noop(session=Depends(db_session.get_async_session)):
+    await session.execute(select(Users.id))
+    await session.commit()
+
+  @app.get("/users/count")
+  async def count_users(session=Depends(db_session.get_read_session)):
+    return (await session.execute(select(func.count()).select_from(Users))).scalar()
+
+  return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="https://test")
+
+async def test_reads_go_to_replica_by_default(client):
+  async with client:
+    assert (await client.post("/noop")).headers.get("set-cookie") is None
+    assert (await client.get("/users/count")).json() == 0
+
+async def test_reads_stick_to_primary_after_a_write(client):
+  async with client:
+    response = await client.post("/users")
+    assert READ_YOUR_WRITES_COOKIE in response.headers["set-cookie"]
+
+    assert (await client.get("/users/count")).json() == 1
+
+async def test_expired_stickiness_reads_replica(client):
+  async with client:
+    await client.post("/users")
+    # A client that ignores Max-Age still sends the expiry it was given.
+    client.cookies.set(READ_YOUR_WRITES_COOKIE, f"{time.time() - 1:.3f}")
+
+    assert (await client.get("/users/count")).json() == 0
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from db.base import Base
+from db.models.project import Project
+from db.models.user import Users
+from domain.projects.repositories import list_projects_page
+
+@pytest.fixture
+async def session():
+  engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+  start = datetime(2026, 1, 1)
+  async with engine.begin() as conn:
+    await conn.run_sync(Base.metadata.create_all)
+    await conn.execute(insert(Users), [
+      {"id": user_id, "email": f"user{user_id}@example.com", "username": "u", "hashed_password": "x"}
+      for user_id in (1, 2)
+    ])
+    # Several projects share a changed_at so the id tiebreak is exercised.
+    await conn.execute(insert(Project), [
+      {"user_id": 1 + index % 2, "link": f"link-{index}", "changed_at": start + timedelta(seconds=index // 4), "created_at": start}
+      for index in range(40)
+    ])
+  async with async_sessionmaker(engine)() as session:
+    yield session
+  await engine.dispose()
+
+async def test_pages_cover_every_project_once_newest_first(session):
+  links, after = [], None
+  while True:
+    projects, after = await list_projects_page(session, 1, after, 6)
+    links += [project.link for project in projects]
+    if after is None:
+      break
+
+  assert links == [f"link-{index}" for index in range(39, -1, -1) if index % 2 == 0]
+
+async def test_last_page_has_no_cursor(session):
+  projects, after = await list_projects_page(session, 2, None, 20)
+
+  assert len(projects) == 20
+  assert after is None
@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from db.base import Base
+from db.models.project import Project
+from db.models.user import Users
+from domain.projects.repositories import add_project, add_projects, delete_projects_where
+from domain.users.services import repair_projects_count
+
+@pytest.fixture
+async def session_maker():
+  engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+  async with engine.begin() as conn:
+    await conn.run_sync(Base.metadata.create_all)
+    await conn.execute(insert(Users), [
+      {"id": user_id, "email": f"user{user_id}@example.com", "username": "u", "hashed_password": "x"}
+      for user_id in (1, 2, 3)
+    ])
+  yield async_sessionmaker(engine, expire_on_commit=False)
+  await engine.dispose()
+
+async def projects_count(session, user_id):
+  return (await session.get(Users, user_id, populate_existing=True)).projects_count
+
+async def test_counter_follows_inserts_and_deletes(session_maker):
+  async with session_maker() as session:
+    for link in ("a", "b", "c"):
+      await add_project(session, 1, link)
+    await session.commit()
+    assert await projects_count(session, 1) == 3
+
+    assert sorted(await delete_projects_where(session, 1, Project.link.in_(["a", "b", "missing"]))) == ["a", "b"]
+    await session.commit()
+    assert await projects_count(session, 1) == 1
+
+    assert await delete_projects_where(session, 2) == []
+    assert await delete_projects_where(session, 1) == ["c"]
+    await session.commit()
+    assert await projects_count(session, 1) == 0
+
+async def test_batch_insert_returns_rows_and_bumps_counter_once(session_maker):
+  async with session_maker() as session:
+    projects = await add_projects(session, 2, ["x", "y", "z"])
+    await session.commit()
+
+    assert sorted(project.link for project in projects) == ["x", "y", "z"]
+    assert all(project.id and project.created_at for project in projects)
+    assert await projects_count(session, 2) == 3
+
+async def test_repair_fixes_only_drifted_rows(session_maker):
+  async with session_maker() as session:
+    await add_project(session, 1, "a")
+    await add_project(session, 3, "b")
+    await session.commit()
+    await session.execute(update(Users).where(Users.id.in_([1, 2])).values(projects_count=7))
+    await session.commit()
+
+  assert await repair_projects_count(session_maker, batch_size=2) == 2
+
+  async with session_maker() as session:
+    assert [await projects_count(session, user_id) for user_id in (1, 2, 3)] == [1, 0, 1]
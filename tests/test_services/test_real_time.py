@@ -0,0 +1,149 @@
+import asyncio
+import json
+import fakeredis
+import pytest
+from services import real_time
+from services.real_time import CLOSE_INVALID_PAYLOAD, CLOSE_MESSAGE_TOO_BIG, CLOSE_TRY_AGAIN_LATER, Hub
+
+class FakeWebSocket:
+  def __init__(self):
+    self.incoming = asyncio.Queue()
+    self.frames = []
+    self.close_code = None
+
+  async def receive(self):
+    return await self.incoming.get()
+
+  async def send_text(self, text):
+    self.frames.append(json.loads(text))
+
+  async def close(self, code=1000):
+    self.close_code = code
+    self.incoming.put_nowait({"type": "websocket.disconnect", "code": code})
+
+  def say(self, data):
+    self.incoming.put_nowait({"type": "websocket.receive", "text": json.dumps(data)})
+
+  def leave(self):
+    self.incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+
+@pytest.fixture
+async def fake_redis(monkeypatch):
+  client = fakeredis.FakeAsyncRedis(decode_responses=True)
+  monkeypatch.setattr(real_time, "redis_client", client)
+  return client
+
+def make_hub(queue_size=64):
+  return Hub(tick=0.01, queue_size=queue_size, max_members=10, max_message_bytes=1024)
+
+async def settle():
+  for _ in range(5):
+    await asyncio.sleep(0)
+
+async def stop(tasks):
+  # fakeredis reads through asyncio.wait_for, which on 3.11 can swallow a cancellation that
+  # lands together with a message; cancel again until the tasks are really gone.
+  while not all(task.done() for task in tasks):
+    for task in tasks:
+      task.cancel()
+    await asyncio.wait(tasks, timeout=0.1)
+
+async def test_messages_within_a_tick_go_out_as_one_frame_per_member(fake_redis):
+  hub = make_hub()
+  alice, bob = FakeWebSocket(), FakeWebSocket()
+  sessions = [asyncio.create_task(hub.serve("p1", socket)) for socket in (alice, bob)]
+  await settle()
+  alice_id = alice.frames[0]["member"]
+
+  for socket, x in ((alice, 1), (bob, 2), (alice, 3)):
+    socket.say({"op": "move", "x": x})
+    await settle()
+  await hub.flush()
+  await settle()
+
+  for socket in (alice, bob):
+    assert len(socket.frames) == 2
+    messages = socket.frames[1]["messages"]
+    assert [message["data"]["x"] for message in messages] == [1, 2, 3]
+  assert alice.frames[1]["messages"][0]["from"] == alice_id
+  assert hub.stats()["frames_sent"] == 2
+
+  alice.leave()
+  bob.leave()
+  await asyncio.gather(*sessions)
+  assert hub.rooms == {}
+
+async def test_batches_fan_out_to_other_workers_through_redis(fake_redis):
+  first, second = make_hub(), make_hub()
+  listeners = [asyncio.create_task(hub.listen()) for hub in (first, second)]
+  alice, bob = FakeWebSocket(), FakeWebSocket()
+  sessions = [asyncio.create_task(first.serve("p1", alice)), asyncio.create_task(second.serve("p1", bob))]
+  await asyncio.sleep(0.1)
+
+  alice.say({"op": "type", "text": "hi"})
+  await settle()
+  await first.flush()
+  for _ in range(50):
+    await second.flush()
+    if len(bob.frames) > 1:
+      break
+    await asyncio.sleep(0.02)
+  await first.flush()
+  await settle()
+
+  assert [message["data"] for message in bob.frames[1]["messages"]] == [{"op": "type", "text": "hi"}]
+  # The worker that published skips its own batch when Redis echoes it back.
+  assert len(alice.frames) == 2
+  assert first.stats()["batches_published"] == 1
+  assert second.stats()["batches_relayed"] == 1
+
+  alice.leave()
+  bob.leave()
+  await asyncio.gather(*sessions)
+  await stop(listeners)
+
+async def test_slow_member_is_disconnected_without_blocking_the_room(fake_redis):
+  hub = make_hub(queue_size=2)
+  fast, slow = FakeWebSocket(), FakeWebSocket()
+  sessions = [asyncio.create_task(hub.serve("p1", socket)) for socket in (fast, slow)]
+  await settle()
+
+  async def stalled(text):
+    await asyncio.Event().wait()
+
+  slow.send_text = stalled
+  # One frame stuck in the send, two queued, the fourth overflows.
+  for index in range(5):
+    fast.say({"n": index})
+    await settle()
+    await hub.flush()
+    await settle()
+
+  assert slow.close_code == CLOSE_TRY_AGAIN_LATER
+  assert len(fast.frames) == 6
+  assert hub.stats()["slow_members_dropped"] == 1
+  fast.leave()
+  await asyncio.gather(*sessions)
+
+async def test_invalid_json_closes_the_socket(fake_redis):
+  hub = make_hub()
+  socket = FakeWebSocket()
+  session = asyncio.create_task(hub.serve("p1", socket))
+  socket.incoming.put_nowait({"type": "websocket.receive", "text": "{not json"})
+  await session
+
+  assert socket.close_code == CLOSE_INVALID_PAYLOAD
+  assert hub.rooms == {}
+
+async def test_message_size_is_counted_in_bytes(fake_redis):
+  hub = make_hub()
+  socket = FakeWebSocket()
+  session = asyncio.create_task(hub.serve("p1", socket))
+  # 300 characters, but 1200 bytes once encoded: over the hub's 1024-byte limit.
+  text = json.dumps({"note": "\N{GRINNING FACE}" * 300}, ensure_ascii=False)
+  assert len(text) < 1024 < len(text.encode())
+  socket.incoming.put_nowait({"type": "websocket.receive", "text": text})
+  await session
+
+  assert socket.close_code == CLOSE_MESSAGE_TOO_BIG
+  assert hub.rooms == {}
@@ -1,51 +1,95 @@
+import hmac
+import secrets
+from itertools import chain
 import jwt
-from fastapi import HTTPException, Request, status
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.requests import HTTPConnection
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 from core.redis import redis_client
 from core.config import settings
-from db.models.user import Users
-from db.models.project import Project as DBProject
+from core.identity import get_gateway_identity
+from core.principal_cache import FILL_PRINCIPAL_SCRIPT, PRINCIPAL_REDIS_TTL, principal_cache, principal_key, principal_load_key
+from core.token_cache import token_cache
+from db.session import get_async_session
+from domain.users.entities import Principal
+from domain.users.repositories import get_principal_by_email, is_superuser
+
+async def verify_token(request: HTTPConnection) -> str:
+  # HTTPConnection rather than Request, so live WebSocket endpoints authenticate the same way.
+  gateway_email = get_gateway_identity(request)
+  if gateway_email:
+    return gateway_email
 
-async def verify_token(request: Request):
   token_cookie_data = request.cookies.get("keplerix_token")
   if not token_cookie_data:
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token missing in cookies")
-  
+
+  cached_email = token_cache.get(token_cookie_data)
+  if cached_email:
+    return cached_email
+
   try:
-    payload = jwt.decode(token_cookie_data, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-    email = payload.get("sub")
-    if not email:
-      raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token")
-    
-    redis_key = f"{email}"
-    token_redis_data = await redis_client.get(redis_key)
-    if token_cookie_data != token_redis_data:
-      raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token")
-    
-    return email
+    payload = jwt.decode(token_cookie_data, settings.SECRET_KEY, algorithms=[settings.ALGORITHM], options={"require": ["exp", "sub"]})
   except jwt.PyJWTError:
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token")
 
-async def get_user_by_email(session: AsyncSession, email: str):
-  result = await session.execute(select(Users).where(Users.email == email))
-  user = result.scalars().first()
-  if not user:
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-  return user
+  email = payload["sub"]
+  generation = token_cache.generation
+  token_redis_data = await redis_client.get(email)
+  if token_cookie_data != token_redis_data:
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid access token")
+
+  token_cache.put(token_cookie_data, email, payload["exp"], generation)
+  return email
 
-async def get_projects_by_user(session: AsyncSession, user_id: int):
-  result = await session.execute(select(DBProject).where(DBProject.user_id == user_id))
-  return result.scalars().all()
+async def get_principal(email: str = Depends(verify_token), session: AsyncSession = Depends(get_async_session)) -> Principal:
+  principal = principal_cache.get(email)
+  if principal is not None:
+    return principal
 
-def format_project_response(project, user):
+  generation = principal_cache.generation
+  key = principal_key(email)
+  fields = await redis_client.hgetall(key)
+  if fields:
+    principal = Principal(**fields)
+  else:
+    # Claim the load first: an update that lands while we read the database deletes the
+    # claim, and the fill below is then skipped rather than caching what we read for everyone.
+    nonce = secrets.token_hex(8)
+    await redis_client.set(principal_load_key(email), nonce, ex=PRINCIPAL_REDIS_TTL)
+    principal = await get_principal_by_email(session, email)
+    if principal is None:
+      raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    await FILL_PRINCIPAL_SCRIPT(
+      keys=[key, principal_load_key(email)],
+      args=[nonce, int(PRINCIPAL_REDIS_TTL.total_seconds()), *chain.from_iterable(principal.model_dump().items())],
+      client=redis_client,
+    )
+
+  principal_cache.put(principal, generation)
+  return principal
+
+def project_owner(user: Principal) -> dict:
+  return {"id": user.id, "email": user.email, "username": user.username}
+
+def format_project_response(project, owner: dict) -> dict:
+  # Datetimes are left to the ORJSONResponse encoder; `owner` is shared by every row of a response.
   return {
     "link": project.link,
-    "owner": {
-      "id": user.id,
-      "email": user.email,
-      "username": user.username
-    },
-    "changed_at": project.changed_at.isoformat(),
-    "created_at": project.created_at.isoformat(),
-  }
\ No newline at end of file
+    "owner": owner,
+    "changed_at": project.changed_at,
+    "created_at": project.created_at,
+  }
+
+async def require_superuser(email: str = Depends(verify_token), session: AsyncSession = Depends(get_async_session)) -> str:
+  if not await is_superuser(session, email):
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Superuser privileges required")
+  return email
+
+def require_ops_token(request: Request):
+  """Guards service-wide endpoints such as /metrics behind OPS_TOKEN."""
+  if not settings.OPS_TOKEN:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+  scheme, _, token = request.headers.get("authorization", "").partition(" ")
+  if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.OPS_TOKEN.encode()):
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid operations token", headers={"WWW-Authenticate": "Bearer"})
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends
+from api.dependencies import require_superuser
+from core.profiler_control import publish_profiler_config
+from core.profiling import ProfilerConfig, profiler
+from services.real_time import hub
+
+router = APIRouter()
+
+@router.get('/profiler', tags=['Admin'])
+async def get_profiler(email: str = Depends(require_superuser)):
+  return profiler.state()
+
+@router.patch('/profiler', tags=['Admin'])
+async def update_profiler(config: ProfilerConfig, email: str = Depends(require_superuser)):
+  await publish_profiler_config(config)
+  return profiler.state()
+
+# Counters of the worker that happens to answer; every worker keeps its own rooms.
+@router.get('/realtime', tags=['Admin'])
+async def get_realtime_stats(email: str = Depends(require_superuser)):
+  return hub.stats()
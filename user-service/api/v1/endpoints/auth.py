@@ -1,14 +1,10 @@
-import json
-import jwt
-from datetime import timedelta
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from core.auth import create_access_token, create_refresh_token, verify_access_token
+from core.auth import ACCESS_TOKEN_TTL, REFRESH_TOKEN_TTL, encode_token, generate_reset_password_token, generate_verify_request_token, token_subject
 from core.email import send_reset_password_email, send_verify_request_email
-from core.security import hash_password, verify_password
-from core.redis import redis_client
-from core.config import settings
+from core.security import password_hasher
+from core.session_store import consume_one_time_token, end_session, reset_password_key, rotate_access_token, start_session, verify_request_key
 from db.models.user import Users
 from db.session import get_async_session
 from domain.users.entities import ForgotPasswordAndVerifyAccRequest, ResetPasswordRequest, UserCreate, UserLogin, UserLogout, VerifyAccRequest
@@ -17,7 +13,7 @@ router = APIRouter()
 
 @router.post("/register", tags=['Auth'])
 async def register(user: UserCreate, session: AsyncSession = Depends(get_async_session)):
-  hashed_password = hash_password(user.password)
+  hashed_password = await password_hasher.hash(user.password)
   new_user = Users(username=user.username, email=user.email, hashed_password=hashed_password)
   session.add(new_user)
   await session.commit()
@@ -28,11 +24,22 @@ async def login(user: UserLogin, response: Response, session: AsyncSession = Dep
   result = await session.execute(select(Users).where(Users.email == user.email))
   db_user = result.scalars().first()
   
-  if db_user is None or not verify_password(user.password, db_user.hashed_password):
+  if db_user is None:
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+
+  # Hand the connection back to the pool instead of holding it for the length of a bcrypt round.
+  await session.commit()
+  is_valid, new_hash = await password_hasher.verify_and_update(user.password, db_user.hashed_password)
+  if not is_valid:
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+
+  if new_hash:
+    db_user.hashed_password = new_hash
+    await session.commit()
   
-  access_token = await create_access_token(db_user.email, data={"sub": db_user.email})
-  refresh_token = await create_refresh_token(db_user.email)
+  access_token = encode_token({"sub": db_user.email}, ACCESS_TOKEN_TTL)
+  refresh_token = encode_token({"sub": db_user.email}, REFRESH_TOKEN_TTL)
+  await start_session(db_user.email, access_token, refresh_token, ACCESS_TOKEN_TTL, REFRESH_TOKEN_TTL)
   response.set_cookie(key="keplerix_token", value=access_token, httponly=True, secure=True, samesite="lax")
   response.set_cookie(key="keplerix_refresh_token", value=refresh_token, httponly=True, secure=True, samesite="lax")
   
@@ -43,17 +50,8 @@ async def logout(request: Request, response: Response, user: UserLogout):
   token_cookie_data = request.cookies.get("keplerix_token")
   refresh_cookie_data = request.cookies.get("keplerix_refresh_token")
   
-  if token_cookie_data:
-    redis_key = f"{user.email}"
-    token_redis_data = await redis_client.get(redis_key)
-    if token_redis_data and token_redis_data == token_cookie_data:
-      await redis_client.delete(redis_key)
-  
-  if refresh_cookie_data:
-    redis_key = f"refresh_token:{user.email}"
-    redis_token_data = await redis_client.get(redis_key)
-    if redis_token_data and redis_token_data == refresh_cookie_data:
-      await redis_client.delete(redis_key)
+  if token_cookie_data or refresh_cookie_data:
+    await end_session(user.email, token_cookie_data, refresh_cookie_data)
   
   response.delete_cookie(key="keplerix_token")
   response.delete_cookie(key="keplerix_refresh_token")
@@ -67,24 +65,18 @@ async def refresh_tokens(request: Request, response: Response):
   if not refresh_token:
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token missing")
   
-  try:
-    payload = jwt.decode(refresh_token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-    email = payload.get("sub")
-    
-    if not email:
-      raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
-    
-    redis_token = await redis_client.get(f"refresh_token:{email}")
-    if redis_token != refresh_token:
-      raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
-    
-    new_access_token = await create_access_token(email, data={"sub": email})
-    response.set_cookie(key="keplerix_token", value=new_access_token, httponly=True, secure=True, samesite="lax")
-    
-    return {"message": "Tokens refreshed"}
-  except jwt.PyJWTError:
+  email = token_subject(refresh_token)
+  if not email:
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
   
+  new_access_token = encode_token({"sub": email}, ACCESS_TOKEN_TTL)
+  if not await rotate_access_token(email, refresh_token, new_access_token, ACCESS_TOKEN_TTL):
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+  
+  response.set_cookie(key="keplerix_token", value=new_access_token, httponly=True, secure=True, samesite="lax")
+  
+  return {"message": "Tokens refreshed"}
+  
 @router.post('/forgot-password', tags=["Auth"])
 async def forgot_password(user_data: ForgotPasswordAndVerifyAccRequest, background_tasks: BackgroundTasks, session: AsyncSession = Depends(get_async_session)):
   result = await session.execute(select(Users).where(Users.email == user_data.email))
@@ -93,40 +85,33 @@ async def forgot_password(user_data: ForgotPasswordAndVerifyAccRequest, backgrou
   if db_user is None:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
   
-  reset_token = await create_access_token(db_user.email, data={"sub": db_user.email}, expires_delta=timedelta(hours=1))
-  await redis_client.set(f"reset_password:{db_user.email}", json.dumps({"token": reset_token}), ex=3600)
+  reset_token = await generate_reset_password_token(db_user.email)
   background_tasks.add_task(send_reset_password_email, user_data.email, reset_token)
   
   return {"message": "Password reset token has been sent to your email."}
   
 @router.post("/reset-password", tags=["Auth"])
 async def reset_password(request: ResetPasswordRequest, session: AsyncSession = Depends(get_async_session)):
-  redis_key = f"reset_password:{request.email}"
-  stored_token_json = await redis_client.get(redis_key)
-
-  if not stored_token_json:
-    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or expired token")
-
-  stored_token_data = json.loads(stored_token_json)
-  stored_token = stored_token_data.get("token")
-
-  if not stored_token or stored_token != request.token:
+  if token_subject(request.token) != request.email:
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or expired token")
 
-  token_payload = await verify_access_token(request.email)
-
-  if "sub" not in token_payload or token_payload["sub"] != request.email:
-    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid token structure")
-
   result = await session.execute(select(Users).where(Users.email == request.email))
   db_user = result.scalars().first()
 
   if not db_user:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-  db_user.hashed_password = hash_password(request.new_password)
+  # Hash before touching the token: a busy hasher answers 503 with Retry-After, and the
+  # retry must find the token still there and the user's sessions untouched.
+  await session.commit()
+  hashed_password = await password_hasher.hash(request.new_password)
+
+  # Consumes the reset token and signs the account out everywhere in one round trip.
+  if not await consume_one_time_token(reset_password_key(request.email), request.token, request.email, revoke_sessions=True):
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or expired token")
+
+  db_user.hashed_password = hashed_password
   await session.commit()
-  await redis_client.delete(redis_key)
 
   return {"message": "Password has been reset successfully."}
   
@@ -138,31 +123,19 @@ async def verify_request(user_data: ForgotPasswordAndVerifyAccRequest, backgroun
   if db_user is None:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
   
-  reset_token = await create_access_token(db_user.email, data={"sub": db_user.email}, expires_delta=timedelta(hours=1))
-  await redis_client.set(f"verify_request:{db_user.email}", json.dumps({"token": reset_token}), ex=3600)
-  background_tasks.add_task(send_verify_request_email, user_data.email, reset_token)
+  verify_token = await generate_verify_request_token(db_user.email)
+  background_tasks.add_task(send_verify_request_email, user_data.email, verify_token)
   
   return {"message": "Password reset token has been sent to your email."}
 
 @router.post('/verify_account', tags=["Auth"])
 async def verify_account(request: VerifyAccRequest, session: AsyncSession = Depends(get_async_session)):
-  redis_key = f"verify_request:{request.email}"
-  stored_token_json = await redis_client.get(redis_key)
-
-  if not stored_token_json:
+  if token_subject(request.token) != request.email:
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or expired token")
 
-  stored_token_data = json.loads(stored_token_json)
-  stored_token = stored_token_data.get("token")
-
-  if not stored_token or stored_token != request.token:
+  if not await consume_one_time_token(verify_request_key(request.email), request.token, request.email):
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or expired token")
 
-  token_payload = jwt.decode(request.token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-  
-  if "sub" not in token_payload or token_payload["sub"] != request.email:
-    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid token structure")
-
   result = await session.execute(select(Users).where(Users.email == request.email))
   user = result.scalars().first()
 
@@ -174,6 +147,5 @@ async def verify_account(request: VerifyAccRequest, session: AsyncSession = Depe
 
   user.is_verified = True
   await session.commit()
-  await redis_client.delete(redis_key)
 
   return {"message": "Account successfully verified"}
\ No newline at end of file
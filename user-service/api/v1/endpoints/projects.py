@@ -1,94 +1,133 @@
+from datetime import datetime
 from uuid import uuid4
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from api.dependencies import format_project_response, get_projects_by_user, get_user_by_email, verify_token
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from api.dependencies import format_project_response, get_principal, project_owner, verify_token
+from core.config import settings
+from core.pagination import decode_cursor, encode_cursor
 from db.models.project import Project as DBProject
-from db.session import get_async_session
-from domain.projects.entities import ProjectResponse, ProjectsDelete
+from db.session import async_session_maker, get_async_session, get_read_session, read_session_maker
+from domain.projects.entities import ProjectResponse, ProjectsBatchCreate, ProjectsDelete, ProjectsDeleted
+from domain.projects.repositories import add_project, add_projects, delete_projects_where, get_project_row, list_projects_page, projects_page_query
+from domain.users.entities import Principal
+from services.real_time import hub
 
 router = APIRouter()
 
-@router.get('/project', response_model=ProjectResponse, tags=['Projects'])
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+STREAM_BATCH_SIZE = 500
+
+# Read endpoints return ORJSONResponse directly: the rows are built here from trusted
+# columns, so re-validating them through response_model would only add allocations.
+# response_model stays on the routes for the OpenAPI schema.
+
+@router.get('/project', response_model=ProjectResponse, response_class=ORJSONResponse, tags=['Projects'])
 async def get_project(
   project_link: str, 
-  request: Request, 
-  session: AsyncSession = Depends(get_async_session)
+  user: Principal = Depends(get_principal), 
+  session: AsyncSession = Depends(get_read_session)
 ):
-  email = await verify_token(request)
-  user = await get_user_by_email(session, email)
-  result = await session.execute(select(DBProject).where(DBProject.link == project_link, DBProject.user_id == user.id))
-  project = result.scalars().first()
+  project = await get_project_row(session, user.id, project_link)
   
   if not project:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
   
-  return format_project_response(project, user)
+  return ORJSONResponse(format_project_response(project, project_owner(user)))
 
-@router.get('/projects', response_model=list[ProjectResponse], tags=['Projects'])
-async def get_projects(request: Request, session: AsyncSession = Depends(get_async_session)):
-  email = await verify_token(request)
-  user = await get_user_by_email(session, email)
-  projects = await get_projects_by_user(session, user.id)
-  
-  return [format_project_response(project, user) for project in projects]
+@router.get('/projects', response_model=list[ProjectResponse], response_class=ORJSONResponse, tags=['Projects'])
+async def get_projects(
+  request: Request,
+  cursor: str | None = None,
+  limit: int | None = Query(None, ge=1, le=settings.PROJECTS_MAX_PAGE_SIZE),
+  stream: bool = False,
+  user: Principal = Depends(get_principal),
+  session: AsyncSession = Depends(get_read_session)
+):
+  after = decode_cursor(cursor) if cursor else None
 
-@router.post('/add_project', response_model=ProjectResponse, tags=['Projects'])
-async def create_project(request: Request, session: AsyncSession = Depends(get_async_session)):
-  email = await verify_token(request)
-  user = await get_user_by_email(session, email)
-  
-  new_project = DBProject(user_id=user.id, link=str(uuid4()))
-  session.add(new_project)
+  if stream:
+    return StreamingResponse(stream_projects(read_session_maker(request), user, after, limit), media_type="application/x-ndjson")
+
+  projects, last_key = await list_projects_page(session, user.id, after, limit or settings.PROJECTS_PAGE_SIZE)
+  owner = project_owner(user)
+  response = ORJSONResponse([format_project_response(project, owner) for project in projects])
+  if last_key is not None:
+    response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*last_key)
+
+  return response
+
+async def stream_projects(session_maker: async_sessionmaker, user: Principal, after: tuple[datetime, int] | None, limit: int | None):
+  # The request's session is closed before the body is sent, so the stream opens its own.
+  async with session_maker() as session:
+    query = projects_page_query(user.id, after, limit).execution_options(yield_per=STREAM_BATCH_SIZE)
+    result = await session.stream(query)
+    owner = project_owner(user)
+    async for project in result:
+      yield orjson.dumps(format_project_response(project, owner), option=orjson.OPT_APPEND_NEWLINE)
+
+@router.post('/add_project', response_model=ProjectResponse, response_class=ORJSONResponse, tags=['Projects'])
+async def create_project(user: Principal = Depends(get_principal), session: AsyncSession = Depends(get_async_session)):
+  new_project = await add_project(session, user.id, str(uuid4()))
   await session.commit()
-  await session.refresh(new_project)
   
-  return format_project_response(new_project, user)
+  return ORJSONResponse(format_project_response(new_project, project_owner(user)))
 
-@router.delete('/delete_all_projects', tags=['Projects'])
-async def delete_all_projects(request: Request, session: AsyncSession = Depends(get_async_session)):
-  email = await verify_token(request)
-  user = await get_user_by_email(session, email)
-  projects = await get_projects_by_user(session, user.id)
-  
-  if not projects:
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No projects found for the user")
-  
-  for project in projects:
-    await session.delete(project)
+@router.post('/add_projects', response_model=list[ProjectResponse], response_class=ORJSONResponse, tags=['Projects'])
+async def create_projects(batch: ProjectsBatchCreate, user: Principal = Depends(get_principal), session: AsyncSession = Depends(get_async_session)):
+  new_projects = await add_projects(session, user.id, [str(uuid4()) for _ in range(batch.count)])
   await session.commit()
 
-  return {"message": "All projects deleted successfully"}
+  owner = project_owner(user)
+  return ORJSONResponse([format_project_response(project, owner) for project in new_projects])
 
-@router.delete('/delete_project/{project_link}', tags=['Projects'])
-async def delete_project(project_link: str, request: Request, session: AsyncSession = Depends(get_async_session)):
-  email = await verify_token(request)
-  user = await get_user_by_email(session, email)
-  
-  result = await session.execute(select(DBProject).where(DBProject.link == project_link, DBProject.user_id == user.id))
-  project = result.scalars().first()
+@router.delete('/delete_all_projects', response_model=ProjectsDeleted, tags=['Projects'])
+async def delete_all_projects(user: Principal = Depends(get_principal), session: AsyncSession = Depends(get_async_session)):
+  deleted = await delete_projects_where(session, user.id)
+  if not deleted:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No projects found for the user")
+  await session.commit()
 
-  if not project:
-    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found or not owned by user")
+  return {"message": "All projects deleted successfully", "deleted": deleted}
 
-  await session.delete(project)
+@router.delete('/delete_project/{project_link}', response_model=ProjectsDeleted, tags=['Projects'])
+async def delete_project(project_link: str, user: Principal = Depends(get_principal), session: AsyncSession = Depends(get_async_session)):
+  deleted = await delete_projects_where(session, user.id, DBProject.link == project_link)
+  if not deleted:
+    raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found or not owned by user")
   await session.commit()
 
-  return {"message": "Project deleted successfully"}
+  return {"message": "Project deleted successfully", "deleted": deleted}
 
-@router.delete('/delete_projects', tags=['Projects'])
-async def delete_projects(project_links: ProjectsDelete, request: Request, session: AsyncSession = Depends(get_async_session)):
-  email = await verify_token(request)
-  user = await get_user_by_email(session, email)
-  
-  result = await session.execute(select(DBProject).where(DBProject.link.in_(project_links.links), DBProject.user_id == user.id))
-  projects = result.scalars().all()
-
-  if not projects:
+@router.delete('/delete_projects', response_model=ProjectsDeleted, tags=['Projects'])
+async def delete_projects(project_links: ProjectsDelete, user: Principal = Depends(get_principal), session: AsyncSession = Depends(get_async_session)):
+  deleted = await delete_projects_where(session, user.id, DBProject.link.in_(project_links.links))
+  if not deleted:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No projects found to delete or not owned by user")
-
-  for project in projects:
-    await session.delete(project)
   await session.commit()
 
-  return {"message": "Selected projects deleted successfully"}
\ No newline at end of file
+  return {"message": "Selected projects deleted successfully", "deleted": deleted}
+
+@router.websocket('/live')
+async def project_live(websocket: WebSocket, project_link: str):
+  """Joins the project's live room; the message protocol is described in services.real_time."""
+  origin = websocket.headers.get("origin")
+  if origin is not None and origin not in settings.REALTIME_ALLOWED_ORIGINS:
+    await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+    return
+
+  try:
+    # A session of its own, closed before the socket is served: a room can stay open for
+    # hours and must not hold a pooled connection all that time.
+    async with async_session_maker() as session:
+      user = await get_principal(await verify_token(websocket), session)
+      project = await get_project_row(session, user.id, project_link)
+  except HTTPException:
+    project = None
+  if project is None:
+    await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+    return
+
+  await websocket.accept()
+  await hub.serve(project_link, websocket)
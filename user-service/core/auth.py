@@ -3,22 +3,27 @@ from datetime import datetime, timedelta, timezone
 from typing import Dict
 from core.config import settings
 from core.redis import redis_client
+from core.session_store import reset_password_key, store_one_time_token, verify_request_key
 
-async def create_access_token(email: str, data: Dict[str, str], expires_delta: timedelta = timedelta(minutes=60)) -> str:
+ACCESS_TOKEN_TTL = timedelta(minutes=60)
+REFRESH_TOKEN_TTL = timedelta(days=90)
+ONE_TIME_TOKEN_TTL = timedelta(hours=1)
+
+def encode_token(data: Dict[str, str], expires_delta: timedelta) -> str:
   to_encode = data.copy()
   expire = datetime.now(timezone.utc) + expires_delta
   to_encode.update({"exp": expire})
-  encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+  return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+async def create_access_token(email: str, data: Dict[str, str], expires_delta: timedelta = ACCESS_TOKEN_TTL) -> str:
+  encoded_jwt = encode_token(data, expires_delta)
 
   await redis_client.set(email, encoded_jwt, ex=expires_delta)
   
   return encoded_jwt
 
-async def create_refresh_token(email: str, expires_delta: timedelta = timedelta(days=90)) -> str:
-  to_encode = {"sub": email}
-  expire = datetime.now(timezone.utc) + expires_delta
-  to_encode.update({"exp": expire})
-  encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+async def create_refresh_token(email: str, expires_delta: timedelta = REFRESH_TOKEN_TTL) -> str:
+  encoded_jwt = encode_token({"sub": email}, expires_delta)
   
   await redis_client.set(f"refresh_token:{email}", encoded_jwt, ex=expires_delta)
   
@@ -35,9 +40,20 @@ async def verify_access_token(email: str) -> Dict[str, str]:
   return {}
 
 async def generate_reset_password_token(email: str) -> str:
-  reset_token_data = {"sub": email}
-  reset_token = create_access_token(email, data=reset_token_data, expires_delta=timedelta(hours=1))
-  redis_key = f"reset_password:{email}"
-  await redis_client.set(redis_key, reset_token, ex=3600)
+  reset_token = encode_token({"sub": email}, ONE_TIME_TOKEN_TTL)
+  await store_one_time_token(reset_password_key(email), reset_token, ONE_TIME_TOKEN_TTL)
+
+  return reset_token
+
+async def generate_verify_request_token(email: str) -> str:
+  verify_token = encode_token({"sub": email}, ONE_TIME_TOKEN_TTL)
+  await store_one_time_token(verify_request_key(email), verify_token, ONE_TIME_TOKEN_TTL)
+
+  return verify_token
 
-  return reset_token
\ No newline at end of file
+def token_subject(token: str) -> str | None:
+  try:
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM], options={"require": ["exp", "sub"]})
+  except jwt.PyJWTError:
+    return None
+  return payload["sub"]
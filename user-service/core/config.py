@@ -8,9 +8,59 @@ class Settings(BaseSettings):
   APP_NAME: str = os.getenv("APP_NAME", "Keplerix")
   DATABASE_URL: str = os.getenv("DATABASE_URL")
   DATABASE_URL_ASYNC: str = os.getenv("DATABASE_URL_ASYNC")
+  # Optional async URL of a streaming replica; read-only endpoints are routed to it.
+  DATABASE_URL_REPLICA: str | None = os.getenv("DATABASE_URL_REPLICA")
   SECRET_KEY: str = os.getenv("SECRET_KEY")
   ALGORITHM: str = os.getenv("ALGORITHM")
   REDIS_URL: str = os.getenv("REDIS_URL")
+  # Bearer token Prometheus sends for /metrics; the endpoint answers 404 while it is unset.
+  OPS_TOKEN: str = os.getenv("OPS_TOKEN", "")
+
+  DB_POOL_SIZE: int = 10
+  DB_MAX_OVERFLOW: int = 20
+  DB_POOL_TIMEOUT: float = 30.0
+  DB_POOL_RECYCLE: int = 1800
+  DB_POOL_PRE_PING: bool = True
+  # asyncpg prepared statement caches; set to 0 behind pgbouncer in transaction mode.
+  DB_STATEMENT_CACHE_SIZE: int = 100
+  # How long after a committed write a client keeps reading from the primary.
+  READ_YOUR_WRITES_SECONDS: int = 5
+
+  PROFILER_ENABLED: bool = False
+  PROFILER_SAMPLE_RATE: float = 0.01
+  PROFILER_SLOW_REQUEST_SECONDS: float = 1.0
+  PROFILER_INTERVAL: float = 0.005
+  PROFILER_OUTPUT_DIR: str = "/tmp/keplerix-profiles"
+  PROFILER_MAX_FILES: int = 200
+
+  REDIS_MAX_CONNECTIONS: int = 50
+  REDIS_POOL_TIMEOUT: float = 5.0
+  REDIS_SOCKET_TIMEOUT: float = 5.0
+  REDIS_CONNECT_TIMEOUT: float = 2.0
+  REDIS_HEALTH_CHECK_INTERVAL: int = 30
+
+  TOKEN_CACHE_SIZE: int = 10000
+  TOKEN_CACHE_TTL: float = 300.0
+
+  PRINCIPAL_CACHE_SIZE: int = 10000
+  PRINCIPAL_CACHE_TTL: float = 60.0
+  PRINCIPAL_REDIS_TTL: int = 3600
+
+  PROJECTS_PAGE_SIZE: int = 100
+  PROJECTS_MAX_PAGE_SIZE: int = 1000
+
+  # Live project rooms: how long messages are batched before a frame goes out, and how
+  # many frames a client may fall behind before it is disconnected.
+  REALTIME_TICK_SECONDS: float = 0.025
+  REALTIME_MEMBER_QUEUE_SIZE: int = 64
+  REALTIME_MAX_ROOM_MEMBERS: int = 200
+  REALTIME_MAX_MESSAGE_BYTES: int = 64 * 1024
+  # Browsers send cookies on cross-site WebSocket handshakes and CORS does not apply to them.
+  REALTIME_ALLOWED_ORIGINS: list[str] = ["http://localhost:3000"]
+
+  BCRYPT_ROUNDS: int = 12
+  PASSWORD_HASH_WORKERS: int = 4
+  PASSWORD_HASH_MAX_QUEUE: int = 64
 
   class Config:
     env_file = ".env"
@@ -0,0 +1,26 @@
+import hashlib
+import hmac
+import time
+from fastapi.requests import HTTPConnection
+from core.config import settings
+
+IDENTITY_HEADER = "x-keplerix-user"
+IDENTITY_EXPIRES_HEADER = "x-keplerix-user-expires"
+IDENTITY_SIGNATURE_HEADER = "x-keplerix-user-signature"
+
+def sign_identity(email: str, expires_at: int) -> str:
+  message = f"{email}\n{expires_at}".encode()
+  key = hashlib.sha256(b"keplerix-identity:" + settings.SECRET_KEY.encode()).digest()
+  return hmac.new(key, message, hashlib.sha256).hexdigest()
+
+def get_gateway_identity(request: HTTPConnection) -> str | None:
+  email = request.headers.get(IDENTITY_HEADER)
+  expires_at = request.headers.get(IDENTITY_EXPIRES_HEADER)
+  signature = request.headers.get(IDENTITY_SIGNATURE_HEADER)
+  if not email or not expires_at or not signature or not expires_at.isdigit():
+    return None
+  if int(expires_at) <= time.time():
+    return None
+  if not hmac.compare_digest(signature, sign_identity(email, int(expires_at))):
+    return None
+  return email
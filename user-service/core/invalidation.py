@@ -0,0 +1,41 @@
+import asyncio
+import redis
+from core.principal_cache import principal_cache, principal_keys
+from core.redis import redis_client
+from core.token_cache import token_cache
+
+AUTH_INVALIDATION_CHANNEL = "keplerix:auth-invalidate"
+
+async def publish_auth_invalidation(email: str):
+  drop_cached_identity(email)
+  async with redis_client.pipeline(transaction=True) as pipe:
+    pipe.delete(*principal_keys(email))
+    pipe.publish(AUTH_INVALIDATION_CHANNEL, email)
+    await pipe.execute()
+
+def drop_cached_identity(email: str):
+  token_cache.invalidate(email)
+  principal_cache.invalidate(email)
+
+def drop_all_cached_identities():
+  token_cache.clear()
+  principal_cache.clear()
+
+async def listen_for_auth_invalidations():
+  while True:
+    try:
+      async with redis_client.pubsub() as pubsub:
+        await pubsub.subscribe(AUTH_INVALIDATION_CHANNEL)
+        while True:
+          # Poll with a timeout rather than listen(): a blocking read would trip the client's socket_timeout.
+          message = await pubsub.get_message(timeout=1.0)
+          if message is None:
+            continue
+          if message["type"] == "subscribe":
+            # Anything published while we were not subscribed is lost, so start from scratch.
+            drop_all_cached_identities()
+          elif message["type"] == "message":
+            drop_cached_identity(message["data"])
+    except redis.RedisError:
+      drop_all_cached_identities()
+      await asyncio.sleep(1)
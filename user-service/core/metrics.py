@@ -0,0 +1,146 @@
+import os
+import time
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from core.profiling import record_span
+
+# Bucket edges in seconds; the low end resolves cache hits and single-row queries.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+  "http_request_duration_seconds", "Time to serve an HTTP request, body included.",
+  ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+DB_STATEMENT_LATENCY = Histogram(
+  "db_statement_duration_seconds", "Time spent executing a SQL statement.",
+  ["engine", "operation"], buckets=LATENCY_BUCKETS,
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+  "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled database connection.",
+  ["engine"], buckets=LATENCY_BUCKETS,
+)
+DB_POOL_CHECKED_OUT = Gauge(
+  "db_pool_checked_out_connections", "Database connections currently checked out.",
+  ["engine"], multiprocess_mode="livesum",
+)
+REDIS_COMMAND_LATENCY = Histogram(
+  "redis_command_duration_seconds", "Round trip time of a Redis command or pipeline.",
+  ["command"], buckets=LATENCY_BUCKETS,
+)
+
+# Resolving label children takes a lock and a tuple hash; the hot paths look them up here instead.
+_children: dict[tuple, object] = {}
+
+def child(metric, *labels):
+  key = (metric, labels)
+  found = _children.get(key)
+  if found is None:
+    found = _children[key] = metric.labels(*labels)
+  return found
+
+class MetricsMiddleware:
+  """Records REQUEST_LATENCY labelled by route template, so path parameters do not add series."""
+
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+
+    status_code = 500
+    started = time.perf_counter()
+
+    async def send_with_status(message):
+      nonlocal status_code
+      if message["type"] == "http.response.start":
+        status_code = message["status"]
+      await send(message)
+
+    try:
+      await self.app(scope, receive, send_with_status)
+    finally:
+      route = scope.get("route")
+      route_path = route.path if route is not None else "unmatched"
+      child(REQUEST_LATENCY, scope["method"], route_path, str(status_code)).observe(time.perf_counter() - started)
+
+def instrument_engine(engine: AsyncEngine, name: str):
+  sync_engine = engine.sync_engine
+
+  @event.listens_for(sync_engine, "before_cursor_execute")
+  def start_timer(conn, cursor, statement, parameters, context, executemany):
+    context.metrics_started = time.perf_counter()
+
+  @event.listens_for(sync_engine, "after_cursor_execute")
+  def stop_timer(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.metrics_started
+    child(DB_STATEMENT_LATENCY, name, statement.lstrip().split(None, 1)[0].upper()).observe(elapsed)
+    record_span("db", elapsed)
+
+  # The pool has no "before checkout" event, so time the call the engine makes to it.
+  pool = sync_engine.pool
+  connect = pool.connect
+
+  def timed_connect():
+    started = time.perf_counter()
+    try:
+      return connect()
+    finally:
+      child(DB_POOL_CHECKOUT_WAIT, name).observe(time.perf_counter() - started)
+
+  pool.connect = timed_connect
+  # Counted from pool events rather than a set_function callback, which multiprocess mode ignores.
+  checked_out = child(DB_POOL_CHECKED_OUT, name)
+
+  @event.listens_for(pool, "checkout")
+  def count_checkout(dbapi_connection, connection_record, connection_proxy):
+    checked_out.inc()
+
+  @event.listens_for(pool, "checkin")
+  def count_checkin(dbapi_connection, connection_record):
+    checked_out.dec()
+
+def instrument_redis(client):
+  execute_command = client.execute_command
+  pipeline = client.pipeline
+
+  async def timed_execute_command(*args, **options):
+    started = time.perf_counter()
+    try:
+      return await execute_command(*args, **options)
+    finally:
+      elapsed = time.perf_counter() - started
+      child(REDIS_COMMAND_LATENCY, str(args[0]).upper()).observe(elapsed)
+      record_span("redis", elapsed)
+
+  def timed_pipeline(*args, **kwargs):
+    pipe = pipeline(*args, **kwargs)
+    execute = pipe.execute
+
+    async def timed_execute(*execute_args, **execute_kwargs):
+      started = time.perf_counter()
+      try:
+        return await execute(*execute_args, **execute_kwargs)
+      finally:
+        elapsed = time.perf_counter() - started
+        child(REDIS_COMMAND_LATENCY, "PIPELINE").observe(elapsed)
+        record_span("redis", elapsed)
+
+    pipe.execute = timed_execute
+    return pipe
+
+  client.execute_command = timed_execute_command
+  client.pipeline = timed_pipeline
+  return client
+
+def metrics_response() -> Response:
+  registry = REGISTRY
+  if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+    # Several uvicorn workers: merge the per-process files instead of reporting one worker.
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+  return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
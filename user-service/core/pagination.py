@@ -0,0 +1,22 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException, status
+
+# Keyset cursors are opaque to clients: the sort key of the last row they have seen.
+# Row ids are INTEGER columns; anything wider would fail in the driver rather than here.
+MAX_ROW_ID = 2**31 - 1
+
+def encode_cursor(changed_at: datetime, row_id: int) -> str:
+  raw = json.dumps([changed_at.isoformat(), row_id], separators=(",", ":")).encode()
+  return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+  try:
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+    changed_at, row_id = json.loads(raw)
+    if not isinstance(row_id, int) or isinstance(row_id, bool) or not -MAX_ROW_ID - 1 <= row_id <= MAX_ROW_ID:
+      raise ValueError(f"Row id out of range: {row_id!r}")
+    return datetime.fromisoformat(changed_at), row_id
+  except (ValueError, TypeError, OverflowError):
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
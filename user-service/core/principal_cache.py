@@ -0,0 +1,77 @@
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from core.config import settings
+from core.redis import redis_client
+from domain.users.entities import Principal
+
+def principal_key(email: str) -> str:
+  return f"principal:{email}"
+
+def principal_load_key(email: str) -> str:
+  # Holds a nonce while a request loads the principal from the database; invalidations delete it.
+  return f"principal-load:{email}"
+
+def principal_keys(email: str) -> list[str]:
+  """Everything an invalidation deletes: the shared principal and the marker of a load in flight."""
+  return [principal_key(email), principal_load_key(email)]
+
+# KEYS: principal, load marker. ARGV: nonce, ttl seconds, then field/value pairs.
+# Writes the loaded principal only if no invalidation deleted the marker since the load began.
+FILL_PRINCIPAL_SCRIPT = redis_client.register_script("""
+if redis.call('GET', KEYS[2]) ~= ARGV[1] then
+  return 0
+end
+redis.call('DEL', KEYS[2])
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+""")
+
+class PrincipalCache:
+  """In-process tier in front of the `principal:{email}` Redis hashes."""
+
+  def __init__(self, max_size: int, ttl: float):
+    self.max_size = max_size
+    self.ttl = ttl
+    self.entries: OrderedDict[str, tuple[Principal, float]] = OrderedDict()
+    # Bumped on every invalidation so a load that raced an update is not cached.
+    self.generation = 0
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, email: str) -> Principal | None:
+    entry = self.entries.get(email)
+    if entry is None:
+      self.misses += 1
+      return None
+    principal, valid_until = entry
+    if valid_until <= time.monotonic():
+      del self.entries[email]
+      self.misses += 1
+      return None
+    self.entries.move_to_end(email)
+    self.hits += 1
+    return principal
+
+  def put(self, principal: Principal, generation: int):
+    if generation != self.generation:
+      return
+    self.entries[principal.email] = (principal, time.monotonic() + self.ttl)
+    self.entries.move_to_end(principal.email)
+    while len(self.entries) > self.max_size:
+      self.entries.popitem(last=False)
+
+  def invalidate(self, email: str):
+    self.generation += 1
+    self.entries.pop(email, None)
+
+  def clear(self):
+    self.generation += 1
+    self.entries.clear()
+
+  def stats(self) -> dict:
+    return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+principal_cache = PrincipalCache(settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL)
+PRINCIPAL_REDIS_TTL = timedelta(seconds=settings.PRINCIPAL_REDIS_TTL)
@@ -0,0 +1,33 @@
+import asyncio
+import redis
+from core.profiling import PROFILER_CONFIG_CHANNEL, PROFILER_CONFIG_KEY, ProfilerConfig, profiler
+from core.redis import redis_client
+
+# The profiler switch lives in Redis so one admin call reaches every worker without a restart.
+
+async def publish_profiler_config(config: ProfilerConfig):
+  raw = config.model_dump_json(exclude_none=True)
+  profiler.configure(config)
+  async with redis_client.pipeline(transaction=True) as pipe:
+    pipe.set(PROFILER_CONFIG_KEY, ProfilerConfig(**profiler.state()).model_dump_json())
+    pipe.publish(PROFILER_CONFIG_CHANNEL, raw)
+    await pipe.execute()
+
+async def listen_for_profiler_config():
+  while True:
+    try:
+      async with redis_client.pubsub() as pubsub:
+        await pubsub.subscribe(PROFILER_CONFIG_CHANNEL)
+        while True:
+          message = await pubsub.get_message(timeout=1.0)
+          if message is None:
+            continue
+          if message["type"] == "subscribe":
+            # Catch up on a switch flipped before this worker started or while it was disconnected.
+            stored = await redis_client.get(PROFILER_CONFIG_KEY)
+            if stored:
+              profiler.configure(ProfilerConfig.model_validate_json(stored))
+          elif message["type"] == "message":
+            profiler.configure(ProfilerConfig.model_validate_json(message["data"]))
+    except redis.RedisError:
+      await asyncio.sleep(1)
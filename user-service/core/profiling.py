@@ -0,0 +1,210 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pydantic import BaseModel, Field
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = "x-request-id"
+PROFILER_CONFIG_CHANNEL = "keplerix:profiler"
+# Also stored under this key so workers that start later pick up the current switch.
+PROFILER_CONFIG_KEY = "keplerix:profiler"
+# Client-supplied request IDs end up in file names.
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+class ProfilerConfig(BaseModel):
+  enabled: bool | None = None
+  sample_rate: float | None = Field(None, ge=0, le=1)
+  slow_request_seconds: float | None = Field(None, ge=0)
+
+@dataclass
+class RequestProfile:
+  request_id: str
+  method: str
+  path: str
+  sampled: bool
+  started: float = field(default_factory=time.perf_counter)
+  stacks: Counter = field(default_factory=Counter)
+  spans: dict[str, float] = field(default_factory=lambda: {"db": 0.0, "redis": 0.0})
+
+current_profile: ContextVar[RequestProfile | None] = ContextVar("current_profile", default=None)
+
+def record_span(kind: str, seconds: float):
+  """Adds DB or Redis time to the request being profiled, if any."""
+  profile = current_profile.get()
+  if profile is not None:
+    profile.spans[kind] += seconds
+
+def frame_label(frame) -> str:
+  code = frame.f_code
+  filename = "/".join(code.co_filename.rsplit("/", 2)[-2:])
+  return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+def collapse(frame) -> str:
+  labels = []
+  while frame is not None:
+    labels.append(frame_label(frame))
+    frame = frame.f_back
+  return ";".join(reversed(labels))
+
+class Profiler:
+  """Samples the event loop thread and credits each stack to the task running at that moment.
+
+  Every in-flight request is sampled while the profiler is on, because whether a request
+  was slow is only known once it ends; profiles that are neither sampled nor slow are dropped.
+  """
+
+  def __init__(self):
+    self.enabled = settings.PROFILER_ENABLED
+    self.sample_rate = settings.PROFILER_SAMPLE_RATE
+    self.slow_request_seconds = settings.PROFILER_SLOW_REQUEST_SECONDS
+    self.interval = settings.PROFILER_INTERVAL
+    self.output_dir = settings.PROFILER_OUTPUT_DIR
+    self.max_files = settings.PROFILER_MAX_FILES
+    self.active: dict[asyncio.Task, RequestProfile] = {}
+    # Held by the sampler while it counts a stack, and by finish_request while it retires a
+    # profile, so a profile's stacks never change once it has left `active`.
+    self.lock = threading.Lock()
+    self.loop: asyncio.AbstractEventLoop | None = None
+    self.loop_thread_id: int | None = None
+    self.sampler: threading.Thread | None = None
+    self.written = 0
+
+  def configure(self, config: ProfilerConfig):
+    if config.sample_rate is not None:
+      self.sample_rate = config.sample_rate
+    if config.slow_request_seconds is not None:
+      self.slow_request_seconds = config.slow_request_seconds
+    if config.enabled is not None:
+      self.enabled = config.enabled
+
+  def state(self) -> dict:
+    return {
+      "enabled": self.enabled,
+      "sample_rate": self.sample_rate,
+      "slow_request_seconds": self.slow_request_seconds,
+      "in_flight": len(self.active),
+      "written": self.written,
+    }
+
+  def start_request(self, method: str, path: str, request_id: str) -> RequestProfile:
+    profile = RequestProfile(request_id=request_id, method=method, path=path, sampled=random.random() < self.sample_rate)
+    self.active[asyncio.current_task()] = profile
+    if self.sampler is None or not self.sampler.is_alive():
+      self.loop = asyncio.get_running_loop()
+      self.loop_thread_id = threading.get_ident()
+      self.sampler = threading.Thread(target=self.sample, name="profiler-sampler", daemon=True)
+      self.sampler.start()
+    return profile
+
+  def finish_request(self, profile: RequestProfile, route: str, status_code: int):
+    with self.lock:
+      self.active.pop(asyncio.current_task(), None)
+    wall = time.perf_counter() - profile.started
+    if not profile.sampled and wall < self.slow_request_seconds:
+      return
+    report = {
+      "request_id": profile.request_id,
+      "method": profile.method,
+      "path": profile.path,
+      "route": route,
+      "status": status_code,
+      "reason": "slow" if wall >= self.slow_request_seconds else "sampled",
+      "wall_seconds": wall,
+      "db_seconds": profile.spans["db"],
+      "redis_seconds": profile.spans["redis"],
+      # Samples taken while this request's task held the loop, i.e. Python CPU on the loop thread.
+      "cpu_seconds": sum(profile.stacks.values()) * self.interval,
+      "samples": sum(profile.stacks.values()),
+      "interval_seconds": self.interval,
+    }
+    written = asyncio.get_running_loop().run_in_executor(None, self.write, report, profile.stacks)
+    written.add_done_callback(self.count_written)
+
+  def sample(self):
+    while self.enabled:
+      time.sleep(self.interval)
+      task = asyncio.current_task(self.loop)
+      profile = self.active.get(task) if task is not None else None
+      if profile is None:
+        continue
+      frame = sys._current_frames().get(self.loop_thread_id)
+      if frame is None:
+        continue
+      stack = collapse(frame)
+      with self.lock:
+        # The request may have finished while its stack was being walked.
+        if self.active.get(task) is profile:
+          profile.stacks[stack] += 1
+
+  def write(self, report: dict, stacks: Counter):
+    os.makedirs(self.output_dir, exist_ok=True)
+    # Request IDs come from clients and may repeat; the suffix keeps one profile from replacing another.
+    name = f"{time.strftime('%Y%m%dT%H%M%S')}-{report['request_id']}-{uuid.uuid4().hex[:8]}"
+    base = os.path.join(self.output_dir, name)
+    # <name>.folded feeds flamegraph.pl or speedscope directly; <name>.json carries the breakdown.
+    with open(f"{base}.folded", "w") as folded:
+      folded.writelines(f"{stack} {count}\n" for stack, count in stacks.items())
+    with open(f"{base}.json", "w") as metadata:
+      json.dump(report, metadata, indent=2)
+    self.rotate()
+
+  def count_written(self, written: asyncio.Future):
+    if written.cancelled():
+      return
+    if written.exception() is not None:
+      logger.error("Writing a request profile failed", exc_info=written.exception())
+      return
+    self.written += 1
+
+  def rotate(self):
+    reports = sorted(entry for entry in os.listdir(self.output_dir) if entry.endswith(".json"))
+    for stale in reports[:max(0, len(reports) - self.max_files)]:
+      for suffix in (".json", ".folded"):
+        try:
+          os.remove(os.path.join(self.output_dir, stale.removesuffix(".json") + suffix))
+        except FileNotFoundError:
+          pass
+
+profiler = Profiler()
+
+class ProfilerMiddleware:
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http" or not profiler.enabled:
+      await self.app(scope, receive, send)
+      return
+
+    request_id = dict(scope["headers"]).get(REQUEST_ID_HEADER.encode(), b"").decode("latin-1")
+    if not REQUEST_ID_PATTERN.fullmatch(request_id):
+      request_id = uuid.uuid4().hex
+    profile = profiler.start_request(scope["method"], scope["path"], request_id)
+    token = current_profile.set(profile)
+    status_code = 500
+
+    async def send_with_request_id(message):
+      nonlocal status_code
+      if message["type"] == "http.response.start":
+        status_code = message["status"]
+        message["headers"] = [*message.get("headers", []), (REQUEST_ID_HEADER.encode(), request_id.encode("latin-1"))]
+      await send(message)
+
+    try:
+      await self.app(scope, receive, send_with_request_id)
+    finally:
+      current_profile.reset(token)
+      route = scope.get("route")
+      profiler.finish_request(profile, route.path if route is not None else "unmatched", status_code)
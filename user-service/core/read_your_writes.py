@@ -0,0 +1,58 @@
+import time
+from contextvars import ContextVar
+from fastapi import Request
+from sqlalchemy.orm import Session
+from core.config import settings
+
+# Clients that just wrote carry this cookie for READ_YOUR_WRITES_SECONDS; while it is
+# live their reads go to the primary so replica lag cannot hide their own changes.
+READ_YOUR_WRITES_COOKIE = "keplerix_rw"
+
+# Per-request holder set by the middleware; sessions flag it when a write commits.
+request_writes: ContextVar[dict | None] = ContextVar("request_writes", default=None)
+
+def read_from_primary(request: Request) -> bool:
+  try:
+    return float(request.cookies.get(READ_YOUR_WRITES_COOKIE, 0)) > time.time()
+  except ValueError:
+    return False
+
+def mark_written(session: Session, *args):
+  session.info["wrote"] = True
+
+def mark_orm_write(orm_execute_state):
+  if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+    mark_written(orm_execute_state.session)
+
+def record_commit(session: Session):
+  if session.info.pop("wrote", False):
+    holder = request_writes.get()
+    if holder is not None:
+      holder["wrote"] = True
+
+def forget_writes(session: Session, *args):
+  session.info.pop("wrote", None)
+
+class ReadYourWritesMiddleware:
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    if scope["type"] != "http":
+      await self.app(scope, receive, send)
+      return
+
+    holder = {}
+    token = request_writes.set(holder)
+
+    async def send_with_cookie(message):
+      if message["type"] == "http.response.start" and holder.get("wrote"):
+        ttl = settings.READ_YOUR_WRITES_SECONDS
+        cookie = f"{READ_YOUR_WRITES_COOKIE}={time.time() + ttl:.3f}; Max-Age={ttl}; Path=/; HttpOnly; Secure; SameSite=lax"
+        message["headers"] = [*message.get("headers", []), (b"set-cookie", cookie.encode("latin-1"))]
+      await send(message)
+
+    try:
+      await self.app(scope, receive, send_with_cookie)
+    finally:
+      request_writes.reset(token)
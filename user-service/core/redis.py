@@ -1,4 +1,15 @@
 import redis
 from core.config import settings
+from core.metrics import instrument_redis
 
-redis_client = redis.asyncio.from_url(settings.REDIS_URL, decode_responses=True)
\ No newline at end of file
+redis_pool = redis.asyncio.BlockingConnectionPool.from_url(
+  settings.REDIS_URL,
+  decode_responses=True,
+  max_connections=settings.REDIS_MAX_CONNECTIONS,
+  timeout=settings.REDIS_POOL_TIMEOUT,
+  socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+  socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+  health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+)
+
+redis_client = instrument_redis(redis.asyncio.Redis(connection_pool=redis_pool))
@@ -1,9 +1,43 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
+from core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 def hash_password(password: str) -> str:
   return pwd_context.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-  return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+  return pwd_context.verify(plain_password, hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+  return pwd_context.verify_and_update(plain_password, hashed_password)
+
+class PasswordHasherBusy(Exception):
+  pass
+
+class PasswordHasher:
+  # bcrypt releases the GIL while hashing, so a thread pool gives real parallelism
+  # without the pickling overhead of a process pool.
+  def __init__(self, max_workers: int, max_queue: int):
+    self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hasher")
+    self.max_pending = max_workers + max_queue
+    self.pending = 0
+
+  async def run(self, func, *args):
+    if self.pending >= self.max_pending:
+      raise PasswordHasherBusy()
+    self.pending += 1
+    try:
+      return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+    finally:
+      self.pending -= 1
+
+  async def hash(self, password: str) -> str:
+    return await self.run(hash_password, password)
+
+  async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return await self.run(verify_and_update_password, plain_password, hashed_password)
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
@@ -0,0 +1,109 @@
+import json
+from datetime import timedelta
+from core.invalidation import AUTH_INVALIDATION_CHANNEL, drop_cached_identity
+from core.principal_cache import principal_keys
+from core.redis import redis_client
+
+# Every auth flow does its Redis work in a single round trip: a MULTI pipeline when
+# the writes are unconditional, a Lua script when they depend on what is stored.
+
+def access_token_key(email: str) -> str:
+  return email
+
+def refresh_token_key(email: str) -> str:
+  return f"refresh_token:{email}"
+
+def reset_password_key(email: str) -> str:
+  return f"reset_password:{email}"
+
+def verify_request_key(email: str) -> str:
+  return f"verify_request:{email}"
+
+# KEYS: access, refresh. ARGV: access token, refresh token, channel, email.
+# Deletes each key only if it still holds the presented token.
+END_SESSION_SCRIPT = redis_client.register_script("""
+local revoked = 0
+for index = 1, 2 do
+  local expected = ARGV[index]
+  if expected ~= '' and redis.call('GET', KEYS[index]) == expected then
+    redis.call('DEL', KEYS[index])
+    revoked = revoked + 1
+  end
+end
+if revoked > 0 then
+  redis.call('PUBLISH', ARGV[3], ARGV[4])
+end
+return revoked
+""")
+
+# KEYS: refresh, access. ARGV: refresh token, new access token, ttl seconds, channel, email.
+ROTATE_ACCESS_TOKEN_SCRIPT = redis_client.register_script("""
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+  return 0
+end
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+redis.call('PUBLISH', ARGV[4], ARGV[5])
+return 1
+""")
+
+# KEYS: one-time token key, then session and cached principal keys to drop with it. ARGV: expected value, channel, email.
+CONSUME_ONE_TIME_TOKEN_SCRIPT = redis_client.register_script("""
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+  return 0
+end
+redis.call('DEL', unpack(KEYS))
+if #KEYS > 1 then
+  redis.call('PUBLISH', ARGV[2], ARGV[3])
+end
+return 1
+""")
+
+def one_time_token_value(token: str) -> str:
+  return json.dumps({"token": token})
+
+async def start_session(email: str, access_token: str, refresh_token: str, access_ttl: timedelta, refresh_ttl: timedelta):
+  drop_cached_identity(email)
+  async with redis_client.pipeline(transaction=True) as pipe:
+    pipe.set(access_token_key(email), access_token, ex=access_ttl)
+    pipe.set(refresh_token_key(email), refresh_token, ex=refresh_ttl)
+    pipe.publish(AUTH_INVALIDATION_CHANNEL, email)
+    await pipe.execute()
+
+async def end_session(email: str, access_token: str | None, refresh_token: str | None) -> int:
+  drop_cached_identity(email)
+  return await END_SESSION_SCRIPT(
+    keys=[access_token_key(email), refresh_token_key(email)],
+    args=[access_token or "", refresh_token or "", AUTH_INVALIDATION_CHANNEL, email],
+    client=redis_client,
+  )
+
+async def end_all_sessions(email: str):
+  drop_cached_identity(email)
+  async with redis_client.pipeline(transaction=True) as pipe:
+    pipe.delete(access_token_key(email), refresh_token_key(email), *principal_keys(email))
+    pipe.publish(AUTH_INVALIDATION_CHANNEL, email)
+    await pipe.execute()
+
+async def rotate_access_token(email: str, refresh_token: str, access_token: str, access_ttl: timedelta) -> bool:
+  drop_cached_identity(email)
+  rotated = await ROTATE_ACCESS_TOKEN_SCRIPT(
+    keys=[refresh_token_key(email), access_token_key(email)],
+    args=[refresh_token, access_token, int(access_ttl.total_seconds()), AUTH_INVALIDATION_CHANNEL, email],
+    client=redis_client,
+  )
+  return bool(rotated)
+
+async def store_one_time_token(key: str, token: str, ttl: timedelta):
+  await redis_client.set(key, one_time_token_value(token), ex=ttl)
+
+async def consume_one_time_token(key: str, token: str, email: str, revoke_sessions: bool = False) -> bool:
+  keys = [key]
+  if revoke_sessions:
+    drop_cached_identity(email)
+    keys += [access_token_key(email), refresh_token_key(email), *principal_keys(email)]
+  consumed = await CONSUME_ONE_TIME_TOKEN_SCRIPT(
+    keys=keys,
+    args=[one_time_token_value(token), AUTH_INVALIDATION_CHANNEL, email],
+    client=redis_client,
+  )
+  return bool(consumed)
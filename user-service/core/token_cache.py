@@ -0,0 +1,63 @@
+import time
+from collections import OrderedDict
+from core.config import settings
+
+class VerifiedTokenCache:
+  def __init__(self, max_size: int, ttl: float):
+    self.max_size = max_size
+    self.ttl = ttl
+    self.entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+    self.tokens_by_email: dict[str, set[str]] = {}
+    # Bumped on every invalidation so a lookup that raced a logout is not cached.
+    self.generation = 0
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, token: str) -> str | None:
+    entry = self.entries.get(token)
+    if entry is None:
+      self.misses += 1
+      return None
+    email, valid_until = entry
+    if valid_until <= time.time():
+      self.remove(token)
+      self.misses += 1
+      return None
+    self.entries.move_to_end(token)
+    self.hits += 1
+    return email
+
+  def put(self, token: str, email: str, expires_at: float, generation: int):
+    valid_until = min(time.time() + self.ttl, expires_at)
+    if valid_until <= time.time() or generation != self.generation:
+      return
+    self.remove(token)
+    self.entries[token] = (email, valid_until)
+    self.tokens_by_email.setdefault(email, set()).add(token)
+    while len(self.entries) > self.max_size:
+      self.remove(next(iter(self.entries)))
+
+  def remove(self, token: str):
+    entry = self.entries.pop(token, None)
+    if entry is None:
+      return
+    tokens = self.tokens_by_email.get(entry[0])
+    if tokens is not None:
+      tokens.discard(token)
+      if not tokens:
+        del self.tokens_by_email[entry[0]]
+
+  def invalidate(self, email: str):
+    self.generation += 1
+    for token in list(self.tokens_by_email.get(email, ())):
+      self.remove(token)
+
+  def clear(self):
+    self.generation += 1
+    self.entries.clear()
+    self.tokens_by_email.clear()
+
+  def stats(self) -> dict:
+    return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+token_cache = VerifiedTokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL)
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime, timezone
-from sqlalchemy import ForeignKey, Table, Column, Integer, String, TIMESTAMP
+from sqlalchemy import ForeignKey, Index, Table, Column, Integer, String, TIMESTAMP
 from sqlalchemy.orm import relationship
 from db.base import Base, metadata
 
@@ -15,7 +15,7 @@ projects = Table(
   Column("id", Integer, primary_key=True, index=True, autoincrement=True),
   Column("user_id", Integer, ForeignKey('users.id'), nullable=False),
   Column("link", String, unique=True, nullable=False, default=generate_unique_link),
-  Column("changed_at", TIMESTAMP(timezone=True), default=datetime.now(timezone.utc)),
+  Column("changed_at", TIMESTAMP(timezone=True), nullable=False, default=datetime.now(timezone.utc)),
   Column('created_at', TIMESTAMP(timezone=True), default=datetime.now(timezone.utc))
 )
 
@@ -25,7 +25,14 @@ class Project(Base):
   id = Column(Integer, primary_key=True, autoincrement=True)
   user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
   link = Column(String, unique=True, nullable=False, default=generate_unique_link)
-  changed_at = Column(TIMESTAMP(timezone=True), default=datetime.now(timezone.utc))
+  # NOT NULL: it is the keyset pagination key, see core.pagination.
+  changed_at = Column(TIMESTAMP(timezone=True), nullable=False, default=datetime.now(timezone.utc))
   created_at = Column(TIMESTAMP(timezone=True), default=datetime.now(timezone.utc))
 
-  owner = relationship("Users", back_populates="projects")
\ No newline at end of file
+  owner = relationship("Users", back_populates="projects")
+
+  # Every project query filters on user_id; keep in step with migration 8b2d4e6f1a3c.
+  __table_args__ = (
+    Index("ix_projects_user_id_link", user_id, link),
+    Index("ix_projects_user_id_changed_at_id", user_id, changed_at.desc(), id.desc()),
+  )
\ No newline at end of file
@@ -1,7 +1,6 @@
 from datetime import datetime, timezone
-from sqlalchemy import Table, Column, Integer, String, Boolean, TIMESTAMP, func, select
+from sqlalchemy import Table, Column, Integer, String, Boolean, TIMESTAMP
 from sqlalchemy.orm import relationship
-from sqlalchemy.ext.asyncio import AsyncSession
 from db.base import Base, metadata
 from db.models.project import Project
 
@@ -26,18 +25,11 @@ class Users(Base):
   username = Column(String(length=256), nullable=False)
   email = Column(String(length=320), unique=True, index=True, nullable=False)
   hashed_password = Column(String(length=1024), nullable=False)
+  # Maintained in the same transaction as every project insert/delete; see manage.py repair-projects-count.
+  projects_count = Column(Integer, nullable=False, default=0, server_default="0")
   is_active = Column(Boolean, default=True)
   is_superuser = Column(Boolean, default=False)
   is_verified = Column(Boolean, default=False)
   created_at = Column(TIMESTAMP(timezone=True), default=datetime.now(timezone.utc))
 
   projects = relationship("Project", back_populates="owner")
-
-  async def get_projects_count(self, session: AsyncSession) -> int:
-    result = await session.execute(
-      select(func.count().label('count'))
-      .select_from(Project)
-      .where(Project.user_id == self.id)
-    )
-    count = result.scalar()
-    return count
\ No newline at end of file
@@ -1,15 +1,64 @@
-from fastapi import Depends
+from fastapi import Depends, Request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession
+from sqlalchemy.orm import Session
 from core.config import settings
+from core.metrics import instrument_engine
+from core.read_your_writes import forget_writes, mark_orm_write, mark_written, read_from_primary, record_commit
 
 DATABASE_URL = settings.DATABASE_URL_ASYNC
 
-engine = create_async_engine(DATABASE_URL)
-async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
+def engine_options(url: str) -> dict:
+  backend = make_url(url)
+  if backend.get_backend_name() == "sqlite":
+    # SQLite picks its own pool class; the sizing options below do not apply to it.
+    return {}
+  options = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+    "pool_pre_ping": settings.DB_POOL_PRE_PING,
+  }
+  if backend.get_driver_name() == "asyncpg":
+    options["connect_args"] = {
+      "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+      "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+  return options
+
+class PrimarySession(Session):
+  """Session class for the primary; commits that wrote anything start the read-your-writes window."""
+
+event.listen(PrimarySession, "after_flush", mark_written)
+event.listen(PrimarySession, "do_orm_execute", mark_orm_write)
+event.listen(PrimarySession, "after_commit", record_commit)
+event.listen(PrimarySession, "after_rollback", forget_writes)
+
+engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+async_session_maker = async_sessionmaker(engine, expire_on_commit=False, sync_session_class=PrimarySession)
+instrument_engine(engine, "primary")
+
+replica_engine = None
+replica_session_maker = None
+if settings.DATABASE_URL_REPLICA:
+  replica_engine = create_async_engine(settings.DATABASE_URL_REPLICA, **engine_options(settings.DATABASE_URL_REPLICA))
+  replica_session_maker = async_sessionmaker(replica_engine, expire_on_commit=False)
+  instrument_engine(replica_engine, "replica")
 
 async def get_async_session():
   async with async_session_maker() as session:
     yield session
 
+def read_session_maker(request: Request) -> async_sessionmaker:
+  if replica_session_maker is None or read_from_primary(request):
+    return async_session_maker
+  return replica_session_maker
+
+async def get_read_session(request: Request):
+  async with read_session_maker(request)() as session:
+    yield session
+
 async def get_user_db(session: AsyncSession = Depends(get_async_session)):
-  return session
\ No newline at end of file
+  return session
@@ -1,5 +1,7 @@
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+MAX_PROJECTS_PER_BATCH = 100
 
 class ProjectOwner(BaseModel):
   id: int
@@ -18,4 +20,11 @@ class ProjectCreate(BaseModel):
   created_at: datetime
   
 class ProjectsDelete(BaseModel):
-  links: list[str]
\ No newline at end of file
+  links: list[str]
+
+class ProjectsBatchCreate(BaseModel):
+  count: int = Field(ge=1, le=MAX_PROJECTS_PER_BATCH)
+
+class ProjectsDeleted(BaseModel):
+  message: str
+  deleted: list[str]
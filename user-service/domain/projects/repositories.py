@@ -0,0 +1,73 @@
+from datetime import datetime, timezone
+from sqlalchemy import Row, Select, delete, func, insert, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from db.models.project import Project as DBProject
+from domain.users.repositories import adjust_projects_count
+
+# Read endpoints only need these; plain rows skip ORM identity-map and instance construction.
+PROJECT_COLUMNS = (DBProject.id, DBProject.link, DBProject.changed_at, DBProject.created_at)
+
+async def add_projects(session: AsyncSession, user_id: int, links: list[str]) -> list[Row]:
+  # One multi-row INSERT ... RETURNING; timestamps are set here because the column
+  # defaults are evaluated once at import time.
+  now = datetime.now(timezone.utc)
+  result = await session.execute(
+    insert(DBProject)
+    .values([{"user_id": user_id, "link": link, "changed_at": now, "created_at": now} for link in links])
+    .returning(*PROJECT_COLUMNS)
+  )
+  projects = result.all()
+  await adjust_projects_count(session, user_id, len(projects))
+  return projects
+
+async def add_project(session: AsyncSession, user_id: int, link: str) -> Row:
+  projects = await add_projects(session, user_id, [link])
+  return projects[0]
+
+async def delete_projects_where(session: AsyncSession, user_id: int, *criteria) -> list[str]:
+  """Deletes the user's projects matching `criteria` in one statement; returns the removed links."""
+  result = await session.execute(
+    delete(DBProject)
+    .where(DBProject.user_id == user_id, *criteria)
+    .returning(DBProject.link)
+    .execution_options(synchronize_session=False)
+  )
+  links = result.scalars().all()
+  if links:
+    await adjust_projects_count(session, user_id, -len(links))
+  return links
+
+async def get_project_row(session: AsyncSession, user_id: int, link: str) -> Row | None:
+  result = await session.execute(select(*PROJECT_COLUMNS).where(DBProject.link == link, DBProject.user_id == user_id))
+  return result.first()
+
+def projects_page_query(user_id: int, after: tuple[datetime, int] | None = None, limit: int | None = None) -> Select:
+  """Newest first; `after` is the (changed_at, id) of the last row already returned."""
+  query = (
+    select(*PROJECT_COLUMNS)
+    .where(DBProject.user_id == user_id)
+    .order_by(DBProject.changed_at.desc(), DBProject.id.desc())
+  )
+  if after is not None:
+    query = query.where(tuple_(DBProject.changed_at, DBProject.id) < after)
+  if limit is not None:
+    query = query.limit(limit)
+  return query
+
+async def list_projects_page(session: AsyncSession, user_id: int, after: tuple[datetime, int] | None, limit: int) -> tuple[list[Row], tuple[datetime, int] | None]:
+  # One extra row tells us whether another page exists without a COUNT.
+  result = await session.execute(projects_page_query(user_id, after, limit + 1))
+  projects = result.all()
+  if len(projects) <= limit:
+    return projects, None
+  projects = projects[:limit]
+  return projects, (projects[-1].changed_at, projects[-1].id)
+
+async def count_projects_by_user(session: AsyncSession, user_ids: list[int]) -> dict[int, int]:
+  result = await session.execute(
+    select(DBProject.user_id, func.count())
+    .where(DBProject.user_id.in_(user_ids))
+    .group_by(DBProject.user_id)
+  )
+  return dict(result.all())
@@ -35,4 +35,10 @@ class UserInfo(BaseModel):
 
 class UserInfoForUpdate(BaseModel):
   email: Optional[EmailStr] = None
-  username: Optional[str] = None
\ No newline at end of file
+  username: Optional[str] = None
+
+
+class Principal(BaseModel):
+  id: int
+  email: str
+  username: str
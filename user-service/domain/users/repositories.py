@@ -0,0 +1,24 @@
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from db.models.user import Users
+from domain.users.entities import Principal
+
+async def get_principal_by_email(session: AsyncSession, email: str) -> Principal | None:
+  result = await session.execute(select(Users.id, Users.email, Users.username).where(Users.email == email))
+  row = result.first()
+  if row is None:
+    return None
+  return Principal(id=row.id, email=row.email, username=row.username)
+
+async def is_superuser(session: AsyncSession, email: str) -> bool:
+  result = await session.execute(select(Users.is_superuser).where(Users.email == email))
+  return bool(result.scalar())
+
+async def adjust_projects_count(session: AsyncSession, user_id: int, delta: int):
+  # A relative update, so concurrent writers for the same user never lose each other's change.
+  await session.execute(
+    update(Users)
+    .where(Users.id == user_id)
+    .values(projects_count=Users.projects_count + delta)
+  )
@@ -0,0 +1,33 @@
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.future import select
+from db.models.user import Users
+from domain.projects.repositories import count_projects_by_user
+
+async def repair_projects_count(session_maker: async_sessionmaker, batch_size: int = 1000) -> int:
+  """Recomputes users.projects_count from the projects table; returns how many rows were wrong."""
+  repaired = 0
+  last_id = 0
+  while True:
+    async with session_maker() as session:
+      # Locking the user rows makes concurrent project writes for them wait, so the counts
+      # below cannot be overtaken by a relative update committed in between.
+      result = await session.execute(
+        select(Users.id, Users.projects_count)
+        .where(Users.id > last_id)
+        .order_by(Users.id)
+        .limit(batch_size)
+        .with_for_update()
+      )
+      rows = result.all()
+      if not rows:
+        return repaired
+
+      counts = await count_projects_by_user(session, [row.id for row in rows])
+      for row in rows:
+        actual = counts.get(row.id, 0)
+        if row.projects_count != actual:
+          await session.execute(update(Users).where(Users.id == row.id).values(projects_count=actual))
+          repaired += 1
+      await session.commit()
+      last_id = rows[-1].id
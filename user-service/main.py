@@ -1,11 +1,45 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from api.dependencies import require_ops_token
 from api.v1.endpoints.auth import router as auth_router
 from api.v1.endpoints.users import router as users_router
 from api.v1.endpoints.projects import router as projects_router
+from api.v1.endpoints.admin import router as admin_router
+from core.invalidation import listen_for_auth_invalidations
+from core.metrics import MetricsMiddleware, metrics_response
+from core.profiler_control import listen_for_profiler_config
+from core.profiling import ProfilerMiddleware
+from core.read_your_writes import ReadYourWritesMiddleware
+from core.security import PasswordHasherBusy
+from db.session import engine, replica_engine
+from services.real_time import hub
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+  invalidation_listener = asyncio.create_task(listen_for_auth_invalidations())
+  profiler_listener = asyncio.create_task(listen_for_profiler_config())
+  real_time_tasks = [asyncio.create_task(hub.run()), asyncio.create_task(hub.listen())]
+  yield
+  invalidation_listener.cancel()
+  profiler_listener.cancel()
+  for task in real_time_tasks:
+    task.cancel()
+  await engine.dispose()
+  if replica_engine is not None:
+    await replica_engine.dispose()
+
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+  return JSONResponse(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    content={"detail": "Too many password operations in progress, try again shortly"},
+    headers={"Retry-After": "1"},
+  )
 
 def create_app() -> FastAPI:
-  app = FastAPI(title='Keplerix', docs_url='/api/docs', description='Web application for collaborative interface design')
+  app = FastAPI(title='Keplerix', docs_url='/api/docs', description='Web application for collaborative interface design', lifespan=lifespan)
   origins = [
     "http://localhost:3000",
   ]
@@ -16,8 +50,15 @@ def create_app() -> FastAPI:
     allow_methods=["*"],
     allow_headers=["*"],
   )
+  app.add_middleware(ReadYourWritesMiddleware)
+  app.add_middleware(ProfilerMiddleware)
+  # Added last so it wraps everything else and times the whole request.
+  app.add_middleware(MetricsMiddleware)
+  app.add_exception_handler(PasswordHasherBusy, password_hasher_busy_handler)
   app.include_router(auth_router, prefix="/auth")
   app.include_router(users_router, prefix="/user")
   app.include_router(projects_router, prefix="/project")
+  app.include_router(admin_router, prefix="/admin")
+  app.add_api_route("/metrics", metrics_response, include_in_schema=False, dependencies=[Depends(require_ops_token)])
   
-  return app
\ No newline at end of file
+  return app
@@ -0,0 +1,29 @@
+"""Operational commands for user-service.
+
+  python manage.py repair-projects-count [--batch-size N]
+"""
+import argparse
+import asyncio
+from db.session import async_session_maker, engine
+from domain.users.services import repair_projects_count
+
+async def run_repair_projects_count(args: argparse.Namespace):
+  try:
+    repaired = await repair_projects_count(async_session_maker, args.batch_size)
+  finally:
+    await engine.dispose()
+  print(f"Repaired projects_count for {repaired} user(s)")
+
+def main():
+  parser = argparse.ArgumentParser(prog="manage.py")
+  commands = parser.add_subparsers(dest="command", required=True)
+
+  repair = commands.add_parser("repair-projects-count", help="Recompute users.projects_count from the projects table")
+  repair.add_argument("--batch-size", type=int, default=1000)
+  repair.set_defaults(handler=run_repair_projects_count)
+
+  args = parser.parse_args()
+  asyncio.run(args.handler(args))
+
+if __name__ == "__main__":
+  main()
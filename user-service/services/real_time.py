@@ -0,0 +1,265 @@
+"""Per-project rooms for live collaboration over WebSockets.
+
+Every editor of a project joins the project's room on whichever worker their socket landed
+on. A client sends JSON messages; the hub delivers each one to every member of the room as
+{"from": <member id>, "data": <message>}, the sender included, so clients can use their
+own echoes as acknowledgements and ordering points. The first frame a member receives is
+{"member": <its id>}.
+
+Delivery is batched: messages are collected for REALTIME_TICK_SECONDS and then sent as a
+single {"messages": [...]} frame per member, encoded once for the whole room. A room of 50
+editors typing therefore costs 50 sends per tick, not 50 per keystroke. The same batch is
+published once per tick to the room's Redis channel, which every other worker with members
+in that room is subscribed to.
+"""
+import asyncio
+import logging
+from uuid import uuid4
+import orjson
+import redis
+from starlette.websockets import WebSocket
+from core.config import settings
+from core.redis import redis_client
+
+logger = logging.getLogger(__name__)
+
+ROOM_CHANNEL_PREFIX = "keplerix:room:"
+# WebSocket close codes (RFC 6455 and the IANA registry).
+CLOSE_UNSUPPORTED_DATA = 1003
+CLOSE_INVALID_PAYLOAD = 1007
+CLOSE_MESSAGE_TOO_BIG = 1009
+CLOSE_TRY_AGAIN_LATER = 1013
+
+def room_channel(link: str) -> str:
+  return ROOM_CHANNEL_PREFIX + link
+
+class Member:
+  """One open socket in a room. Frames are written by the member's own task, so a slow client only delays itself."""
+
+  def __init__(self, link: str, websocket: WebSocket, queue_size: int):
+    self.id = uuid4().hex[:16]
+    self.link = link
+    self.websocket = websocket
+    self.frames: asyncio.Queue[str] = asyncio.Queue(queue_size)
+    self.sender: asyncio.Task | None = None
+    self.dropped = False
+    self.closed = False
+
+  async def close(self, code: int):
+    if not self.closed:
+      self.closed = True
+      await self.websocket.close(code=code)
+
+class Room:
+  def __init__(self, link: str):
+    self.link = link
+    self.members: dict[str, Member] = {}
+    # Encoded messages, comma-joined runs of them, waiting for the next tick: for the
+    # members here, and for the other workers.
+    self.pending: list[str] = []
+    self.outgoing: list[str] = []
+
+class Hub:
+  def __init__(self, tick: float, queue_size: int, max_members: int, max_message_bytes: int):
+    self.tick = tick
+    self.queue_size = queue_size
+    self.max_members = max_members
+    self.max_message_bytes = max_message_bytes
+    # Tags our own publishes so the listener can skip them; local members already have them.
+    self.worker_id = uuid4().hex
+    self.rooms: dict[str, Room] = {}
+    self.dirty: set[Room] = set()
+    self.pubsub = None
+
+    self.messages_received = 0
+    self.batches_relayed = 0
+    self.frames_sent = 0
+    self.batches_published = 0
+    self.publish_failures = 0
+    self.slow_members_dropped = 0
+
+  async def serve(self, link: str, websocket: WebSocket):
+    """Runs an accepted socket as a member of the project's room until either side closes it."""
+    room = self.rooms.get(link)
+    if room is not None and len(room.members) >= self.max_members:
+      await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+      return
+    member = await self.join(link, websocket)
+    member.sender = asyncio.create_task(self.send_frames(member))
+    try:
+      close_code = await self.receive_messages(member)
+      # Stop queued frames from racing the close.
+      member.sender.cancel()
+      if close_code is not None:
+        await member.close(close_code)
+    finally:
+      member.sender.cancel()
+      # A send to a client that has gone away fails; the receive side has seen it too.
+      await asyncio.gather(member.sender, return_exceptions=True)
+      await self.leave(member)
+
+  async def join(self, link: str, websocket: WebSocket) -> Member:
+    member = Member(link, websocket, self.queue_size)
+    member.frames.put_nowait(orjson.dumps({"member": member.id}).decode())
+    room = self.rooms.get(link)
+    if room is None:
+      room = self.rooms[link] = Room(link)
+      await self.subscribe(link)
+    room.members[member.id] = member
+    return member
+
+  async def leave(self, member: Member):
+    room = self.rooms.get(member.link)
+    if room is None or room.members.pop(member.id, None) is None or room.members:
+      return
+    del self.rooms[member.link]
+    self.dirty.discard(room)
+    await self.unsubscribe(member.link)
+
+  async def receive_messages(self, member: Member) -> int | None:
+    """Reads the member's messages into its room; returns a close code when it has to be dropped."""
+    while True:
+      message = await member.websocket.receive()
+      if message["type"] == "websocket.disconnect":
+        return None
+      text = message.get("text")
+      if text is None:
+        return CLOSE_UNSUPPORTED_DATA
+      # The limit is in bytes; a character can take up to four of them.
+      payload = text.encode()
+      if len(payload) > self.max_message_bytes:
+        return CLOSE_MESSAGE_TOO_BIG
+      try:
+        data = orjson.loads(payload)
+      except orjson.JSONDecodeError:
+        return CLOSE_INVALID_PAYLOAD
+      room = self.rooms.get(member.link)
+      if room is None or member.id not in room.members:
+        # Dropped as too slow while this message was in flight.
+        return CLOSE_TRY_AGAIN_LATER
+      encoded = orjson.dumps({"from": member.id, "data": data}).decode()
+      room.pending.append(encoded)
+      room.outgoing.append(encoded)
+      self.dirty.add(room)
+      self.messages_received += 1
+
+  async def send_frames(self, member: Member):
+    try:
+      while True:
+        await member.websocket.send_text(await member.frames.get())
+    except asyncio.CancelledError:
+      if member.dropped:
+        # Possibly in the middle of a send the client was too slow to take.
+        await member.close(CLOSE_TRY_AGAIN_LATER)
+      raise
+
+  async def flush(self):
+    """Sends each active room's batch to its members and publishes it for the other workers."""
+    rooms, self.dirty = self.dirty, set()
+    publishes = []
+    for room in rooms:
+      if room.outgoing:
+        publishes.append((room_channel(room.link), f"{self.worker_id}\n{','.join(room.outgoing)}"))
+        room.outgoing = []
+      if room.pending:
+        frame = '{"messages":[' + ",".join(room.pending) + "]}"
+        room.pending = []
+        for member in list(room.members.values()):
+          try:
+            member.frames.put_nowait(frame)
+          except asyncio.QueueFull:
+            await self.drop(member)
+          else:
+            self.frames_sent += 1
+    if not publishes:
+      return
+    try:
+      async with redis_client.pipeline(transaction=False) as pipe:
+        for channel, payload in publishes:
+          pipe.publish(channel, payload)
+        await pipe.execute()
+      self.batches_published += len(publishes)
+    except redis.RedisError:
+      # Members on this worker already have the batch; the other workers miss it.
+      self.publish_failures += len(publishes)
+
+  async def drop(self, member: Member):
+    # A client this far behind would only fall further behind; it can reconnect and resync.
+    member.dropped = True
+    member.sender.cancel()
+    self.slow_members_dropped += 1
+    await self.leave(member)
+
+  def relay(self, channel: str, payload: str):
+    origin, _, messages = payload.partition("\n")
+    room = self.rooms.get(channel[len(ROOM_CHANNEL_PREFIX):])
+    if origin == self.worker_id or room is None or not messages:
+      return
+    room.pending.append(messages)
+    self.dirty.add(room)
+    self.batches_relayed += 1
+
+  async def subscribe(self, link: str):
+    if self.pubsub is None:
+      return
+    try:
+      await self.pubsub.subscribe(room_channel(link))
+    except redis.RedisError:
+      # The listener resubscribes every room once it has reconnected.
+      pass
+
+  async def unsubscribe(self, link: str):
+    if self.pubsub is None:
+      return
+    try:
+      await self.pubsub.unsubscribe(room_channel(link))
+    except redis.RedisError:
+      pass
+
+  async def run(self):
+    while True:
+      await asyncio.sleep(self.tick)
+      try:
+        await self.flush()
+      except Exception:
+        logger.exception("Real-time flush failed")
+
+  async def listen(self):
+    while True:
+      try:
+        async with redis_client.pubsub() as pubsub:
+          self.pubsub = pubsub
+          if self.rooms:
+            await pubsub.subscribe(*(room_channel(link) for link in self.rooms))
+          while True:
+            if not pubsub.subscribed:
+              # get_message refuses to run before the first subscription.
+              await asyncio.sleep(self.tick)
+              continue
+            # Poll with a timeout rather than listen(): a blocking read would trip the client's socket_timeout.
+            message = await pubsub.get_message(timeout=1.0)
+            if message is not None and message["type"] == "message":
+              self.relay(message["channel"], message["data"])
+      except redis.RedisError:
+        self.pubsub = None
+        await asyncio.sleep(1)
+
+  def stats(self) -> dict:
+    return {
+      "worker_id": self.worker_id,
+      "rooms": len(self.rooms),
+      "members": sum(len(room.members) for room in self.rooms.values()),
+      "messages_received": self.messages_received,
+      "batches_relayed": self.batches_relayed,
+      "frames_sent": self.frames_sent,
+      "batches_published": self.batches_published,
+      "publish_failures": self.publish_failures,
+      "slow_members_dropped": self.slow_members_dropped,
+    }
+
+hub = Hub(
+  settings.REALTIME_TICK_SECONDS,
+  settings.REALTIME_MEMBER_QUEUE_SIZE,
+  settings.REALTIME_MAX_ROOM_MEMBERS,
+  settings.REALTIME_MAX_MESSAGE_BYTES,
+)